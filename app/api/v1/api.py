@@ -1,5 +1,5 @@
 from fastapi import APIRouter
-from app.api.v1.endpoints import traffic, frontend, admin, websocket, cities, areas, intersections
+from app.api.v1.endpoints import traffic, frontend, admin, websocket, cities, areas, intersections, tree, journal, analytics, search
 
 api_router = APIRouter()
 api_router.include_router(traffic.router, prefix="/traffic-lights", tags=["traffic-lights"])
@@ -8,4 +8,8 @@ api_router.include_router(admin.router, prefix="/admin", tags=["admin"])
 api_router.include_router(cities.router, prefix="/cities", tags=["cities"])
 api_router.include_router(areas.router, prefix="/areas", tags=["areas"])
 api_router.include_router(intersections.router, prefix="/intersections", tags=["intersections"])
+api_router.include_router(tree.router, prefix="/tree", tags=["tree"])
+api_router.include_router(journal.router, prefix="/journal", tags=["journal"])
+api_router.include_router(analytics.router, prefix="/analytics", tags=["analytics"])
+api_router.include_router(search.router, prefix="/search", tags=["search"])
 api_router.include_router(websocket.router, tags=["websocket"])
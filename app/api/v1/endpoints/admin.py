@@ -1,9 +1,25 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, File, HTTPException, UploadFile
 from sqlalchemy.orm import Session
-from app.db.session import get_db
+from app.db.session import engine, get_db
+from app.db.queries import light_by_id
+from app.db.storage import storage_stats
+from app.api.v1.endpoints.websocket import manager
 from app.core.traffic_logic import TrafficController
-from app.models.traffic import TrafficLight
+from app.core.green_wave import green_wave
+from app.core.light_store import light_store
+from app.core.log import ROOT, log_setup
+from app.core.preemption import preemption_manager
+from app.core.safety import SafetyViolation
+from app.core.startup import startup_report
+from app.core.response_cache import LIGHTS, TOPOLOGY, response_cache
+from app.core.search import search_index
+from app.core.spatial import spatial_index
+from app.core.watchdog import tick_watchdog
+from app.core.topology_import import FORMATS, TopologyFormatError, detect_format, import_topology, open_text
+from app.models.intersection import Intersection
 from pydantic import BaseModel
+from typing import List, Optional
+import time
 
 router = APIRouter()
 
@@ -18,7 +34,10 @@ async def manual_override(
     db: Session = Depends(get_db)
 ):
     controller = TrafficController(db)
-    await controller.set_manual_state(light_id, request.status, request.duration)
+    try:
+        await controller.set_manual_state(light_id, request.status, request.duration)
+    except SafetyViolation as e:
+        raise HTTPException(status_code=409, detail=str(e))
     return {"message": "Manual override applied"}
 
 @router.delete("/traffic-lights/{light_id}/manual")
@@ -36,10 +55,165 @@ async def update_duration(
     duration: int,
     db: Session = Depends(get_db)
 ):
-    light = db.query(TrafficLight).filter(TrafficLight.id == light_id).first()
+    light = light_by_id(db, light_id)
     if not light:
         raise HTTPException(status_code=404, detail="Light not found")
     
+    # Keep the status the controller runs on when the row is written back
+    light_store.refresh([light])
     light.duration = duration
     db.commit()
+    light_store.sync_light(light)
     return {"message": "Duration updated"}
+
+class PreemptionRequest(BaseModel):
+    intersection_id: int
+    direction: str
+    hold: Optional[int] = None
+
+class RouteStop(BaseModel):
+    intersection_id: int
+    direction: str
+    eta: float  # Seconds from now until the vehicle reaches the stop line
+
+class RoutePreemptionRequest(BaseModel):
+    stops: List[RouteStop]
+    hold: Optional[int] = None
+
+@router.post("/preemption")
+async def preempt_intersection(request: PreemptionRequest):
+    requested_at = time.perf_counter()
+    try:
+        latency = await preemption_manager.preempt(
+            request.intersection_id, request.direction, request.hold, requested_at
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except SafetyViolation as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    if latency is None:
+        raise HTTPException(status_code=404, detail="Intersection not found")
+    return {"message": "Preemption started", "latency_ms": latency}
+
+@router.post("/preemption/route")
+async def preempt_route(request: RoutePreemptionRequest):
+    try:
+        scheduled = await preemption_manager.preempt_route(
+            [stop.model_dump() for stop in request.stops], request.hold
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"message": "Route preemption scheduled", "scheduled": scheduled}
+
+@router.delete("/preemption/route")
+def cancel_route_preemption(intersection_id: Optional[int] = None):
+    """Cancel the route stops not started yet, at one intersection or all of them."""
+    return {"cancelled": preemption_manager.cancel_scheduled(intersection_id)}
+
+@router.post("/import")
+def import_topology_file(
+    file: UploadFile = File(...),
+    format: Optional[str] = None,
+    dry_run: bool = False,
+    strict: bool = False,
+    batch_size: int = 5000,
+    db: Session = Depends(get_db)
+):
+    """
+    Bulk-import cities, areas, intersections and their lights from a CSV, JSON
+    or GeoJSON file (format defaults to the file extension). Rows with errors
+    are skipped and reported; with strict=true any error rolls everything back.
+    """
+    format = format or detect_format(file.filename)
+    if format not in FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unknown format: {format}")
+    try:
+        summary = import_topology(
+            db, open_text(file.file), format,
+            batch_size=max(1, batch_size), dry_run=dry_run, strict=strict
+        )
+    except (TopologyFormatError, UnicodeDecodeError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if summary["committed"]:
+        light_store.invalidate()
+        spatial_index.invalidate()
+        search_index.invalidate()
+        response_cache.invalidate(TOPOLOGY, LIGHTS)
+    return summary
+
+@router.get("/startup")
+def startup_stats():
+    return startup_report.as_dict()
+
+@router.get("/controller/store")
+def controller_store_stats():
+    return light_store.memory_usage()
+
+@router.get("/controller/watchdog")
+def controller_watchdog_stats():
+    return tick_watchdog.stats()
+
+class CorridorRequest(BaseModel):
+    intersection_ids: List[int]
+
+def _green_wave_problem(db: Session, intersection_ids: list, corridor: bool) -> dict:
+    if not light_store.loaded:
+        raise HTTPException(status_code=503, detail="Controller not running yet")
+    spatial_index.ensure_loaded(db)
+    problem = green_wave.problem(light_store, spatial_index.points, intersection_ids, corridor)
+    if len(problem["nodes"]) < 2:
+        raise HTTPException(status_code=400, detail="Fewer than two intersections with a location")
+    return problem
+
+@router.post("/green-wave/areas/{area_id}")
+async def optimize_area_green_wave(area_id: int, db: Session = Depends(get_db)):
+    """Coordinate the offsets of every located intersection in an area with its neighbours."""
+    intersection_ids = [row[0] for row in db.query(Intersection.id).filter(Intersection.area_id == area_id)]
+    if not intersection_ids:
+        raise HTTPException(status_code=404, detail="Area not found or empty")
+    return await green_wave.optimize(f"area:{area_id}", _green_wave_problem(db, intersection_ids, False))
+
+@router.post("/green-wave/corridor")
+async def optimize_corridor_green_wave(request: CorridorRequest, db: Session = Depends(get_db)):
+    """Coordinate the offsets along a corridor, given as intersection ids in driving order."""
+    return await green_wave.optimize("corridor", _green_wave_problem(db, request.intersection_ids, True))
+
+@router.get("/green-wave")
+def green_wave_stats():
+    return green_wave.stats()
+
+@router.delete("/green-wave")
+def clear_green_wave():
+    """Stop correcting offsets; intersections keep cycling from where they are."""
+    return {"cleared": green_wave.clear()}
+
+@router.get("/storage")
+def storage_info():
+    return storage_stats(engine)
+
+@router.get("/websocket/stats")
+def websocket_stats():
+    return manager.stats()
+
+@router.get("/cache/stats")
+def response_cache_stats():
+    return response_cache.stats()
+
+@router.get("/preemption/stats")
+def preemption_stats():
+    return preemption_manager.stats()
+
+@router.get("/logging")
+def logging_stats():
+    return log_setup.stats()
+
+@router.put("/logging")
+def set_log_level(level: str, logger: str = ROOT):
+    """Change a module's log level (e.g. logger=app.core.traffic_logic&level=DEBUG) until restart."""
+    if logger != ROOT and not logger.startswith(ROOT + "."):
+        raise HTTPException(status_code=400, detail=f"Only {ROOT} loggers can be configured")
+    try:
+        log_setup.set_level(logger, level)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return log_setup.stats()
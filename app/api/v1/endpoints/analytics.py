@@ -0,0 +1,47 @@
+from datetime import datetime, timezone
+from fastapi import APIRouter, HTTPException
+from typing import Optional
+from app.core.analytics import GRANULARITIES, SCOPES, analytics
+from app.core.serialization import json_response
+from app.api.v1.endpoints.journal import epoch
+
+router = APIRouter()
+
+def time_range(start: Optional[datetime], end: Optional[datetime]) -> tuple:
+    """The requested range in Unix seconds; the last hour by default."""
+    end = epoch(end) if end is not None else datetime.now(timezone.utc).timestamp()
+    start = epoch(start) if start is not None else end - 3600
+    if end < start:
+        raise HTTPException(status_code=400, detail="end is before start")
+    return start, end
+
+def check(scope: str, granularity: str):
+    if scope not in SCOPES:
+        raise HTTPException(status_code=404, detail=f"Unknown scope: {scope}")
+    if granularity not in GRANULARITIES:
+        raise HTTPException(status_code=400, detail=f"Granularity must be one of {', '.join(GRANULARITIES)}")
+
+@router.get("/{scope}")
+def read_summary(
+    scope: str,
+    granularity: str = "1h",
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None
+):
+    """Totals per light, intersection or area over a time range, e.g. average density and green time per area."""
+    check(scope, granularity)
+    start, end = time_range(start, end)
+    return json_response(analytics.summary(scope, granularity, start, end))
+
+@router.get("/{scope}/{entity_id}")
+def read_series(
+    scope: str,
+    entity_id: int,
+    granularity: str = "1m",
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None
+):
+    """Per-bucket series of one light, intersection or area, for charts."""
+    check(scope, granularity)
+    start, end = time_range(start, end)
+    return json_response(analytics.series(scope, entity_id, granularity, start, end))
@@ -1,9 +1,13 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 from app.db.session import get_db
 from app.models.city import TrafficArea
 from app.schemas.area import AreaCreate, AreaResponse, AreaUpdate, AreaResponseNested
+from app.core.response_cache import LIGHTS, TOPOLOGY, response_cache
+from app.core.search import search_index
+from app.core.serialization import field_names, records
+from app.api.v1.pagination import columns, keyset, page, parse_fields, projected
 
 router = APIRouter()
 
@@ -13,27 +17,66 @@ def create_area(area: AreaCreate, db: Session = Depends(get_db)):
     db.add(db_area)
     db.commit()
     db.refresh(db_area)
+    response_cache.invalidate(TOPOLOGY)
+    search_index.upsert("area", db_area.id, db_area.name, db_area.code, city_id=db_area.city_id)
     return db_area
 
 @router.get("/", response_model=List[AreaResponse])
-def read_areas(db: Session = Depends(get_db)):
-    areas = db.query(TrafficArea).all()
-    return areas
+def read_areas(
+    response: Response,
+    city_id: Optional[int] = None,
+    after: Optional[int] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    fields: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
+    names = parse_fields(fields, AreaResponse) or list(AreaResponse.model_fields)
+    query = db.query(*columns(TrafficArea, names))
+    if city_id is not None:
+        query = query.filter(TrafficArea.city_id == city_id)
+    rows = page(keyset(query, TrafficArea.id, after, limit).all(), limit, response)
+    return projected(rows, names, response)
 
-from app.schemas.area import AreaCreate, AreaResponse, AreaUpdate, AreaResponseNested
-from sqlalchemy.orm import joinedload
+from app.core.light_store import light_store
 from app.models.intersection import Intersection
+from app.models.traffic import TrafficLight
+from app.schemas.intersection import IntersectionResponseNested
+from app.schemas.traffic import TrafficLightResponse
+
+AREA_FIELDS = field_names(AreaResponse)
+NODE_FIELDS = field_names(IntersectionResponseNested, exclude=("traffic_lights",))
+LIGHT_FIELDS = field_names(TrafficLightResponse)
 
 @router.get("/{area_id}", response_model=AreaResponseNested)
-def read_area(area_id: int, db: Session = Depends(get_db)):
-    area = db.query(TrafficArea).options(
-        joinedload(TrafficArea.intersections)
-        .joinedload(Intersection.traffic_lights)
-    ).filter(TrafficArea.id == area_id).first()
-    
-    if not area:
-        raise HTTPException(status_code=404, detail="Area not found")
-    return area
+def read_area(area_id: int, request: Request, db: Session = Depends(get_db)):
+    def build():
+        # Same shape as AreaResponseNested, assembled from three column queries
+        area = db.query(*columns(TrafficArea, AREA_FIELDS)).filter(TrafficArea.id == area_id).first()
+        if not area:
+            raise HTTPException(status_code=404, detail="Area not found")
+
+        nodes = records(NODE_FIELDS, db.query(*columns(Intersection, NODE_FIELDS))
+                        .filter(Intersection.area_id == area_id).order_by(Intersection.id))
+        by_id = {}
+        for node in nodes:
+            node["traffic_lights"] = []
+            by_id[node["id"]] = node
+
+        lights = db.query(*columns(TrafficLight, LIGHT_FIELDS)) \
+            .join(Intersection, TrafficLight.intersection_id == Intersection.id) \
+            .filter(Intersection.area_id == area_id).order_by(TrafficLight.id)
+        for light in records(LIGHT_FIELDS, lights):
+            by_id[light["intersection_id"]]["traffic_lights"].append(light)
+
+        return {**dict(zip(AREA_FIELDS, area)), "intersections": nodes}, {}
+
+    def live(content):
+        return {**content, "intersections": [
+            {**node, "traffic_lights": light_store.live(node["traffic_lights"])} for node in content["intersections"]
+        ]}
+
+    # Nested intersections carry their lights, so light writes invalidate it too
+    return response_cache.respond(request, (TOPOLOGY, LIGHTS), build, live=live)
 
 @router.put("/{area_id}", response_model=AreaResponse)
 def update_area(area_id: int, area_update: AreaUpdate, db: Session = Depends(get_db)):
@@ -47,6 +90,12 @@ def update_area(area_id: int, area_update: AreaUpdate, db: Session = Depends(get
     
     db.commit()
     db.refresh(db_area)
+    response_cache.invalidate(TOPOLOGY)
+    if "city_id" in update_data:
+        # Its intersections' results name the city too
+        search_index.invalidate()
+    else:
+        search_index.upsert("area", db_area.id, db_area.name, db_area.code, city_id=db_area.city_id)
     return db_area
 
 @router.delete("/{area_id}")
@@ -57,4 +106,6 @@ def delete_area(area_id: int, db: Session = Depends(get_db)):
     
     db.delete(db_area)
     db.commit()
+    response_cache.invalidate(TOPOLOGY)
+    search_index.invalidate()
     return {"message": "Area deleted"}
@@ -1,9 +1,13 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 from app.db.session import get_db
 from app.models.city import City
-from app.schemas.city import CityCreate, CityResponse, CityUpdate
+from app.schemas.city import CityCreate, CityResponse, CitySummary, CityUpdate
+from app.core.response_cache import TOPOLOGY, response_cache
+from app.core.search import search_index
+from app.core.serialization import field_names, json_response, records
+from app.api.v1.pagination import columns, keyset, page, parse_fields, projected
 
 router = APIRouter()
 
@@ -13,23 +17,40 @@ def create_city(city: CityCreate, db: Session = Depends(get_db)):
     db.add(db_city)
     db.commit()
     db.refresh(db_city)
+    response_cache.invalidate(TOPOLOGY)
+    search_index.upsert("city", db_city.id, db_city.name, db_city.code)
     return db_city
 
-from sqlalchemy.orm import joinedload
 from app.models.city import TrafficArea
-from app.models.intersection import Intersection
+from app.schemas.area import AreaResponse
 
-@router.get("/", response_model=List[CityResponse])
-def read_cities(db: Session = Depends(get_db)):
-    cities = db.query(City).all()
-    return cities
+CITY_FIELDS = field_names(CityResponse, exclude=("areas",))
+AREA_FIELDS = field_names(AreaResponse)
+
+@router.get("/", response_model=List[CitySummary])
+def read_cities(
+    response: Response,
+    after: Optional[int] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    fields: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
+    names = parse_fields(fields, CitySummary) or list(CitySummary.model_fields)
+    rows = keyset(db.query(*columns(City, names)), City.id, after, limit).all()
+    rows = page(rows, limit, response)
+    return projected(rows, names, response)
 
 @router.get("/{city_id}", response_model=CityResponse)
-def read_city(city_id: int, db: Session = Depends(get_db)):
-    city = db.query(City).options(joinedload(City.areas)).filter(City.id == city_id).first()
-    if not city:
-        raise HTTPException(status_code=404, detail="City not found")
-    return city
+def read_city(city_id: int, request: Request, db: Session = Depends(get_db)):
+    def build():
+        city = db.query(*columns(City, CITY_FIELDS)).filter(City.id == city_id).first()
+        if not city:
+            raise HTTPException(status_code=404, detail="City not found")
+        areas = db.query(*columns(TrafficArea, AREA_FIELDS)) \
+            .filter(TrafficArea.city_id == city_id).order_by(TrafficArea.id)
+        return json_response({**dict(zip(CITY_FIELDS, city)), "areas": records(AREA_FIELDS, areas)})
+
+    return response_cache.respond(request, (TOPOLOGY,), build)
 
 @router.put("/{city_id}", response_model=CityResponse)
 def update_city(city_id: int, city_update: CityUpdate, db: Session = Depends(get_db)):
@@ -43,6 +64,8 @@ def update_city(city_id: int, city_update: CityUpdate, db: Session = Depends(get
     
     db.commit()
     db.refresh(db_city)
+    response_cache.invalidate(TOPOLOGY)
+    search_index.upsert("city", db_city.id, db_city.name, db_city.code)
     return db_city
 
 @router.delete("/{city_id}")
@@ -53,4 +76,6 @@ def delete_city(city_id: int, db: Session = Depends(get_db)):
     
     db.delete(db_city)
     db.commit()
+    response_cache.invalidate(TOPOLOGY)
+    search_index.invalidate()
     return {"message": "City deleted"}
@@ -1,27 +1,25 @@
-from fastapi import APIRouter, Request, Depends, BackgroundTasks
+from datetime import datetime, timezone
+from fastapi import APIRouter, Request, Depends, BackgroundTasks, Query
 from fastapi.templating import Jinja2Templates
 from sqlalchemy.orm import Session
 from app.db.session import get_db
 from app.models.intersection import Intersection
 from app.models.traffic import TrafficLight
 from app.core.traffic_logic import TrafficController
+from app.core.assets import asset_url
+from app.services.redis import get_redis
+from typing import List
+
+MAX_SYNC_INTERSECTIONS = 1000
 
 router = APIRouter()
 templates = Jinja2Templates(directory="app/templates")
-
-from app.models.city import City, TrafficArea
-from app.models.intersection import Intersection
-from app.models.traffic import TrafficLight
-from sqlalchemy.orm import joinedload
+templates.env.globals["asset_url"] = asset_url
 
 @router.get("/")
-def dashboard(request: Request, db: Session = Depends(get_db)):
-    cities = db.query(City).options(
-        joinedload(City.areas)
-        .joinedload(TrafficArea.intersections)
-        .joinedload(Intersection.traffic_lights)
-    ).all()
-    return templates.TemplateResponse("dashboard.html", {"request": request, "cities": cities})
+def dashboard(request: Request):
+    # The page is a shell: the city tree is loaded lazily from /tree
+    return templates.TemplateResponse("dashboard.html", {"request": request})
 
 @router.post("/simulate/{light_id}/density")
 async def simulate_density(
@@ -34,13 +32,43 @@ async def simulate_density(
     background_tasks.add_task(controller.update_density, light_id, value)
     return {"message": "Density update queued"}
 
+@router.get("/schedules")
+def phase_schedules(intersection_ids: List[int] = Query(default=[])):
+    """Current phase schedule of the given intersections, where clients can project it locally."""
+    from app.core.light_store import light_store
+    from app.core.schedule import build_schedule, is_schedulable
+
+    if not light_store.loaded:
+        return {"schedules": []}
+    indexes = (light_store.index_of_intersection(iid) for iid in intersection_ids[:MAX_SYNC_INTERSECTIONS])
+    return {"schedules": [
+        build_schedule(light_store, i)
+        for i in indexes
+        if i >= 0 and is_schedulable(light_store, i)
+    ]}
+
 @router.get("/sync")
-async def sync_state(db: Session = Depends(get_db)):
-    controller = TrafficController(db)
-    # Ideally fetch only active lights or filter by area
-    lights = db.query(TrafficLight).all()
+async def sync_state(intersection_ids: List[int] = Query(default=[]), db: Session = Depends(get_db)):
+    """Current state of the lights of the intersections on screen, in one Redis round trip."""
+    ids = intersection_ids[:MAX_SYNC_INTERSECTIONS]
+    if not ids:
+        return {}
+    lights = db.query(TrafficLight.id, TrafficLight.status, TrafficLight.duration) \
+        .filter(TrafficLight.intersection_id.in_(ids)).all()
+    if not lights:
+        return {}
+    redis = await get_redis()
+    values = await redis.mget([
+        key for light in lights
+        for key in (f"traffic_light:{light.id}:status", f"traffic_light:{light.id}:end_time")
+    ])
+    now = datetime.now(timezone.utc).timestamp()
     data = {}
-    for light in lights:
-        state = await controller.get_state(light.id)
-        data[light.id] = state
+    for n, light in enumerate(lights):
+        status, end_time = values[2 * n], values[2 * n + 1]
+        if not status:
+            # Not in Redis yet: fall back to the DB, as TrafficController.get_state does
+            status = light.status
+            end_time = end_time or now + light.duration
+        data[light.id] = {"status": status, "end_time": float(end_time) if end_time else None}
     return data
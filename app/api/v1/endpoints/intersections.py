@@ -1,42 +1,190 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 from app.db.session import get_db
+from app.db.queries import lights_of
 from app.models.intersection import Intersection
 from app.models.traffic import TrafficLight
-from pydantic import BaseModel
+from app.core.phase_plans import COMPILED_PLANS, DEFAULT_PLAN, STATUS_CODES, STATUS_NAMES, plan_for_lights
+from app.core.journal import RESET, journal
+from app.core.safety import SafetyViolation, validate
+from app.core.light_store import light_store
+from app.schemas.intersection import IntersectionResponse
+from app.core.response_cache import LIGHTS, TOPOLOGY, response_cache
+from app.core.serialization import json_response, records
+from app.core.spatial import parse_location, spatial_index
+from app.core.search import search_index
+from app.models.city import TrafficArea
+from app.api.v1.pagination import columns, keyset, page, parse_fields, projected
+from pydantic import BaseModel, Field
 
 router = APIRouter()
 
+INTERSECTION_FIELDS = list(IntersectionResponse.model_fields)
+
 class IntersectionCreate(BaseModel):
     area_id: int
     name: str
     code: str
     location: str
+    latitude: Optional[float] = Field(None, ge=-90, le=90)  # Parsed from a "lat, lon" location if omitted
+    longitude: Optional[float] = Field(None, ge=-180, le=180)
+    phase_plan: str = DEFAULT_PLAN  # four_way, t_junction, protected_left, five_way
 
 @router.post("/")
 def create_intersection(intersection: IntersectionCreate, db: Session = Depends(get_db)):
+    plan = COMPILED_PLANS.get(intersection.phase_plan)
+    if not plan:
+        raise HTTPException(status_code=400, detail=f"Unknown phase plan: {intersection.phase_plan}")
+
     # Create intersection
-    db_intersection = Intersection(**intersection.model_dump())
+    db_intersection = Intersection(**intersection.model_dump(exclude={"phase_plan"}))
+    if db_intersection.latitude is None or db_intersection.longitude is None:
+        db_intersection.latitude, db_intersection.longitude = parse_location(intersection.location) or (None, None)
     db.add(db_intersection)
-    db.commit()
-    db.refresh(db_intersection)
+    db.flush()  # Assigns the id; the lights are committed in the same transaction
     
-    # Auto-create 4 traffic lights
-    directions = ["North", "South", "East", "West"]
-    for i, direction in enumerate(directions):
-        # Sync North and South to GREEN, others to RED
-        is_ns = direction in ["North", "South"]
+    # Auto-create one traffic light per movement, in the plan's first phase
+    for movement, direction in enumerate(plan.movements):
         light = TrafficLight(
             intersection_id=db_intersection.id,
             direction=direction,
-            status="GREEN" if is_ns else "RED",
-            duration=60 if is_ns else 60 # Default duration
+            status=STATUS_NAMES[plan.status[0][movement]],
+            duration=60 # Default duration
         )
         db.add(light)
     db.commit()
+    light_store.invalidate()
+    response_cache.invalidate(TOPOLOGY, LIGHTS)
+    spatial_index.update(db_intersection.id, db_intersection.latitude, db_intersection.longitude)
+    city_id = db.query(TrafficArea.city_id).filter(TrafficArea.id == db_intersection.area_id).scalar()
+    search_index.upsert(
+        "intersection", db_intersection.id, db_intersection.name, db_intersection.code,
+        area_id=db_intersection.area_id, city_id=city_id
+    )
     
-    return {"message": "Intersection created with 4 traffic lights", "id": db_intersection.id}
+    return {"message": f"Intersection created with {len(plan.movements)} traffic lights", "id": db_intersection.id}
+
+@router.get("/", response_model=List[IntersectionResponse])
+def read_intersections(
+    response: Response,
+    area_id: Optional[int] = None,
+    after: Optional[int] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    fields: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
+    names = parse_fields(fields, IntersectionResponse) or INTERSECTION_FIELDS
+    query = db.query(*columns(Intersection, names))
+    if area_id is not None:
+        query = query.filter(Intersection.area_id == area_id)
+    rows = page(keyset(query, Intersection.id, after, limit).all(), limit, response)
+    return projected(rows, names, response)
+
+def _by_ids(db: Session, names: list, ids: list) -> dict:
+    """id -> row for the index hits, in one IN query."""
+    if not ids:
+        return {}
+    rows = db.query(*columns(Intersection, names)).filter(Intersection.id.in_(ids)).all()
+    return {row.id: row for row in rows}
+
+@router.get("/within", response_model=List[IntersectionResponse])
+def read_intersections_within(
+    south: float = Query(..., ge=-90, le=90),
+    west: float = Query(..., ge=-180, le=180),
+    north: float = Query(..., ge=-90, le=90),
+    east: float = Query(..., ge=-180, le=180),
+    limit: int = Query(1000, ge=1, le=5000),
+    fields: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
+    """
+    Intersections in a map viewport, from the spatial index (west > east
+    crosses the antimeridian). X-Truncated is set when more than `limit` match.
+    """
+    if north < south:
+        raise HTTPException(status_code=400, detail="north is below south")
+    names = parse_fields(fields, IntersectionResponse) or INTERSECTION_FIELDS
+    spatial_index.ensure_loaded(db)
+    ids = spatial_index.within(south, west, north, east, limit + 1)
+    headers = {}
+    if len(ids) > limit:
+        ids = ids[:limit]
+        headers["X-Truncated"] = "true"
+    rows = _by_ids(db, names, ids)
+    return json_response(records(names, [rows[i] for i in sorted(rows)]), headers=headers)
+
+@router.get("/nearest")
+def read_nearest_intersections(
+    lat: float = Query(..., ge=-90, le=90),
+    lon: float = Query(..., ge=-180, le=180),
+    k: int = Query(10, ge=1, le=500),
+    max_distance: Optional[float] = Query(None, gt=0),
+    fields: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
+    """The k intersections nearest to a point, closest first, with distance_m in meters."""
+    names = parse_fields(fields, IntersectionResponse) or INTERSECTION_FIELDS
+    spatial_index.ensure_loaded(db)
+    hits = spatial_index.nearest(lat, lon, k, max_distance)
+    rows = _by_ids(db, names, [intersection_id for _, intersection_id in hits])
+    return json_response([
+        {**dict(zip(names, rows[intersection_id])), "distance_m": round(distance, 1)}
+        for distance, intersection_id in hits if intersection_id in rows
+    ])
+
+class RoutePoint(BaseModel):
+    latitude: float = Field(..., ge=-90, le=90)
+    longitude: float = Field(..., ge=-180, le=180)
+
+class CorridorRequest(BaseModel):
+    points: List[RoutePoint] = Field(..., min_length=2)
+    width: float = Field(30.0, gt=0, le=5000)  # Meters either side of the route
+    speed: Optional[float] = Field(None, gt=0)  # Vehicle speed in m/s, to estimate arrival times
+
+@router.post("/corridor")
+def route_corridor(request: CorridorRequest, db: Session = Depends(get_db)):
+    """
+    Intersections along a route, in the order it reaches them, with the
+    approach direction and (given a speed) the ETA in seconds. The result can
+    be sent as the stops of POST /admin/preemption/route.
+    """
+    spatial_index.ensure_loaded(db)
+    stops = spatial_index.corridor([(p.latitude, p.longitude) for p in request.points], request.width)
+    names = dict(
+        db.query(Intersection.id, Intersection.name)
+        .filter(Intersection.id.in_([stop["intersection_id"] for stop in stops])).all()
+    ) if stops else {}
+    for stop in stops:
+        stop["name"] = names.get(stop["intersection_id"])
+        if request.speed:
+            stop["eta"] = round(stop["distance_m"] / request.speed, 1)
+    return {"stops": stops}
+
+class LocationUpdate(BaseModel):
+    latitude: float = Field(..., ge=-90, le=90)
+    longitude: float = Field(..., ge=-180, le=180)
+    location: Optional[str] = None
+
+@router.put("/{intersection_id}/location", response_model=IntersectionResponse)
+def update_location(
+    intersection_id: int,
+    update: LocationUpdate,
+    db: Session = Depends(get_db)
+):
+    intersection = db.query(Intersection).filter(Intersection.id == intersection_id).first()
+    if not intersection:
+        raise HTTPException(status_code=404, detail="Intersection not found")
+
+    intersection.latitude = update.latitude
+    intersection.longitude = update.longitude
+    if update.location is not None:
+        intersection.location = update.location
+    db.commit()
+    db.refresh(intersection)
+    response_cache.invalidate(TOPOLOGY)
+    spatial_index.update(intersection.id, intersection.latitude, intersection.longitude)
+    return intersection
 
 @router.post("/{intersection_id}/reset")
 async def reset_intersection(
@@ -46,40 +194,59 @@ async def reset_intersection(
     """
     Reset an intersection to automatic mode.
     """
-    lights = db.query(TrafficLight).filter(TrafficLight.intersection_id == intersection_id).all()
+    lights = lights_of(db, intersection_id)
     if not lights:
         raise HTTPException(status_code=404, detail="Intersection not found")
     
     from app.services.redis import get_redis
-    from app.api.v1.endpoints.websocket import broadcast_state_update
+    from app.api.v1.endpoints.websocket import broadcast_batch_update
     from datetime import datetime, timedelta, timezone
     
     redis = await get_redis()
+
+    # Restart the plan cleanly from its first phase
+    plan = plan_for_lights(lights)
+    durations = plan.phase_durations(lights)
+    first_phase = {
+        light.id: STATUS_NAMES[plan.status[0][plan.movement_index[light.direction]]]
+        for light in lights if light.direction in plan.movement_index
+    }
+    try:
+        validate(lights, first_phase, plan=plan)
+    except SafetyViolation as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+    phase_end = (datetime.now(timezone.utc) + timedelta(seconds=durations[0])).timestamp()
+    await redis.set(f"intersection:{intersection_id}:phase", 0)
+    await redis.set(f"intersection:{intersection_id}:phase_end", phase_end)
+    light_store.set_phase(intersection_id, 0, phase_end)
     
+    updates = []
     for light in lights:
         light.is_manual = False
-        # Reset to default state if needed, or just let the cycle pick it up
-        # We'll set North/South to GREEN and East/West to RED to restart clean
-        if light.direction in ["North", "South"]:
-            light.status = "GREEN"
-        else:
-            light.status = "RED"
-            
+        movement = plan.movement_index.get(light.direction)
+        light.status = first_phase.get(light.id, "RED")
         light.last_updated = datetime.now(timezone.utc)
         
         # Update Redis
         await redis.set(f"traffic_light:{light.id}:status", light.status)
         # Set a fresh end time
-        end_time = (datetime.now(timezone.utc) + timedelta(seconds=light.duration)).timestamp()
+        end_time = plan.end_time(0, movement, durations, phase_end) if movement is not None else phase_end
         await redis.set(f"traffic_light:{light.id}:end_time", end_time)
-        
-        # Broadcast
-        await broadcast_state_update(light.id, {
-            "status": light.status,
-            "end_time": end_time
+        journal.record(intersection_id, light.id, STATUS_CODES[light.status], end_time, RESET)
+        updates.append({
+            "light_id": light.id,
+            "state": {
+                "status": light.status,
+                "end_time": end_time
+            }
         })
         
     db.commit()
+    for light in lights:
+        light_store.sync_light(light)
+    # One frame for the whole intersection
+    await broadcast_batch_update(updates)
     return {"message": "Intersection reset to automatic mode"}
 
 class FavoriteUpdate(BaseModel):
@@ -97,4 +264,5 @@ def toggle_favorite(
     
     intersection.is_favorite = favorite.is_favorite
     db.commit()
+    response_cache.invalidate(TOPOLOGY)
     return {"message": "Favorite status updated", "is_favorite": intersection.is_favorite}
@@ -0,0 +1,33 @@
+from datetime import datetime, timezone
+from fastapi import APIRouter, HTTPException, Query
+from typing import Optional
+from app.core.journal import journal
+from app.core.serialization import json_response
+
+router = APIRouter()
+
+def epoch(value: Optional[datetime]) -> Optional[float]:
+    """Query times are ISO 8601 or Unix seconds; naive times are UTC."""
+    if value is None:
+        return None
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+@router.get("/")
+def read_journal(
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    intersection_id: Optional[int] = None,
+    light_id: Optional[int] = None,
+    limit: int = Query(1000, ge=1, le=100000)
+):
+    """Light state changes with start <= ts <= end, oldest first."""
+    start, end = epoch(start), epoch(end)
+    if start is not None and end is not None and end < start:
+        raise HTTPException(status_code=400, detail="end is before start")
+    return json_response(journal.query(start, end, intersection_id, light_id, limit))
+
+@router.get("/stats")
+def journal_stats():
+    return journal.stats()
@@ -0,0 +1,34 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+from typing import Optional
+from app.db.session import get_db
+from app.core.search import TYPES, search_index
+from app.core.serialization import json_response
+
+router = APIRouter()
+
+@router.get("/")
+def search_names(
+    q: str = Query(..., min_length=1, max_length=100),
+    types: Optional[str] = None,
+    limit: int = Query(10, ge=1, le=100),
+    fuzzy: bool = False,
+    db: Session = Depends(get_db)
+):
+    """
+    Type-ahead search over city, area and intersection names and codes.
+    `types` narrows it (e.g. types=intersection,area); fuzzy=true tolerates typos.
+    Results carry the parent ids needed to open them in the city tree.
+    """
+    wanted = TYPES
+    if types:
+        wanted = tuple(t.strip() for t in types.split(",") if t.strip())
+        unknown = [t for t in wanted if t not in TYPES]
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown types: {', '.join(unknown)}")
+    search_index.ensure_loaded(db)
+    return json_response(search_index.search(q, limit, wanted, fuzzy))
+
+@router.get("/stats")
+def search_stats():
+    return search_index.stats()
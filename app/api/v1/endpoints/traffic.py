@@ -1,13 +1,23 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 from app.db.session import get_db
+from app.db.queries import light_by_id, lights_of
 from app.models.traffic import TrafficLight
 from app.schemas.traffic import TrafficLightCreate, TrafficLightResponse, TrafficLightUpdate
 from app.services.redis import get_redis
+from app.core.safety import SafetyViolation, validate
+from app.core.light_store import light_store
+from app.core.journal import MANUAL, journal
+from app.core.phase_plans import RED, STATUS_CODES
+from app.core.response_cache import LIGHTS, TOPOLOGY, response_cache
+from app.core.serialization import field_names, records
+from app.api.v1.pagination import columns, cursor_headers, keyset, page, parse_fields
 
 router = APIRouter()
 
+LIGHT_FIELDS = field_names(TrafficLightResponse)
+
 @router.post("/", response_model=TrafficLightResponse)
 def create_traffic_light(
     traffic_light: TrafficLightCreate, 
@@ -17,26 +27,45 @@ def create_traffic_light(
     db.add(db_traffic_light)
     db.commit()
     db.refresh(db_traffic_light)
+    light_store.invalidate()
+    response_cache.invalidate(TOPOLOGY, LIGHTS)
     return db_traffic_light
 
 @router.get("/", response_model=List[TrafficLightResponse])
 def read_traffic_lights(
-    skip: int = 0, 
-    limit: int = 100, 
+    request: Request,
+    response: Response,
+    intersection_id: Optional[int] = None,
+    after: Optional[int] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    fields: Optional[str] = None,
     db: Session = Depends(get_db)
 ):
-    traffic_lights = db.query(TrafficLight).offset(skip).limit(limit).all()
-    return traffic_lights
+    names = parse_fields(fields, TrafficLightResponse) or LIGHT_FIELDS
+
+    def build():
+        query = db.query(*columns(TrafficLight, names))
+        if intersection_id is not None:
+            query = query.filter(TrafficLight.intersection_id == intersection_id)
+        rows = page(keyset(query, TrafficLight.id, after, limit).all(), limit, response)
+        return records(names, rows), cursor_headers(response)
+
+    # Status and manual flags come from the light store when served
+    return response_cache.respond(request, (LIGHTS,), build, live=light_store.live)
 
 @router.get("/{traffic_light_id}", response_model=TrafficLightResponse)
 def read_traffic_light(
     traffic_light_id: int, 
+    request: Request,
     db: Session = Depends(get_db)
 ):
-    traffic_light = db.query(TrafficLight).filter(TrafficLight.id == traffic_light_id).first()
-    if traffic_light is None:
-        raise HTTPException(status_code=404, detail="Traffic light not found")
-    return traffic_light
+    def build():
+        row = db.query(*columns(TrafficLight, LIGHT_FIELDS)).filter(TrafficLight.id == traffic_light_id).first()
+        if row is None:
+            raise HTTPException(status_code=404, detail="Traffic light not found")
+        return dict(zip(LIGHT_FIELDS, row)), {}
+
+    return response_cache.respond(request, (LIGHTS,), build, live=lambda light: light_store.live([light])[0])
 
 @router.put("/{traffic_light_id}", response_model=TrafficLightResponse)
 async def update_traffic_light(
@@ -45,19 +74,36 @@ async def update_traffic_light(
     db: Session = Depends(get_db),
     redis = Depends(get_redis)
 ):
-    db_traffic_light = db.query(TrafficLight).filter(TrafficLight.id == traffic_light_id).first()
+    db_traffic_light = light_by_id(db, traffic_light_id)
     if db_traffic_light is None:
         raise HTTPException(status_code=404, detail="Traffic light not found")
     
     update_data = traffic_light_update.model_dump(exclude_unset=True)
+
+    # Go by the statuses the controller runs on: the DB rows may lag them
+    siblings = lights_of(db, db_traffic_light.intersection_id)
+    light_store.refresh(siblings)
+
+    # Reject status writes that would conflict with the rest of the intersection
+    if "status" in update_data:
+        try:
+            validate(siblings, {traffic_light_id: update_data["status"]})
+        except SafetyViolation as e:
+            raise HTTPException(status_code=409, detail=str(e))
+
     for key, value in update_data.items():
         setattr(db_traffic_light, key, value)
     
     db.commit()
     db.refresh(db_traffic_light)
+    light_store.sync_light(db_traffic_light)
 
     # Cache status in Redis if updated
     if "status" in update_data:
         await redis.set(f"traffic_light:{traffic_light_id}:status", update_data["status"])
+        journal.record(
+            db_traffic_light.intersection_id, traffic_light_id,
+            STATUS_CODES.get(update_data["status"], RED), 0.0, MANUAL
+        )
 
     return db_traffic_light
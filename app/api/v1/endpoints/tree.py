@@ -0,0 +1,79 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from sqlalchemy.orm import Session, load_only, selectinload
+from typing import List, Optional
+from app.db.session import get_db
+from app.models.city import City, TrafficArea
+from app.models.intersection import Intersection
+from app.models.traffic import TrafficLight
+from app.schemas.area import AreaResponse
+from app.schemas.city import CitySummary
+from app.schemas.intersection import IntersectionTreeNode
+from app.api.v1.pagination import keyset, page
+
+router = APIRouter()
+
+# Lazy, keyset-paginated city tree for the dashboard: each level is loaded on
+# demand, so first paint never depends on the size of a city.
+
+def _intersection_nodes(db: Session):
+    return db.query(Intersection).options(
+        load_only(
+            Intersection.id, Intersection.area_id, Intersection.name, Intersection.code,
+            Intersection.location, Intersection.latitude, Intersection.longitude, Intersection.is_favorite
+        ),
+        selectinload(Intersection.area).load_only(TrafficArea.name),
+        selectinload(Intersection.traffic_lights).load_only(
+            TrafficLight.id, TrafficLight.intersection_id, TrafficLight.direction,
+            TrafficLight.status, TrafficLight.duration, TrafficLight.is_manual
+        )
+    )
+
+@router.get("/cities", response_model=List[CitySummary])
+def tree_cities(
+    response: Response,
+    after: Optional[int] = None,
+    limit: int = Query(100, ge=1, le=500),
+    db: Session = Depends(get_db)
+):
+    rows = keyset(db.query(City.id, City.name, City.code), City.id, after, limit).all()
+    return page(rows, limit, response)
+
+@router.get("/cities/{city_id}/areas", response_model=List[AreaResponse])
+def tree_areas(
+    city_id: int,
+    response: Response,
+    after: Optional[int] = None,
+    limit: int = Query(100, ge=1, le=500),
+    db: Session = Depends(get_db)
+):
+    query = db.query(TrafficArea.id, TrafficArea.city_id, TrafficArea.name, TrafficArea.code) \
+        .filter(TrafficArea.city_id == city_id)
+    rows = keyset(query, TrafficArea.id, after, limit).all()
+    if not rows and after is None and not db.query(City.id).filter(City.id == city_id).first():
+        raise HTTPException(status_code=404, detail="City not found")
+    return page(rows, limit, response)
+
+@router.get("/areas/{area_id}/intersections", response_model=List[IntersectionTreeNode])
+def tree_intersections(
+    area_id: int,
+    response: Response,
+    after: Optional[int] = None,
+    limit: int = Query(50, ge=1, le=500),
+    db: Session = Depends(get_db)
+):
+    query = _intersection_nodes(db).filter(Intersection.area_id == area_id)
+    rows = keyset(query, Intersection.id, after, limit).all()
+    if not rows and after is None and not db.query(TrafficArea.id).filter(TrafficArea.id == area_id).first():
+        raise HTTPException(status_code=404, detail="Area not found")
+    return page(rows, limit, response)
+
+@router.get("/favorites", response_model=List[IntersectionTreeNode])
+def tree_favorites(
+    response: Response,
+    after: Optional[int] = None,
+    limit: int = Query(50, ge=1, le=500),
+    db: Session = Depends(get_db)
+):
+    query = _intersection_nodes(db).filter(Intersection.is_favorite == True)
+    rows = keyset(query, Intersection.id, after, limit).all()
+    return page(rows, limit, response)
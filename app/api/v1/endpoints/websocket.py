@@ -3,14 +3,22 @@ from sqlalchemy.orm import Session
 from app.db.session import get_db
 from app.models.traffic import TrafficLight
 from app.core.traffic_logic import TrafficController
-import json
-from typing import List
+from app.core.config import settings
+from app.core.serialization import dumps_text
+from app.core.journal import journal
+from app.core.phase_plans import STATUS_NAMES
+from app.api.v1.endpoints.journal import epoch
+from datetime import datetime
+import time
+from typing import List, Optional
 
 router = APIRouter()
 
 class ConnectionManager:
     def __init__(self):
         self.active_connections: List[WebSocket] = []
+        self.seq = 0
+        self.failed_sends = 0
 
     async def connect(self, websocket: WebSocket):
         await websocket.accept()
@@ -19,15 +27,81 @@ class ConnectionManager:
     def disconnect(self, websocket: WebSocket):
         self.active_connections.remove(websocket)
 
-    async def broadcast(self, message: dict):
+    async def broadcast(self, message: dict, ts: float = None):
+        # Frames are numbered so clients can spot missed ones, and carry the
+        # time their first change was committed (epoch seconds) for latency
+        self.seq += 1
+        message = {"seq": self.seq, "ts": ts or time.time(), **message}
+        # Encode once for all clients instead of once per connection
+        text = dumps_text(message)
         for connection in self.active_connections:
             try:
-                await connection.send_json(message)
+                await connection.send_text(text)
             except:
-                pass
+                self.failed_sends += 1
+
+    def stats(self) -> dict:
+        return {"connections": len(self.active_connections), "frames": self.seq, "failed_sends": self.failed_sends}
 
 manager = ConnectionManager()
 
+class FrameCoalescer:
+    """
+    Collects the state updates and phase schedules produced during one
+    controller tick and sends them as a single batch_state_update frame.
+    With a minimum frame interval, updates keep accumulating (latest state per
+    light wins) until it elapses.
+    """
+
+    def __init__(self, min_interval: float = 0.0):
+        self.min_interval = min_interval
+        self.pending = {}  # light_id -> state
+        self.schedules = {}  # intersection_id -> schedule
+        self.last_sent = 0.0
+        self.first_staged = 0.0  # Epoch time of the oldest change waiting
+
+    def stage(self, light_id: int, state: dict):
+        if not self.pending and not self.schedules:
+            self.first_staged = time.time()
+        self.pending[light_id] = state
+
+    def stage_schedule(self, schedule: dict):
+        if not self.pending and not self.schedules:
+            self.first_staged = time.time()
+        self.schedules[schedule["intersection_id"]] = schedule
+
+    def discard(self, light_ids):
+        """Drop staged updates and schedules superseded by an immediate broadcast."""
+        light_ids = set(light_ids)
+        for light_id in light_ids:
+            self.pending.pop(light_id, None)
+        for intersection_id, schedule in list(self.schedules.items()):
+            if light_ids.intersection(schedule["light_ids"]):
+                del self.schedules[intersection_id]
+
+    async def flush(self, force: bool = False, min_interval: float = None):
+        if not self.pending and not self.schedules:
+            return 0
+        now = time.monotonic()
+        if min_interval is None:
+            min_interval = self.min_interval
+        if not force and now - self.last_sent < min_interval:
+            return 0
+        message = {
+            "type": "batch_state_update",
+            "updates": [{"light_id": light_id, "state": state} for light_id, state in self.pending.items()]
+        }
+        if self.schedules:
+            message["schedules"] = list(self.schedules.values())
+        count = len(self.pending) + len(self.schedules)
+        self.pending = {}
+        self.schedules = {}
+        self.last_sent = now
+        await manager.broadcast(message, self.first_staged)
+        return count
+
+frame_coalescer = FrameCoalescer(settings.BROADCAST_MIN_INTERVAL)
+
 @router.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
     await manager.connect(websocket)
@@ -39,8 +113,38 @@ async def websocket_endpoint(websocket: WebSocket):
     except WebSocketDisconnect:
         manager.disconnect(websocket)
 
+@router.websocket("/ws/replay")
+async def replay_endpoint(
+    websocket: WebSocket,
+    start: datetime,
+    end: Optional[datetime] = None,
+    speed: float = 1.0,
+    intersection_id: Optional[int] = None,
+    light_id: Optional[int] = None
+):
+    """
+    Replay journaled state changes to this client as batch_state_update
+    frames, paced like the original run (`speed` times faster; 0 = as fast as
+    possible). End times are shifted so countdowns run as they did then.
+    """
+    await websocket.accept()
+    try:
+        async for ts, records in journal.replay(epoch(start), epoch(end), speed, intersection_id, light_id):
+            now = time.time()
+            updates = []
+            for _, _, record_light_id, status, _, end_time in records:
+                if speed > 0 and end_time:
+                    end_time = now + (end_time - ts) / speed
+                updates.append({"light_id": record_light_id, "state": {"status": STATUS_NAMES[status], "end_time": end_time}})
+            await websocket.send_text(dumps_text({"type": "batch_state_update", "replay_time": ts, "updates": updates}))
+        await websocket.send_text(dumps_text({"type": "replay_end"}))
+        await websocket.close()
+    except WebSocketDisconnect:
+        pass
+
 async def broadcast_state_update(light_id: int, state: dict):
     """Helper function to broadcast state updates"""
+    frame_coalescer.discard([light_id])
     await manager.broadcast({
         "type": "state_update",
         "light_id": light_id,
@@ -49,6 +153,7 @@ async def broadcast_state_update(light_id: int, state: dict):
 
 async def broadcast_batch_update(updates: list):
     """Helper function to broadcast multiple state updates"""
+    frame_coalescer.discard(update["light_id"] for update in updates)
     await manager.broadcast({
         "type": "batch_state_update",
         "updates": updates
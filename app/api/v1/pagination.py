@@ -0,0 +1,50 @@
+from fastapi import HTTPException, Response
+from app.core.serialization import json_response, records
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+def keyset(query, column, after: int = None, limit: int = 100):
+    """
+    Keyset-paginate `query` on a unique, indexed column: rows strictly after the
+    cursor, in column order. One extra row is fetched to know if another page exists.
+    """
+    if after is not None:
+        query = query.filter(column > after)
+    return query.order_by(column).limit(limit + 1)
+
+def page(rows: list, limit: int, response: Response, key=lambda row: row.id) -> list:
+    """Trim the look-ahead row and expose the next cursor in the X-Next-Cursor header."""
+    if len(rows) > limit:
+        rows = rows[:limit]
+        response.headers[NEXT_CURSOR_HEADER] = str(key(rows[-1]))
+    return rows
+
+def parse_fields(fields: str, schema) -> list:
+    """
+    Column names requested with `fields=a,b,c`, checked against a response schema.
+    The id is always included since it is the pagination cursor. None means all fields.
+    """
+    if not fields:
+        return None
+    names = [name.strip() for name in fields.split(",") if name.strip()]
+    unknown = [name for name in names if name not in schema.model_fields]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+    if "id" not in names:
+        names.insert(0, "id")
+    return list(dict.fromkeys(names))
+
+def columns(model, names: list) -> list:
+    return [getattr(model, name) for name in names]
+
+def cursor_headers(response: Response) -> dict:
+    if NEXT_CURSOR_HEADER in response.headers:
+        return {NEXT_CURSOR_HEADER: response.headers[NEXT_CURSOR_HEADER]}
+    return {}
+
+def projected(rows: list, names: list, response: Response) -> Response:
+    """
+    Serialize a page of column tuples (selected in `names` order) directly,
+    skipping ORM instances and response-model validation.
+    """
+    return json_response(records(names, rows), headers=cursor_headers(response))
@@ -0,0 +1,264 @@
+"""
+Traffic analytics rollups.
+
+Totals per light, intersection and area are kept at 1-minute, 15-minute and
+1-hour granularity:
+
+    density_sum, density_samples   reported densities (average = sum / samples)
+    green_seconds                  time spent GREEN (summed over the lights of an intersection or area)
+    overrides                      manual overrides applied
+    transitions                    status changes made by the cycle
+
+Events come from the state change journal, on its writer thread rather than
+the controller tick, and from density reports. An event adds to one bucket per
+granularity and scope, so each update is O(1). Additions accumulate in memory
+and are merged into the traffic_rollups table every ANALYTICS_FLUSH_INTERVAL
+seconds with an additive upsert, by a thread of their own so the journal
+writer never waits on the database. Queries read the table plus the additions
+not written yet, so charts never scan raw data.
+
+A light's transition or override is counted only when its status differs
+from the one of its previous record; an intersection's, once for all the
+lights it changed at the same moment.
+
+A light's green time is counted when its GREEN ends, split over the buckets
+it spanned.
+"""
+import logging
+import threading
+from datetime import datetime, timezone
+from sqlalchemy import delete, func, select
+from sqlalchemy.dialects.sqlite import insert
+from app.core.config import settings
+from app.core.journal import CYCLE, MANUAL
+from app.core.phase_plans import GREEN
+from app.db.session import SessionLocal
+from app.models.analytics import TrafficRollup
+from app.models.intersection import Intersection
+
+logger = logging.getLogger(__name__)
+
+GRANULARITIES = {"1m": 60, "15m": 900, "1h": 3600}
+# Seconds each granularity is kept for
+RETENTION = {60: 6 * 3600, 900: 7 * 86400, 3600: 90 * 86400}
+SCOPES = ("light", "intersection", "area")
+METRICS = ("density_sum", "density_samples", "green_seconds", "overrides", "transitions")
+DENSITY_SUM, DENSITY_SAMPLES, GREEN_SECONDS, OVERRIDES, TRANSITIONS = range(len(METRICS))
+KEY = ("scope", "entity_id", "granularity", "bucket_start")
+
+def _totals(values) -> dict:
+    density_sum, density_samples, green_seconds, overrides, transitions = values
+    return {
+        "density_avg": density_sum / density_samples if density_samples else None,
+        "density_samples": density_samples,
+        "green_seconds": round(green_seconds, 3),
+        "overrides": overrides,
+        "transitions": transitions
+    }
+
+class Analytics:
+    def __init__(self, flush_interval: float = None):
+        self.flush_interval = flush_interval or settings.ANALYTICS_FLUSH_INTERVAL
+        # scope -> (entity_id, granularity) -> bucket_start -> metric values, not yet written
+        self.pending = {scope: {} for scope in SCOPES}
+        self.area_of = {}  # intersection_id -> area_id
+        self.green_since = {}  # light_id -> when its current GREEN started
+        self.last_status = {}  # light_id -> status of its last record
+        self.last_event = {}  # (cause, intersection_id) -> ts of the last transition/override counted
+        self._lock = threading.Lock()  # Guards the in-memory state
+        self._flush_lock = threading.Lock()  # Held while pending additions move to the table
+        self._purged_at = 0.0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def set_areas(self, db):
+        """Map intersections to areas for the area rollups (on every topology load)."""
+        area_of = dict(db.execute(select(Intersection.id, Intersection.area_id)).all())
+        with self._lock:
+            self.area_of = area_of
+
+    # Events
+
+    def _bucket(self, scope: str, entity_id: int, seconds: int, bucket_start: int) -> list:
+        buckets = self.pending[scope].setdefault((entity_id, seconds), {})
+        values = buckets.get(bucket_start)
+        if values is None:
+            values = buckets[bucket_start] = [0.0, 0, 0.0, 0, 0]
+        return values
+
+    def _add(self, ts: float, targets, metric: int, amount):
+        for seconds in GRANULARITIES.values():
+            bucket_start = int(ts // seconds) * seconds
+            for scope, entity_id in targets:
+                self._bucket(scope, entity_id, seconds, bucket_start)[metric] += amount
+
+    def _add_green(self, since: float, until: float, targets):
+        for seconds in GRANULARITIES.values():
+            start = since
+            while start < until:
+                bucket_start = int(start // seconds) * seconds
+                end = min(until, bucket_start + seconds)
+                for scope, entity_id in targets:
+                    self._bucket(scope, entity_id, seconds, bucket_start)[GREEN_SECONDS] += end - start
+                start = end
+
+    def _targets(self, intersection_id: int, light_id: int = None) -> list:
+        targets = [("intersection", intersection_id)]
+        area_id = self.area_of.get(intersection_id)
+        if area_id is not None:
+            targets.append(("area", area_id))
+        if light_id is not None:
+            targets.append(("light", light_id))
+        return targets
+
+    def _observe_change(self, ts: float, intersection_id: int, light_id: int, status: int, cause: int):
+        changed = self.last_status.get(light_id) != status
+        self.last_status[light_id] = status
+        if changed and (cause == CYCLE or cause == MANUAL):
+            metric = TRANSITIONS if cause == CYCLE else OVERRIDES
+            self._add(ts, (("light", light_id),), metric, 1)
+            # One transition or override changes several lights at the same moment
+            if self.last_event.get((cause, intersection_id)) != ts:
+                self.last_event[(cause, intersection_id)] = ts
+                self._add(ts, self._targets(intersection_id), metric, 1)
+
+        since = self.green_since.get(light_id)
+        if status == GREEN:
+            if since is None:
+                self.green_since[light_id] = ts
+        elif since is not None:
+            del self.green_since[light_id]
+            self._add_green(since, ts, self._targets(intersection_id, light_id))
+
+    def consume(self, records):
+        """Journal consumer: fold a batch of state change records into the rollups."""
+        with self._lock:
+            for ts, intersection_id, light_id, status, cause, _ in records:
+                self._observe_change(ts, intersection_id, light_id, status, cause)
+
+    def observe_density(self, intersection_id: int, light_id: int, density: int, ts: float = None):
+        ts = ts or datetime.now(timezone.utc).timestamp()
+        targets = self._targets(intersection_id, light_id)
+        with self._lock:
+            self._add(ts, targets, DENSITY_SUM, density)
+            self._add(ts, targets, DENSITY_SAMPLES, 1)
+
+    # Storage (background thread)
+
+    def start(self):
+        """Start merging the pending additions into the table every flush_interval seconds."""
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="analytics-flush", daemon=True)
+        self._thread.start()
+
+    def close(self):
+        """Stop the background flush and write out what is still pending."""
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+        self.flush()
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Analytics flush error")
+
+    def flush(self) -> int:
+        """Merge the pending additions into the table. Returns the number of buckets written."""
+        with self._flush_lock:
+            with self._lock:
+                pending, self.pending = self.pending, {scope: {} for scope in SCOPES}
+            rows = [
+                dict(zip(KEY + METRICS, (scope, entity_id, seconds, bucket_start, *values)))
+                for scope, series in pending.items()
+                for (entity_id, seconds), buckets in series.items()
+                for bucket_start, values in buckets.items()
+            ]
+            if not rows:
+                return 0
+            statement = insert(TrafficRollup)
+            statement = statement.on_conflict_do_update(
+                index_elements=list(KEY),
+                set_={name: getattr(TrafficRollup, name) + getattr(statement.excluded, name) for name in METRICS}
+            )
+            with SessionLocal() as db:
+                db.execute(statement, rows)
+                self._purge(db)
+                db.commit()
+            return len(rows)
+
+    def _purge(self, db):
+        now = datetime.now(timezone.utc).timestamp()
+        if now - self._purged_at < 3600:
+            return
+        self._purged_at = now
+        for seconds, keep in RETENTION.items():
+            db.execute(delete(TrafficRollup).where(
+                TrafficRollup.granularity == seconds, TrafficRollup.bucket_start < now - keep
+            ))
+
+    # Queries
+
+    def series(self, scope: str, entity_id: int, granularity: str, start: float, end: float) -> list:
+        """Per-bucket totals of one light, intersection or area, for buckets starting in [start, end)."""
+        seconds = GRANULARITIES[granularity]
+        first = int(start // seconds) * seconds
+        buckets = {}
+        with self._flush_lock:
+            with SessionLocal() as db:
+                rows = db.execute(
+                    select(TrafficRollup.bucket_start, *[getattr(TrafficRollup, name) for name in METRICS])
+                    .where(
+                        TrafficRollup.scope == scope, TrafficRollup.entity_id == entity_id,
+                        TrafficRollup.granularity == seconds,
+                        TrafficRollup.bucket_start >= first, TrafficRollup.bucket_start < end
+                    )
+                ).all()
+            for bucket_start, *values in rows:
+                buckets[bucket_start] = values
+            with self._lock:
+                unwritten = dict(self.pending[scope].get((entity_id, seconds), {}))
+        for bucket_start, values in unwritten.items():
+            if first <= bucket_start < end:
+                current = buckets.setdefault(bucket_start, [0.0, 0, 0.0, 0, 0])
+                for k, value in enumerate(values):
+                    current[k] += value
+        return [{"bucket_start": bucket_start, **_totals(buckets[bucket_start])} for bucket_start in sorted(buckets)]
+
+    def summary(self, scope: str, granularity: str, start: float, end: float) -> list:
+        """Totals per light, intersection or area over the buckets starting in [start, end)."""
+        seconds = GRANULARITIES[granularity]
+        first = int(start // seconds) * seconds
+        totals = {}
+        with self._flush_lock:
+            with SessionLocal() as db:
+                rows = db.execute(
+                    select(TrafficRollup.entity_id, *[func.sum(getattr(TrafficRollup, name)) for name in METRICS])
+                    .where(
+                        TrafficRollup.scope == scope, TrafficRollup.granularity == seconds,
+                        TrafficRollup.bucket_start >= first, TrafficRollup.bucket_start < end
+                    )
+                    .group_by(TrafficRollup.entity_id)
+                ).all()
+            for entity_id, *values in rows:
+                totals[entity_id] = values
+            with self._lock:
+                unwritten = [
+                    (entity_id, list(buckets.items()))
+                    for (entity_id, bucket_seconds), buckets in self.pending[scope].items()
+                    if bucket_seconds == seconds
+                ]
+        for entity_id, buckets in unwritten:
+            for bucket_start, values in buckets:
+                if first <= bucket_start < end:
+                    current = totals.setdefault(entity_id, [0.0, 0, 0.0, 0, 0])
+                    for k, value in enumerate(values):
+                        current[k] += value
+        return [{"entity_id": entity_id, **_totals(totals[entity_id])} for entity_id in sorted(totals)]
+
+analytics = Analytics()
@@ -0,0 +1,100 @@
+"""
+Synthetic city generator for demos, load tests and benchmarks.
+
+Topologies are fully determined by the generator settings and the random seed,
+so the same arguments always produce the same cities, codes, phase plans,
+durations and coordinates. Records are written through the bulk importer.
+"""
+import random
+from datetime import datetime, timezone
+from app.core.light_store import LightStore
+from app.core.phase_plans import DEFAULT_PLAN
+from app.core.topology_import import TopologyImporter
+
+CITY_NAMES = [
+    ("Metropolis", "MET"), ("Gotham", "GOT"), ("Star City", "STC"), ("Central City", "CEN"),
+    ("Coast City", "CST"), ("Riverside", "RIV"), ("Lakeview", "LKV"), ("Hill Valley", "HLV")
+]
+AREA_NAMES = [
+    ("Downtown", "DT"), ("Uptown", "UP"), ("Midtown", "MT"), ("Old Town", "OT"),
+    ("Harbor", "HB"), ("University", "UN"), ("Industrial Park", "IP"), ("Riverside", "RS")
+]
+STREETS = [
+    "Main St", "Broadway", "Park Ave", "Elm St", "Oak St", "Maple Ave", "Pine St",
+    "Cedar Rd", "Lake Dr", "Hill St", "Market St", "Church St", "Mill Rd", "Bridge St"
+]
+
+# Share of generated intersections per phase plan
+PLAN_WEIGHTS = {DEFAULT_PLAN: 70, "t_junction": 15, "protected_left": 10, "five_way": 5}
+DURATIONS = (30, 45, 60, 60, 90)
+
+def _numbered(names: list, index: int) -> tuple:
+    name, code = names[index % len(names)]
+    if index >= len(names):
+        round_ = index // len(names) + 1
+        return f"{name} {round_}", f"{code}{round_}"
+    return name, code
+
+def generate_records(cities: int = 1, areas_per_city: int = 2, intersections_per_area: int = 2, seed: int = 0):
+    """Yield one import record per intersection (see app/core/topology_import.py)."""
+    rng = random.Random(seed)
+    plans, weights = zip(*PLAN_WEIGHTS.items())
+    number = 0
+    for c in range(cities):
+        city_name, city_code = _numbered(CITY_NAMES, c)
+        lat, lon = rng.uniform(-50, 60), rng.uniform(-120, 140)
+        for a in range(areas_per_city):
+            area_name, area_code = _numbered(AREA_NAMES, a)
+            area_lat, area_lon = lat + rng.uniform(-0.05, 0.05), lon + rng.uniform(-0.05, 0.05)
+            for n in range(intersections_per_area):
+                number += 1
+                first, second = rng.sample(STREETS, 2)
+                yield {
+                    "city_code": city_code,
+                    "city_name": city_name,
+                    "area_code": area_code,
+                    "area_name": area_name,
+                    "code": f"INT-{number:03d}",
+                    "name": f"{first} & {second}",
+                    "location": f"{area_lat + rng.uniform(-0.01, 0.01):.6f}, {area_lon + rng.uniform(-0.01, 0.01):.6f}",
+                    "phase_plan": rng.choices(plans, weights)[0],
+                    "duration": rng.choice(DURATIONS)
+                }
+
+def generate_city(db, cities: int = 1, areas_per_city: int = 2, intersections_per_area: int = 2,
+                  seed: int = 0, batch_size: int = 5000) -> dict:
+    """Bulk-insert a synthetic topology and return the importer summary."""
+    records = generate_records(cities, areas_per_city, intersections_per_area, seed)
+    return TopologyImporter(db, batch_size=batch_size).run(records)
+
+async def initialize_phases(db, redis, seed: int = 0, stagger: bool = True, now: float = None) -> int:
+    """
+    Write every intersection's starting phase to Redis and the lights' statuses
+    to match. Staggered, each intersection starts at a random phase partway
+    through it, so the cycle doesn't flip the whole city on the same tick.
+    Otherwise all start at phase 0 on the controller's first tick.
+    """
+    rng = random.Random(seed)
+    now = now or datetime.now(timezone.utc).timestamp()
+
+    store = LightStore()
+    await store.load(db, redis, use_snapshot=False)
+    mapping = {}
+    for i, intersection_id in enumerate(store.intersection_id):
+        plan = store.plan_of(i)
+        if stagger:
+            durations = store.durations(i)
+            phase = rng.randrange(plan.phase_count)
+            phase_end = now + rng.uniform(0, durations[phase])
+        else:
+            phase, phase_end = 0, 0.0
+        for li in store.lights_of(i):
+            if store.movement[li] >= 0:
+                store.set_status(li, plan.status[phase][store.movement[li]])
+        mapping[f"intersection:{intersection_id}:phase"] = phase
+        mapping[f"intersection:{intersection_id}:phase_end"] = phase_end
+
+    if mapping:
+        await redis.mset(mapping)
+    store.flush(db)
+    return len(store.intersection_id)
@@ -6,8 +6,69 @@ class Settings(BaseSettings):
     PROJECT_NAME: str = "Smart City Traffic Management System"
     API_V1_STR: str = "/api/v1"
     DATABASE_URL: str = "sqlite:///./traffic.db"
+    # SQLite pragmas per connection: "wal" or "default" (see app.db.storage)
+    SQLITE_PROFILE: str = "wal"
+    SQL_STATEMENT_CACHE: int = 256  # Compiled and prepared statements kept
     REDIS_URL: str = "redis://localhost:6379/0"
 
+    # Minimum seconds between coalesced controller frames (0 = one frame per tick)
+    BROADCAST_MIN_INTERVAL: float = 0.0
+
+    # Transitions published ahead in each intersection's phase schedule
+    SCHEDULE_TRANSITIONS: int = 16
+
+    # Emergency-vehicle preemption
+    PREEMPTION_HOLD_SECONDS: int = 20
+    PREEMPTION_ALL_RED_SECONDS: int = 1
+
+    # Serialized read responses kept by the response cache
+    RESPONSE_CACHE_MAX_ENTRIES: int = 1024
+    RESPONSE_CACHE_MAX_BYTES: int = 32 * 1024 * 1024
+
+    # Controller state snapshot used to resume the cycles after a restart
+    SNAPSHOT_PATH: str = "./controller_state.snap"
+    SNAPSHOT_INTERVAL: float = 5.0
+
+    # Append-only journal of light state changes
+    JOURNAL_DIR: str = "./journal"
+    JOURNAL_SEGMENT_RECORDS: int = 256 * 1024  # 8 MB segments
+    JOURNAL_MAX_SEGMENTS: int = 64
+    JOURNAL_FLUSH_INTERVAL: float = 1.0
+
+    # Grid cell size of the intersection spatial index (0.01 deg is about 1.1 km)
+    SPATIAL_CELL_DEGREES: float = 0.01
+
+    # Seconds between writes of the analytics rollups
+    ANALYTICS_FLUSH_INTERVAL: float = 10.0
+
+    # Controller tick watchdog (see app.core.watchdog)
+    TICK_BUDGET: float = 0.5  # Seconds of work per one-second tick
+    LOOP_LAG_BUDGET: float = 0.25  # Seconds the event loop may wake the tick late
+    PERSIST_MAX_DEFER: float = 10.0
+    SHED_BROADCAST_INTERVAL: float = 2.0
+    ISOLATION_MAX_BACKOFF: float = 60.0
+
+    # Green wave offsets (see app.core.green_wave)
+    GREEN_WAVE_SPEED: float = 13.9  # m/s (50 km/h)
+    GREEN_WAVE_MAX_LINK: float = 800.0  # Meters between coordinated neighbours
+    GREEN_WAVE_TIME_BUDGET: float = 5.0  # Seconds of compute per optimization
+    GREEN_WAVE_TOLERANCE: float = 3.0  # Arrival error (seconds) counted as aligned
+    GREEN_WAVE_MAX_STRETCH: float = 0.5  # Most phase 0 is lengthened or shortened per cycle, as a share
+    GREEN_WAVE_WORKERS: int = 1
+
+    # Logging: "name=LEVEL,..." overrides LOG_LEVEL per module; LOG_FORMAT is "text" or "json"
+    LOG_LEVEL: str = "INFO"
+    LOG_LEVELS: str = ""
+    LOG_FORMAT: str = "text"
+    LOG_QUEUE_SIZE: int = 10_000
+    # The same warning or error is written at most LOG_RATE_LIMIT times per LOG_RATE_WINDOW seconds
+    LOG_RATE_LIMIT: int = 10
+    LOG_RATE_WINDOW: float = 60.0
+
+    # Content-hashed, precompressed copies of app/static served from /assets
+    ASSETS_DIR: str = "./assets"
+    ASSETS_BUNDLE: bool = True  # Serve the dashboard's ES modules as one file
+
     @property
     def ASYNC_DATABASE_URL(self) -> str:
         url = self.DATABASE_URL
@@ -17,6 +78,24 @@ class Settings(BaseSettings):
                 return "sqlite:////tmp/traffic.db"
         return url
 
+    @property
+    def SNAPSHOT_FILE(self) -> str:
+        if os.environ.get("VERCEL") and not os.path.isabs(self.SNAPSHOT_PATH):
+            return os.path.join("/tmp", os.path.basename(self.SNAPSHOT_PATH))
+        return self.SNAPSHOT_PATH
+
+    @property
+    def JOURNAL_DIRECTORY(self) -> str:
+        if os.environ.get("VERCEL") and not os.path.isabs(self.JOURNAL_DIR):
+            return os.path.join("/tmp", os.path.basename(os.path.normpath(self.JOURNAL_DIR)))
+        return self.JOURNAL_DIR
+
+    @property
+    def ASSETS_DIRECTORY(self) -> str:
+        if os.environ.get("VERCEL") and not os.path.isabs(self.ASSETS_DIR):
+            return os.path.join("/tmp", os.path.basename(os.path.normpath(self.ASSETS_DIR)))
+        return self.ASSETS_DIR
+
     class Config:
         env_file = ".env"
 
@@ -0,0 +1,327 @@
+"""
+Green wave: coordinated cycle offsets for neighbouring intersections.
+
+An intersection's offset is where its cycle starts (phase 0), in seconds
+modulo its cycle length, counted from the Unix epoch. For a link from u to v
+(travel time t at GREEN_WAVE_SPEED), a platoon released when u's green for
+that direction starts arrives at v just as v's green starts if
+
+    offset_v + green_start_v  =  offset_u + green_start_u + t   (mod cycle)
+
+Links are taken from an explicit corridor (consecutive intersections) or,
+for a whole area, from each intersection's nearest neighbour to the north,
+east, south and west within GREEN_WAVE_MAX_LINK meters. Only intersections
+with the same cycle length can stay coordinated, so links between different
+cycle lengths are left out.
+
+The optimizer minimizes the sum of squared arrival errors over both
+directions of every link. It starts from a spanning tree that makes one
+direction of each tree link exact. Then it sweeps the intersections, moving
+each one to the exact circular least-squares optimum given its neighbours,
+until a sweep stops improving or the GREEN_WAVE_TIME_BUDGET runs out. It is
+pure CPU work, so it runs in a process pool, away from the controller's
+event loop.
+
+The controller applies the offsets at cycle boundaries, by lengthening or
+shortening phase 0 by at most GREEN_WAVE_MAX_STRETCH of its length per
+cycle. Larger corrections are spread over several cycles.
+"""
+import asyncio
+import logging
+import math
+import multiprocessing
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from app.core.config import settings
+from app.core.spatial import METERS_PER_DEGREE, approach_direction
+
+logger = logging.getLogger(__name__)
+
+ALIGNED_SECONDS = 0.5  # Closer than this to its offset, a cycle is left alone
+QUADRANTS = 4
+
+# Optimizer (runs in a worker process)
+
+def _circular(x: float, cycle: float) -> float:
+    """x wrapped into [-cycle/2, cycle/2)."""
+    return (x + cycle / 2) % cycle - cycle / 2
+
+def _best_offset(targets: list, cycle: float) -> float:
+    """The offset minimizing the sum of squared circular distances to `targets`."""
+    targets = sorted(t % cycle for t in targets)
+    m = len(targets)
+    total = sum(targets)
+    best, best_cost = targets[0], float("inf")
+    # Cutting the circle before each target gives one unwrapped ordering; its mean is a candidate
+    for r in range(m):
+        candidate = ((total + r * cycle) / m) % cycle
+        cost = 0.0
+        for t in targets:
+            d = _circular(candidate - t, cycle)
+            cost += d * d
+        if cost < best_cost:
+            best, best_cost = candidate, cost
+    return best
+
+def _neighbour_links(points: list, max_link: float) -> list:
+    """Undirected (a, b) links from each point to its nearest neighbour per compass quadrant."""
+    n = len(points)
+    if n < 2:
+        return []
+    mean_lat = sum(lat for lat, _ in points) / n
+    scale = METERS_PER_DEGREE * math.cos(math.radians(mean_lat))
+    xy = [(lon * scale, lat * METERS_PER_DEGREE) for lat, lon in points]
+    xs, ys = [x for x, _ in xy], [y for _, y in xy]
+    spread = max(max(xs) - min(xs), max(ys) - min(ys), 1.0)
+    # About four points per cell
+    cell = min(max_link, max(1.0, spread * 2 / math.sqrt(n)))
+    grid = {}
+    for k, (x, y) in enumerate(xy):
+        grid.setdefault((int(x // cell), int(y // cell)), []).append(k)
+
+    links = set()
+    rings = int(max_link // cell) + 1
+    for k, (x, y) in enumerate(xy):
+        cx, cy = int(x // cell), int(y // cell)
+        best = [None] * QUADRANTS  # (distance, index) per quadrant
+        for ring in range(rings + 1):
+            if ring:
+                # Everything left is at least (ring - 1) cells away
+                reach = (ring - 1) * cell
+                if reach > max_link or all(b is not None and b[0] <= reach for b in best):
+                    break
+                cells = [(i, cy - ring) for i in range(cx - ring, cx + ring + 1)] + \
+                        [(i, cy + ring) for i in range(cx - ring, cx + ring + 1)] + \
+                        [(cx - ring, j) for j in range(cy - ring + 1, cy + ring)] + \
+                        [(cx + ring, j) for j in range(cy - ring + 1, cy + ring)]
+            else:
+                cells = [(cx, cy)]
+            for key in cells:
+                for other in grid.get(key, ()):
+                    if other == k:
+                        continue
+                    dx, dy = xy[other][0] - x, xy[other][1] - y
+                    distance = math.hypot(dx, dy)
+                    if distance > max_link or distance == 0:
+                        continue
+                    quadrant = int((math.degrees(math.atan2(dx, dy)) + 45) % 360 // 90)
+                    if best[quadrant] is None or distance < best[quadrant][0]:
+                        best[quadrant] = (distance, other)
+        for b in best:
+            if b is not None:
+                links.add((min(k, b[1]), max(k, b[1])))
+    return sorted(links)
+
+def optimize_offsets(problem: dict) -> dict:
+    """
+    Offsets for the intersections of `problem`:
+
+        nodes      [(intersection_id, lat, lon, cycle, {movement: green start in the cycle}, current offset or None)]
+        links      [(a, b)] node index pairs of an explicit corridor, or None for nearest neighbours
+        speed      design speed in m/s
+        max_link   longest neighbour link in meters
+        budget     seconds of compute allowed
+        tolerance  arrival error (seconds) still counted as aligned
+    """
+    started = time.monotonic()
+    deadline = started + problem["budget"]
+    nodes = problem["nodes"]
+    n = len(nodes)
+    points = [(node[1], node[2]) for node in nodes]
+    pairs = problem["links"] if problem["links"] is not None else _neighbour_links(points, problem["max_link"])
+
+    # Directed links u -> v wanting offset_v = offset_u + delta (mod cycle)
+    directed = []
+    skipped = {"cycle_mismatch": 0, "no_movement": 0}
+    scale = METERS_PER_DEGREE * math.cos(math.radians(sum(lat for lat, _ in points) / n)) if n else 0
+    for a, b in pairs:
+        if nodes[a][3] != nodes[b][3]:
+            skipped["cycle_mismatch"] += 2
+            continue
+        dx = (nodes[b][2] - nodes[a][2]) * scale
+        dy = (nodes[b][1] - nodes[a][1]) * METERS_PER_DEGREE
+        travel = math.hypot(dx, dy) / problem["speed"]
+        for u, v, bearing in ((a, b, math.atan2(dx, dy)), (b, a, math.atan2(-dx, -dy))):
+            # A platoon heading along `bearing` is served by the same movement at both ends
+            movement = approach_direction(math.degrees(bearing))
+            start_u, start_v = nodes[u][4].get(movement), nodes[v][4].get(movement)
+            if start_u is None or start_v is None:
+                skipped["no_movement"] += 1
+                continue
+            directed.append((u, v, start_u + travel - start_v))
+
+    incident = [[] for _ in range(n)]  # (other node, delta, sign): offset = other + sign * delta
+    for u, v, delta in directed:
+        incident[v].append((u, delta, 1))
+        incident[u].append((v, delta, -1))
+
+    def rms(offsets) -> tuple:
+        errors = [
+            _circular(offsets[v] - offsets[u] - delta, nodes[v][3])
+            for u, v, delta in directed if offsets[u] is not None and offsets[v] is not None
+        ]
+        if not errors:
+            return None, None
+        aligned = sum(abs(e) <= problem["tolerance"] for e in errors) / len(errors)
+        return round(math.sqrt(sum(e * e for e in errors) / len(errors)), 2), round(aligned, 3)
+
+    current = [node[5] for node in nodes]
+    rms_before, aligned_before = rms(current)
+
+    # Spanning trees: one direction of each tree link exact
+    offsets = [None] * n
+    components = 0
+    for root in sorted(range(n), key=lambda k: -len(incident[k])):
+        if offsets[root] is not None or not incident[root]:
+            continue
+        components += 1
+        offsets[root] = current[root] if current[root] is not None else 0.0
+        queue = deque([root])
+        members = [root]
+        while queue:
+            x = queue.popleft()
+            for y, delta, sign in incident[x]:
+                if offsets[y] is None:
+                    offsets[y] = (offsets[x] - sign * delta) % nodes[y][3]
+                    members.append(y)
+                    queue.append(y)
+
+    # Sweeps of exact per-node optima
+    sweeps = 0
+    truncated = False
+    linked = [k for k in range(n) if incident[k]]
+    while linked:
+        sweeps += 1
+        moved = 0.0
+        for k in linked:
+            if time.monotonic() > deadline:
+                truncated = True
+                break
+            cycle = nodes[k][3]
+            best = _best_offset([offsets[other] + sign * delta for other, delta, sign in incident[k]], cycle)
+            moved += abs(_circular(best - offsets[k], cycle))
+            offsets[k] = best
+        if truncated or moved < 0.01 * len(linked):
+            break
+
+    # Rotate each cycle length's offsets as a whole to stay closest to the current ones
+    by_cycle = {}
+    for k in linked:
+        if current[k] is not None:
+            by_cycle.setdefault(nodes[k][3], []).append(k)
+    for cycle, members in by_cycle.items():
+        angles = [2 * math.pi * (current[k] - offsets[k]) / cycle for k in members]
+        shift = math.atan2(sum(map(math.sin, angles)), sum(map(math.cos, angles))) * cycle / (2 * math.pi)
+        for k in range(n):
+            if offsets[k] is not None and nodes[k][3] == cycle:
+                offsets[k] = (offsets[k] + shift) % cycle
+
+    rms_after, aligned_after = rms(offsets)
+    return {
+        "intersections": n,
+        "links": len(directed),
+        "skipped_links": skipped,
+        "components": components,
+        "sweeps": sweeps,
+        "truncated": truncated,
+        "rms_error_before": rms_before,
+        "rms_error_after": rms_after,
+        "aligned_before": aligned_before,
+        "aligned_after": aligned_after,
+        "elapsed": round(time.monotonic() - started, 3),
+        "offsets": {nodes[k][0]: (round(offsets[k], 2), nodes[k][3]) for k in range(n) if offsets[k] is not None}
+    }
+
+# Controller side
+
+class GreenWave:
+    def __init__(self):
+        self.targets = {}  # intersection_id -> (offset, cycle length)
+        self.runs = {}  # "area:<id>" or "corridor" -> summary of the last optimization
+        self.corrections = 0
+        self._executor = None
+
+    def executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # Spawned, not forked: the parent has threads (journal, logging) whose locks must not be copied
+            self._executor = ProcessPoolExecutor(
+                max_workers=settings.GREEN_WAVE_WORKERS, mp_context=multiprocessing.get_context("spawn")
+            )
+        return self._executor
+
+    def problem(self, store, points: dict, intersection_ids: list, corridor: bool = False) -> dict:
+        """Optimizer input for the intersections known to the controller and located on the map."""
+        nodes = []
+        for intersection_id in intersection_ids:
+            i = store.index_of_intersection(intersection_id)
+            point = points.get(intersection_id)
+            if i < 0 or point is None:
+                continue
+            plan = store.plan_of(i)
+            durations = store.durations(i)
+            cycle = sum(durations)
+            starts = {}
+            for movement, name in enumerate(plan.movements):
+                phase = plan.green_phase[movement]
+                if phase >= 0:
+                    starts[name] = sum(durations[:phase])
+            current = None
+            if store.phase_end[i]:
+                current = (store.phase_end[i] - sum(durations[:store.phase[i] + 1])) % cycle
+            nodes.append((intersection_id, point[0], point[1], cycle, starts, current))
+        return {
+            "nodes": nodes,
+            "links": [(k, k + 1) for k in range(len(nodes) - 1)] if corridor else None,
+            "speed": settings.GREEN_WAVE_SPEED,
+            "max_link": settings.GREEN_WAVE_MAX_LINK,
+            "budget": settings.GREEN_WAVE_TIME_BUDGET,
+            "tolerance": settings.GREEN_WAVE_TOLERANCE
+        }
+
+    async def optimize(self, key: str, problem: dict) -> dict:
+        """Run the optimizer in the process pool and adopt its offsets."""
+        loop = asyncio.get_running_loop()
+        result = await loop.run_in_executor(self.executor(), optimize_offsets, problem)
+        for intersection_id, target in result["offsets"].items():
+            self.targets[intersection_id] = target
+        summary = {k: v for k, v in result.items() if k != "offsets"}
+        self.runs[key] = summary
+        logger.info("Green wave %s: %s", key, summary)
+        return result
+
+    def adjustment(self, intersection_id: int, start: float, durations: list) -> float:
+        """
+        Seconds to add to phase 0 of a cycle starting at `start`, so the next
+        cycle starts closer to the intersection's offset (0 if it has none).
+        """
+        target = self.targets.get(intersection_id)
+        if target is None:
+            return 0.0
+        offset, cycle = target
+        if sum(durations) != cycle:
+            # Its durations changed since the optimization
+            del self.targets[intersection_id]
+            return 0.0
+        error = _circular(offset - start, cycle)
+        if abs(error) < ALIGNED_SECONDS:
+            return 0.0
+        limit = settings.GREEN_WAVE_MAX_STRETCH * durations[0]
+        self.corrections += 1
+        return max(-limit, min(limit, error))
+
+    def clear(self) -> int:
+        count = len(self.targets)
+        self.targets.clear()
+        self.runs.clear()
+        return count
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def stats(self) -> dict:
+        return {"targets": len(self.targets), "corrections": self.corrections, "runs": self.runs}
+
+green_wave = GreenWave()
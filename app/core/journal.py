@@ -0,0 +1,358 @@
+"""
+Append-only journal of light state changes.
+
+Every status change made by the controller, an operator or a preemption is
+kept as a fixed-size binary record (little-endian, 32 bytes):
+
+    ts float64, intersection_id int32, light_id int32, status uint8, cause uint8, end_time float64
+
+Records are appended to numbered segment files of at most
+JOURNAL_SEGMENT_RECORDS records; beyond JOURNAL_MAX_SEGMENTS the oldest
+segment is deleted. Timestamps never decrease across the journal (a record
+older than the previous one is stamped with the previous time), so the
+segment list, with each segment's first and last time, is the coarse time
+index and a binary search over a segment's fixed-size records finds the start
+of a range inside it.
+
+record() only packs into an in-memory buffer. A background thread writes the
+buffer out every JOURNAL_FLUSH_INTERVAL seconds, so the controller tick never
+waits on disk, and then hands the records to its consumers (analytics). If
+the writer falls behind by MAX_PENDING_RECORDS, further records are dropped
+and counted.
+"""
+import asyncio
+import logging
+import mmap
+import os
+import struct
+import threading
+from datetime import datetime, timezone
+from app.core.config import settings
+from app.core.phase_plans import STATUS_NAMES
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"TLJRNL"
+JOURNAL_VERSION = 1
+HEADER = struct.Struct("<6sHd")  # magic, version, created_at
+RECORD = struct.Struct("<diiBB6xd")  # ts, intersection_id, light_id, status, cause, end_time
+SUFFIX = ".jrn"
+MAX_PENDING_RECORDS = 1_000_000
+
+CAUSES = ("cycle", "manual", "expiry", "reset", "safety", "preemption")
+CYCLE, MANUAL, EXPIRY, RESET, SAFETY, PREEMPTION = range(len(CAUSES))
+
+def as_dict(record: tuple) -> dict:
+    ts, intersection_id, light_id, status, cause, end_time = record
+    return {
+        "ts": ts,
+        "intersection_id": intersection_id,
+        "light_id": light_id,
+        "status": STATUS_NAMES[status],
+        "cause": CAUSES[cause],
+        "end_time": end_time
+    }
+
+class Segment:
+    def __init__(self, number: int, path: str, count: int = 0, first_ts: float = 0.0, last_ts: float = 0.0):
+        self.number = number
+        self.path = path
+        self.count = count
+        self.first_ts = first_ts
+        self.last_ts = last_ts
+
+def _ts_at(buffer, k: int) -> float:
+    return RECORD.unpack_from(buffer, HEADER.size + k * RECORD.size)[0]
+
+def _bisect(buffer, count: int, ts: float, right: bool = False) -> int:
+    """First record index at or after `ts` (after it, with right=True)."""
+    lo, hi = 0, count
+    while lo < hi:
+        mid = (lo + hi) // 2
+        value = _ts_at(buffer, mid)
+        if value < ts or (right and value == ts):
+            lo = mid + 1
+        else:
+            hi = mid
+    return lo
+
+class Journal:
+    def __init__(self, directory: str = None, segment_records: int = None, max_segments: int = None,
+                 flush_interval: float = None):
+        self.directory = directory or settings.JOURNAL_DIRECTORY
+        self.segment_records = segment_records or settings.JOURNAL_SEGMENT_RECORDS
+        self.max_segments = max_segments or settings.JOURNAL_MAX_SEGMENTS
+        self.flush_interval = flush_interval or settings.JOURNAL_FLUSH_INTERVAL
+
+        self.segments = []
+        self._file = None  # Open handle on the last segment
+        self._opened = False
+
+        self._pending = bytearray()
+        self._last_ts = 0.0
+        self._lock = threading.Lock()  # Guards the pending buffer
+        self._write_lock = threading.Lock()  # Guards the files and the segment list
+        self._stop = threading.Event()
+        self._thread = None
+        self.consumers = []  # Called with each batch of records written
+
+        self.recorded = 0
+        self.written = 0
+        self.dropped = 0
+
+    # Recording (controller side)
+
+    def record(self, intersection_id: int, light_id: int, status: int, end_time: float, cause: int,
+               ts: float = None):
+        ts = ts or datetime.now(timezone.utc).timestamp()
+        with self._lock:
+            if len(self._pending) >= MAX_PENDING_RECORDS * RECORD.size:
+                self.dropped += 1
+                return
+            if ts < self._last_ts:
+                ts = self._last_ts
+            self._last_ts = ts
+            self._pending += RECORD.pack(ts, intersection_id, light_id, status, cause, end_time or 0.0)
+            self.recorded += 1
+
+    def subscribe(self, consumer):
+        """
+        Have `consumer(records)` called with every batch of record tuples
+        written (an empty one on quiet flushes), on the writer thread.
+        """
+        self.consumers.append(consumer)
+
+    # Writing (background thread)
+
+    def start(self):
+        """Open the journal and start the background writer."""
+        if self._thread is not None:
+            return
+        self._open()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="journal-writer", daemon=True)
+        self._thread.start()
+
+    def close(self):
+        """Stop the writer and write out everything still buffered."""
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+        self.flush()
+        with self._write_lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Journal write error")
+
+    def _open(self):
+        """Index the existing segments and resume appending to the last one."""
+        with self._write_lock:
+            if self._opened:
+                return
+            os.makedirs(self.directory, exist_ok=True)
+            segments = []
+            for name in sorted(os.listdir(self.directory)):
+                if not name.endswith(SUFFIX) or not name[:-len(SUFFIX)].isdigit():
+                    continue
+                segment = self._index_segment(int(name[:-len(SUFFIX)]), os.path.join(self.directory, name))
+                if segment is not None:
+                    segments.append(segment)
+            self.segments = segments
+            if segments:
+                last = segments[-1]
+                # Drop a record torn by a crash mid-write
+                with open(last.path, "r+b") as f:
+                    f.truncate(HEADER.size + last.count * RECORD.size)
+                self._last_ts = max(self._last_ts, last.last_ts)
+            self._opened = True
+
+    @staticmethod
+    def _index_segment(number: int, path: str):
+        try:
+            with open(path, "rb") as f:
+                header = f.read(HEADER.size)
+                size = os.fstat(f.fileno()).st_size
+                if len(header) < HEADER.size:
+                    return None
+                magic, version, _ = HEADER.unpack(header)
+                if magic != MAGIC or version != JOURNAL_VERSION:
+                    return None
+                count = (size - HEADER.size) // RECORD.size
+                segment = Segment(number, path, count)
+                if count:
+                    segment.first_ts = RECORD.unpack(f.read(RECORD.size))[0]
+                    f.seek(HEADER.size + (count - 1) * RECORD.size)
+                    segment.last_ts = RECORD.unpack(f.read(RECORD.size))[0]
+                return segment
+        except OSError:
+            return None
+
+    def _new_segment(self) -> Segment:
+        number = self.segments[-1].number + 1 if self.segments else 0
+        path = os.path.join(self.directory, f"{number:010d}{SUFFIX}")
+        with open(path, "wb") as f:
+            f.write(HEADER.pack(MAGIC, JOURNAL_VERSION, datetime.now(timezone.utc).timestamp()))
+        segment = Segment(number, path)
+        self.segments.append(segment)
+        while len(self.segments) > self.max_segments:
+            oldest = self.segments.pop(0)
+            try:
+                os.remove(oldest.path)
+            except OSError:
+                pass
+        return segment
+
+    def flush(self) -> int:
+        """Write the buffered records out. Returns how many were written."""
+        self._open()
+        with self._write_lock:
+            with self._lock:
+                pending, self._pending = self._pending, bytearray()
+            if pending:
+                self._write(pending)
+            # Still under the lock, so consumers see the batches in order
+            for consumer in self.consumers:
+                try:
+                    consumer(RECORD.iter_unpack(pending))
+                except Exception:
+                    logger.exception("Journal consumer error")
+        return len(pending) // RECORD.size
+
+    def _write(self, pending: bytearray):
+        data = memoryview(pending)
+        total = len(pending) // RECORD.size
+        position = 0
+        while position < total:
+            segment = self.segments[-1] if self.segments else None
+            if segment is None or segment.count >= self.segment_records:
+                if self._file is not None:
+                    self._file.close()
+                    self._file = None
+                segment = self._new_segment()
+            if self._file is None:
+                self._file = open(segment.path, "ab")
+            n = min(total - position, self.segment_records - segment.count)
+            self._file.write(data[position * RECORD.size:(position + n) * RECORD.size])
+            if not segment.count:
+                segment.first_ts = RECORD.unpack_from(data, position * RECORD.size)[0]
+            segment.last_ts = RECORD.unpack_from(data, (position + n - 1) * RECORD.size)[0]
+            segment.count += n
+            position += n
+        self._file.flush()
+        data.release()
+        self.written += total
+
+    # Reading
+
+    def iter_records(self, start: float = None, end: float = None, intersection_id: int = None,
+                     light_id: int = None):
+        """
+        Yield record tuples (ts, intersection_id, light_id, status code, cause code, end_time) in
+        time order, with start <= ts <= end. Call flush() first to include
+        what is still buffered.
+        """
+        start = start if start is not None else float("-inf")
+        end = end if end is not None else float("inf")
+        self._open()
+        with self._write_lock:
+            segments = [
+                (s.path, s.count) for s in self.segments
+                if s.count and s.last_ts >= start and s.first_ts <= end
+            ]
+        for path, count in segments:
+            try:
+                f = open(path, "rb")
+            except FileNotFoundError:
+                continue  # Deleted by retention since
+            with f, mmap.mmap(f.fileno(), HEADER.size + count * RECORD.size, access=mmap.ACCESS_READ) as buffer:
+                first = _bisect(buffer, count, start)
+                last = _bisect(buffer, count, end, right=True)
+                view = memoryview(buffer)[HEADER.size + first * RECORD.size:HEADER.size + last * RECORD.size]
+                try:
+                    for record in RECORD.iter_unpack(view):
+                        if intersection_id is not None and record[1] != intersection_id:
+                            continue
+                        if light_id is not None and record[2] != light_id:
+                            continue
+                        yield record
+                finally:
+                    view.release()
+
+    def query(self, start: float = None, end: float = None, intersection_id: int = None,
+              light_id: int = None, limit: int = None) -> list:
+        """State changes in a time range as dicts, oldest first."""
+        self.flush()
+        results = []
+        for record in self.iter_records(start, end, intersection_id, light_id):
+            results.append(as_dict(record))
+            if limit is not None and len(results) >= limit:
+                break
+        return results
+
+    async def replay(self, start: float, end: float = None, speed: float = 1.0, intersection_id: int = None,
+                     light_id: int = None):
+        """
+        Yield (ts, records) batches of the changes made at the same moment,
+        paced like the original run sped up by `speed` (no pacing if speed <= 0)
+        from the first record found. Drives a dashboard or a simulation from
+        history.
+        """
+        await asyncio.to_thread(self.flush)
+        loop = asyncio.get_running_loop()
+        began = loop.time()
+        first_ts = None
+        batch, batch_ts = [], None
+        for record in self.iter_records(start, end, intersection_id, light_id):
+            if first_ts is None:
+                first_ts = record[0]
+            if batch and record[0] != batch_ts:
+                await self._pace(loop, began, batch_ts - first_ts, speed)
+                yield batch_ts, batch
+                batch = []
+            batch_ts = record[0]
+            batch.append(record)
+        if batch:
+            await self._pace(loop, began, batch_ts - first_ts, speed)
+            yield batch_ts, batch
+
+    @staticmethod
+    async def _pace(loop, began: float, offset: float, speed: float):
+        if speed > 0:
+            delay = began + offset / speed - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+    def stats(self) -> dict:
+        self._open()
+        with self._write_lock:
+            segments = list(self.segments)
+        return {
+            "segments": len(segments),
+            "records": sum(s.count for s in segments),
+            "bytes": sum(HEADER.size + s.count * RECORD.size for s in segments),
+            "first_ts": segments[0].first_ts if segments else None,
+            "last_ts": segments[-1].last_ts if segments else None,
+            "pending": len(self._pending) // RECORD.size,
+            "recorded": self.recorded,
+            "written": self.written,
+            "dropped": self.dropped
+        }
+
+def remove_journal(directory: str = None):
+    """Delete every segment (the journal must not be running)."""
+    directory = directory or settings.JOURNAL_DIRECTORY
+    if not os.path.isdir(directory):
+        return
+    for name in os.listdir(directory):
+        if name.endswith(SUFFIX):
+            os.remove(os.path.join(directory, name))
+
+journal = Journal()
@@ -0,0 +1,383 @@
+"""
+Compact runtime state for the controller loop.
+
+Lights and intersections are addressed by dense indexes into parallel typed
+arrays. Directions are stored as the movement index of the intersection's
+phase plan and statuses as small integer codes, so the tick loop never touches
+SQLAlchemy instances: the ORM is only used to load the store and to persist
+the lights it changed.
+
+An intersection's lights are contiguous: first_light[i] .. first_light[i] + light_count[i].
+"""
+from array import array
+from datetime import datetime, timezone
+from sqlalchemy import select, update
+from app.core.response_cache import LIGHTS, response_cache
+from app.core.snapshot import load_snapshot
+from app.core.phase_plans import PLANS, RED, STATUS_CODES, STATUS_NAMES, plan_for_directions
+from app.models.intersection import Intersection
+from app.models.traffic import TrafficLight
+
+class LightStore:
+    def __init__(self):
+        self.loaded = False
+        self._clear()
+
+    def _clear(self):
+        # Per light
+        self.light_id = array('i')
+        self.light_intersection = array('i')  # Dense intersection index
+        self.movement = array('b')  # Movement index in the plan, -1 if the plan has no such direction
+        self.status = bytearray()
+        self.duration = array('i')
+        self.manual = bytearray()
+        self.manual_until = array('d')
+        self.updated = array('d')  # last_updated (Unix seconds, 0 if never)
+
+        # Per intersection
+        self.intersection_id = array('i')
+        self.plan = bytearray()  # Index into PLANS
+        self.first_light = array('i')
+        self.light_count = array('i')
+        self.phase = bytearray()
+        self.phase_end = array('d')  # 0 until the cycle initializes the intersection
+        self.active = array('I')  # Bitmask of GREEN/YELLOW movements
+        self.schedule_horizon = array('d')  # End of the schedule published to clients, 0 if none
+
+        # Row id -> dense index (-1 if unknown). Ids are autoincrement, so an
+        # id-indexed array is far smaller than a dict of boxed ints.
+        self.light_index = array('i')
+        self.intersection_index = array('i')
+        self.manual_lights = set()
+        self.dirty = set()  # Light indexes changed by the controller, not yet persisted
+        self.unscheduled = set()  # Intersection indexes whose clients need a new schedule
+        self.restored = {}  # Where the last load found the phase state of new intersections
+
+    async def load(self, db, redis, use_snapshot: bool = True):
+        """
+        (Re)build the store from column tuples. Phase state is kept for
+        intersections already known and restored for new ones from Redis, or
+        else from the last snapshot; restored cycles are caught up to now.
+        """
+        previous = {
+            self.intersection_id[i]: (self.phase[i], self.phase_end[i])
+            for i in range(len(self.intersection_id))
+        }
+        intersection_ids = db.execute(select(Intersection.id).order_by(Intersection.id)).scalars().all()
+        rows = db.execute(
+            select(
+                TrafficLight.id, TrafficLight.intersection_id, TrafficLight.direction,
+                TrafficLight.status, TrafficLight.duration, TrafficLight.is_manual,
+                TrafficLight.last_updated
+            ).order_by(TrafficLight.intersection_id, TrafficLight.id)
+        ).all()
+
+        missing = [iid for iid in intersection_ids if iid not in previous]
+        restored = {"redis": 0, "snapshot": 0, "cold": 0}
+        snapshot = None
+        if missing:
+            keys = []
+            for iid in missing:
+                keys.append(f"intersection:{iid}:phase")
+                keys.append(f"intersection:{iid}:phase_end")
+            values = await redis.mget(keys)
+            for n, iid in enumerate(missing):
+                phase, phase_end = values[2 * n], values[2 * n + 1]
+                if phase is not None and phase_end is not None:
+                    previous[iid] = (int(phase), float(phase_end))
+                    restored["redis"] += 1
+
+            snapshot = load_snapshot() if use_snapshot else None
+            for iid in missing:
+                if iid in previous:
+                    continue
+                state = snapshot.phase_of(iid) if snapshot else None
+                if state:
+                    previous[iid] = state
+                    restored["snapshot"] += 1
+                else:
+                    restored["cold"] += 1
+
+        by_intersection = {iid: [] for iid in intersection_ids}
+        for row in rows:
+            if row.intersection_id in by_intersection:
+                by_intersection[row.intersection_id].append(row)
+
+        self._clear()
+        self.intersection_index = array('i', [-1]) * ((max(intersection_ids) if intersection_ids else 0) + 1)
+        self.light_index = array('i', [-1]) * ((max((row.id for row in rows), default=0)) + 1)
+        for iid, lights in by_intersection.items():
+            i = len(self.intersection_id)
+            plan = plan_for_directions(l.direction for l in lights)
+            phase, phase_end = previous.get(iid, (0, 0.0))
+
+            self.intersection_index[iid] = i
+            self.intersection_id.append(iid)
+            self.plan.append(plan.index)
+            self.first_light.append(len(self.light_id))
+            self.light_count.append(len(lights))
+            self.phase.append(phase % plan.phase_count)
+            self.phase_end.append(phase_end)
+
+            mask = 0
+            for l in lights:
+                li = len(self.light_id)
+                movement = plan.movement_index.get(l.direction, -1)
+                code = STATUS_CODES.get(l.status, RED)
+                self.light_index[l.id] = li
+                self.light_id.append(l.id)
+                self.light_intersection.append(i)
+                self.movement.append(movement)
+                self.status.append(code)
+                self.duration.append(l.duration or 0)
+                self.manual.append(1 if l.is_manual else 0)
+                self.manual_until.append(self._restore_manual_until(snapshot, iid, l) if l.is_manual else 0.0)
+                self.updated.append(self._epoch(l.last_updated))
+                if l.is_manual:
+                    self.manual_lights.add(li)
+                if movement >= 0 and code != RED:
+                    mask |= 1 << movement
+            self.active.append(mask)
+            self.schedule_horizon.append(0.0)
+            self.unscheduled.add(i)
+
+        if snapshot:
+            snapshot.close()
+
+        # Newly seen intersections pick their cycle up where it would be now
+        now = datetime.now(timezone.utc).timestamp()
+        resumed = {}
+        for iid in missing:
+            i = self.intersection_index[iid]
+            if self._resume(i, now):
+                resumed[f"intersection:{iid}:phase"] = self.phase[i]
+                resumed[f"intersection:{iid}:phase_end"] = self.phase_end[i]
+        if resumed:
+            await redis.mset(resumed)
+
+        self.restored = restored
+        self.loaded = True
+
+    def _resume(self, i: int, now: float) -> bool:
+        """
+        Advance a restored cycle to `now` as if it had kept running, and put
+        the lights (except manual ones) in the resulting phase.
+        """
+        phase_end = self.phase_end[i]
+        if not phase_end:
+            return False
+        plan = self.plan_of(i)
+        phase = self.phase[i]
+        if phase_end < now:
+            durations = self.durations(i)
+            cycle = sum(durations)
+            phase_end += (now - phase_end) // cycle * cycle
+            while phase_end < now:
+                phase = plan.next_phase[phase]
+                phase_end += durations[phase]
+            self.phase[i] = phase
+            self.phase_end[i] = phase_end
+
+        row = plan.status[phase]
+        for li in self.lights_of(i):
+            m = self.movement[li]
+            if m >= 0 and not self.manual[li] and self.status[li] != row[m]:
+                self.set_status(li, row[m])
+        return True
+
+    def invalidate(self):
+        """Topology changed: reload from the DB at the start of the next tick."""
+        self.loaded = False
+
+    def _restore_manual_until(self, snapshot, intersection_id: int, light) -> float:
+        # The snapshot has the exact end; last_updated moves with every status write
+        until = snapshot.manual_until_of(intersection_id, light.id) if snapshot else 0.0
+        return until or self._manual_until(light.last_updated, light.duration)
+
+    @staticmethod
+    def _epoch(value) -> float:
+        if value is None:
+            return 0.0
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        return value.timestamp()
+
+    @classmethod
+    def _manual_until(cls, last_updated, duration) -> float:
+        if last_updated is None:
+            return 0.0
+        return cls._epoch(last_updated) + (duration or 0)
+
+    @staticmethod
+    def _lookup(index: array, row_id: int) -> int:
+        return index[row_id] if 0 <= row_id < len(index) else -1
+
+    def index_of_light(self, light_id: int) -> int:
+        return self._lookup(self.light_index, light_id)
+
+    def index_of_intersection(self, intersection_id: int) -> int:
+        return self._lookup(self.intersection_index, intersection_id)
+
+    def plan_of(self, i: int):
+        return PLANS[self.plan[i]]
+
+    def lights_of(self, i: int) -> range:
+        first = self.first_light[i]
+        return range(first, first + self.light_count[i])
+
+    def durations(self, i: int) -> list:
+        """Phase lengths of intersection `i` from its lights' durations."""
+        by_movement = {}
+        for li in self.lights_of(i):
+            m = self.movement[li]
+            if m >= 0 and m not in by_movement:
+                by_movement[m] = self.duration[li]
+        return self.plan_of(i).durations_for(by_movement)
+
+    def invalidate_schedule(self, i: int):
+        """The published schedule of intersection `i` no longer holds."""
+        self.schedule_horizon[i] = 0.0
+        self.unscheduled.add(i)
+
+    def set_status(self, li: int, code: int, persist: bool = True):
+        self.status[li] = code
+        m = self.movement[li]
+        if m >= 0:
+            i = self.light_intersection[li]
+            if code != RED:
+                self.active[i] |= 1 << m
+            else:
+                self.active[i] &= ~(1 << m)
+        if persist:
+            self.dirty.add(li)
+
+    def set_manual(self, li: int, manual: bool, until: float = 0.0, persist: bool = True):
+        self.manual[li] = 1 if manual else 0
+        self.manual_until[li] = until if manual else 0.0
+        self.invalidate_schedule(self.light_intersection[li])
+        if manual:
+            self.manual_lights.add(li)
+        else:
+            self.manual_lights.discard(li)
+        if persist:
+            self.dirty.add(li)
+
+    def set_phase(self, intersection_id: int, phase: int, phase_end: float):
+        i = self.index_of_intersection(intersection_id)
+        if i >= 0:
+            self.phase[i] = phase % self.plan_of(i).phase_count
+            self.phase_end[i] = phase_end
+            self.invalidate_schedule(i)
+
+    def refresh(self, lights):
+        """
+        Bring lights read through the ORM up to the status and manual flag
+        the controller runs on. The DB lags the store by up to a (deferred)
+        flush, so decisions and safety checks must not go by its rows.
+        """
+        if not self.loaded:
+            return
+        for light in lights:
+            li = self.index_of_light(light.id)
+            if li < 0:
+                continue
+            status = STATUS_NAMES[self.status[li]]
+            if light.status != status:
+                light.status = status
+            manual = bool(self.manual[li])
+            if light.is_manual != manual:
+                light.is_manual = manual
+
+    def sync_light(self, light):
+        """Mirror a light written through the ORM (API requests, preemption)."""
+        response_cache.invalidate(LIGHTS)
+        li = self.index_of_light(light.id)
+        if li < 0:
+            self.invalidate()
+            return
+        i = self.light_intersection[li]
+        if self.intersection_id[i] != light.intersection_id or \
+                self.plan_of(i).movement_index.get(light.direction, -1) != self.movement[li]:
+            self.invalidate()
+            return
+        self.duration[li] = light.duration or 0
+        self.updated[li] = self._epoch(light.last_updated)
+        self.set_status(li, STATUS_CODES.get(light.status, RED), persist=False)
+        self.set_manual(
+            li, bool(light.is_manual),
+            self._manual_until(light.last_updated, light.duration), persist=False
+        )
+        self.dirty.discard(li)
+
+    def due(self, now: float) -> list:
+        """Intersections whose current phase has ended (or never started)."""
+        phase_end = self.phase_end
+        return [i for i in range(len(phase_end)) if phase_end[i] <= now]
+
+    def audit(self) -> list:
+        """Indexes of intersections whose active movements conflict."""
+        safe = [plan.is_safe for plan in PLANS]
+        return [i for i, (p, mask) in enumerate(zip(self.plan, self.active)) if not safe[p](mask)]
+
+    def flush(self, db) -> int:
+        """Persist the lights the controller changed with one executemany UPDATE."""
+        if not self.dirty:
+            return 0
+        now = datetime.now(timezone.utc)
+        rows = [
+            {
+                "id": self.light_id[li],
+                "status": STATUS_NAMES[self.status[li]],
+                "is_manual": bool(self.manual[li]),
+                "last_updated": now
+            }
+            for li in self.dirty
+        ]
+        db.execute(update(TrafficLight), rows)
+        db.commit()
+        stamp = now.timestamp()
+        for li in self.dirty:
+            self.updated[li] = stamp
+        self.dirty.clear()
+        # Cached light responses take these fields from live(), so no invalidation
+        return len(rows)
+
+    def live(self, records: list) -> list:
+        """
+        Light records (dicts with an id) with the fields every tick changes,
+        status, is_manual and last_updated, taken from the store.
+        """
+        if not self.loaded:
+            return records
+        result = []
+        for record in records:
+            li = self.index_of_light(record["id"])
+            if li >= 0:
+                record = dict(record)
+                if "status" in record:
+                    record["status"] = STATUS_NAMES[self.status[li]]
+                if "is_manual" in record:
+                    record["is_manual"] = bool(self.manual[li])
+                if "last_updated" in record and self.updated[li]:
+                    record["last_updated"] = datetime.fromtimestamp(self.updated[li], timezone.utc)
+            result.append(record)
+        return result
+
+    def memory_usage(self) -> dict:
+        arrays = [
+            self.light_id, self.light_intersection, self.movement, self.status, self.duration,
+            self.manual, self.manual_until, self.updated, self.intersection_id, self.plan, self.first_light,
+            self.light_count, self.phase, self.phase_end, self.active, self.schedule_horizon
+        ]
+        array_bytes = sum(len(a) * (a.itemsize if isinstance(a, array) else 1) for a in arrays)
+        index_bytes = len(self.light_index) * 4 + len(self.intersection_index) * 4
+        lights = len(self.light_id)
+        return {
+            "lights": lights,
+            "intersections": len(self.intersection_id),
+            "array_bytes": array_bytes,
+            "index_bytes": index_bytes,
+            "bytes_per_light": (array_bytes + index_bytes) / lights if lights else 0
+        }
+
+light_store = LightStore()
@@ -0,0 +1,180 @@
+"""
+Logging setup.
+
+Modules log through the standard library (logging.getLogger(__name__)); this
+module configures the "app" logger tree:
+
+- records are put on a bounded queue by the calling thread and written to
+  stdout by a QueueListener thread, so a slow stdout never blocks the event
+  loop (when the queue is full, records are dropped and counted);
+- LOG_LEVEL sets the level and LOG_LEVELS overrides it per module, e.g.
+  "app.core.traffic_logic=DEBUG,app.core.journal=WARNING";
+- the same warning or error (logger and message template) is written at most
+  LOG_RATE_LIMIT times per LOG_RATE_WINDOW seconds; the next one written
+  after that carries the number suppressed;
+- LOG_FORMAT=json writes one JSON object per line, including any `extra`
+  fields.
+
+A call below its logger's level returns after a cached level check, so pass
+arguments %-style (log.debug("x=%s", x)) rather than pre-formatting them.
+"""
+import copy
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from app.core.config import settings
+
+ROOT = "app"
+# Attributes every LogRecord has; anything else on a record came from `extra`
+_STANDARD = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime", "suppressed"}
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage()
+        }
+        for key, value in vars(record).items():
+            if key not in _STANDARD and not key.startswith("_"):
+                entry[key] = value
+        if getattr(record, "suppressed", 0):
+            entry["suppressed"] = record.suppressed
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    def format(self, record: logging.LogRecord) -> str:
+        text = super().format(record)
+        if getattr(record, "suppressed", 0):
+            text += f" ({record.suppressed} similar suppressed)"
+        return text
+
+class RateLimitFilter(logging.Filter):
+    """Let through at most `limit` warnings or errors per (logger, message template) per `window` seconds."""
+
+    def __init__(self, limit: int, window: float):
+        super().__init__()
+        self.limit = limit
+        self.window = window
+        self.counts = {}  # (logger, template) -> [window start, written, suppressed]
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno < logging.WARNING or self.limit <= 0:
+            return True
+        key = (record.name, record.msg if isinstance(record.msg, str) else type(record.msg))
+        now = time.monotonic()
+        with self._lock:
+            count = self.counts.get(key)
+            if count is None or now - count[0] >= self.window:
+                if len(self.counts) > 10_000:
+                    self.counts.clear()
+                suppressed = count[2] if count else 0
+                self.counts[key] = [now, 1, 0]
+            elif count[1] < self.limit:
+                count[1] += 1
+                suppressed, count[2] = count[2], 0
+            else:
+                count[2] += 1
+                return False
+        if suppressed:
+            record.suppressed = suppressed
+        return True
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """Queues records without blocking; drops them when the writer has fallen behind."""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # The arguments and traceback are rendered now, as they may change or
+        # hold frames alive; the formatting is left to the writer thread
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+def parse_levels(text: str) -> dict:
+    """{"app.core.journal": "WARNING", ...} from "app.core.journal=WARNING,..."."""
+    levels = {}
+    for part in (text or "").split(","):
+        name, _, level = part.partition("=")
+        if name.strip() and level.strip():
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+class LogSetup:
+    def __init__(self):
+        self.handler = None
+        self.listener = None
+        self.configured = {}  # Loggers given their own level
+
+    def start(self):
+        """Configure the "app" loggers and start the writer thread (idempotent)."""
+        if self.listener is not None:
+            return
+        output = logging.StreamHandler(sys.stdout)
+        output.setFormatter(JsonFormatter() if settings.LOG_FORMAT == "json" else TextFormatter())
+        log_queue = queue.Queue(settings.LOG_QUEUE_SIZE)
+        self.handler = DroppingQueueHandler(log_queue)
+        self.handler.addFilter(RateLimitFilter(settings.LOG_RATE_LIMIT, settings.LOG_RATE_WINDOW))
+
+        root = logging.getLogger(ROOT)
+        root.handlers = [self.handler]
+        root.propagate = False
+        root.setLevel(settings.LOG_LEVEL.upper())
+        for name, level in parse_levels(settings.LOG_LEVELS).items():
+            logging.getLogger(name).setLevel(level)
+            self.configured[name] = level
+
+        self.listener = logging.handlers.QueueListener(log_queue, output, respect_handler_level=True)
+        self.listener.start()
+
+    def stop(self):
+        """Write out what is queued and stop the writer thread."""
+        if self.listener is not None:
+            self.listener.stop()
+            self.listener = None
+
+    def set_level(self, name: str, level: str):
+        """Change one logger's level at runtime (name "app" for the default)."""
+        level = level.upper()
+        if not isinstance(logging.getLevelName(level), int):
+            raise ValueError(f"Unknown level: {level}")
+        logging.getLogger(name).setLevel(level)
+        if name != ROOT:
+            self.configured[name] = level
+
+    def stats(self) -> dict:
+        root = logging.getLogger(ROOT)
+        return {
+            "level": logging.getLevelName(root.level),
+            "levels": self.configured,
+            "format": settings.LOG_FORMAT,
+            "queued": self.handler.queue.qsize() if self.handler else 0,
+            "dropped": self.handler.dropped if self.handler else 0
+        }
+
+log_setup = LogSetup()
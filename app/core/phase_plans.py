@@ -0,0 +1,221 @@
+"""
+Declarative signal phase plans.
+
+A plan lists the movements (light directions) of an intersection and the
+phases it cycles through. Plans are compiled once into integer lookup tables
+so the controller resolves every light's status with plain indexing:
+
+    plan.status[phase][movement] -> RED / YELLOW / GREEN code
+"""
+from dataclasses import dataclass
+from functools import lru_cache
+
+RED, YELLOW, GREEN = 0, 1, 2
+STATUS_NAMES = ("RED", "YELLOW", "GREEN")
+STATUS_CODES = {name: code for code, name in enumerate(STATUS_NAMES)}
+
+YELLOW_SECONDS = 4
+DEFAULT_GREEN_SECONDS = 60
+
+# Plans up to this many movements get a precomputed safe-state table
+MAX_SAFE_TABLE_MOVEMENTS = 12
+
+@dataclass(frozen=True)
+class Phase:
+    green: tuple = ()
+    yellow: tuple = ()
+    duration: int = None  # Fixed length in seconds
+    timed_by: str = None  # Otherwise, the duration of this movement's light
+
+@dataclass(frozen=True)
+class PhasePlan:
+    name: str
+    movements: tuple
+    phases: tuple
+
+def signal_groups(name: str, movements: tuple, groups: list, yellow: int = YELLOW_SECONDS) -> PhasePlan:
+    """Build the usual GREEN -> YELLOW sequence for each group of movements in turn."""
+    phases = []
+    for group in groups:
+        phases.append(Phase(green=tuple(group), timed_by=group[0]))
+        phases.append(Phase(yellow=tuple(group), duration=yellow))
+    return PhasePlan(name=name, movements=tuple(movements), phases=tuple(phases))
+
+PHASE_PLANS = {
+    plan.name: plan for plan in [
+        signal_groups(
+            "four_way",
+            ("North", "South", "East", "West"),
+            [("North", "South"), ("East", "West")]
+        ),
+        signal_groups(
+            "t_junction",
+            ("North", "South", "East"),
+            [("North", "South"), ("East",)]
+        ),
+        signal_groups(
+            "protected_left",
+            ("North", "South", "East", "West", "North Left", "South Left", "East Left", "West Left"),
+            [("North Left", "South Left"), ("North", "South"), ("East Left", "West Left"), ("East", "West")]
+        ),
+        signal_groups(
+            "five_way",
+            ("North", "South", "East", "West", "Southwest"),
+            [("North", "South"), ("East", "West"), ("Southwest",)]
+        ),
+    ]
+}
+
+DEFAULT_PLAN = "four_way"
+
+class CompiledPlan:
+    """Integer lookup tables for a PhasePlan. Built once, shared by all intersections using it."""
+
+    def __init__(self, plan: PhasePlan):
+        self.name = plan.name
+        self.movements = plan.movements
+        self.movement_index = {m: i for i, m in enumerate(plan.movements)}
+        self.phase_count = n = len(plan.phases)
+
+        self.next_phase = [(p + 1) % n for p in range(n)]
+        self.fixed_duration = [phase.duration or 0 for phase in plan.phases]
+        self.timed_by = [
+            self.movement_index[phase.timed_by] if phase.timed_by else -1
+            for phase in plan.phases
+        ]
+
+        # status[phase][movement]
+        self.status = []
+        for phase in plan.phases:
+            row = bytearray(len(self.movements))
+            for m in phase.green:
+                row[self.movement_index[m]] = GREEN
+            for m in phase.yellow:
+                row[self.movement_index[m]] = YELLOW
+            self.status.append(bytes(row))
+
+        # First phase in which each movement turns GREEN
+        self.green_phase = [
+            next((p for p in range(n) if self.status[p][m] == GREEN), -1)
+            for m in range(len(self.movements))
+        ]
+
+        # Phases that must elapse, starting with `phase`, before `movement` is GREEN again
+        self.until_green = []
+        for p in range(n):
+            row = []
+            for m in range(len(self.movements)):
+                waiting = []
+                q = p
+                while self.green_phase[m] >= 0 and self.status[q][m] != GREEN:
+                    waiting.append(q)
+                    q = self.next_phase[q]
+                row.append(tuple(waiting))
+            self.until_green.append(row)
+
+        # Movements released together with each movement, and movements never GREEN alongside it
+        count = len(self.movements)
+        self.partners = []
+        self.conflicts = []
+        for m in range(count):
+            together = set()
+            for row in self.status:
+                if row[m] == GREEN:
+                    together.update(o for o in range(count) if row[o] == GREEN)
+            own = self.status[self.green_phase[m]] if self.green_phase[m] >= 0 else bytes(count)
+            self.partners.append(tuple(o for o in range(count) if o != m and own[o] == GREEN))
+            self.conflicts.append(tuple(o for o in range(count) if o != m and o not in together))
+
+        # conflict_mask[movement]: bit o is set when movement o conflicts with it
+        self.conflict_mask = [sum(1 << o for o in conflicts) for conflicts in self.conflicts]
+
+        # safe[mask]: 1 when no two movements in an active-movement mask conflict.
+        # 2^movements bytes, so every state check is a single index.
+        self.safe = None
+        if count <= MAX_SAFE_TABLE_MOVEMENTS:
+            self.safe = bytes(
+                not self._conflicting(mask) for mask in range(1 << count)
+            )
+
+        # GREEN phase that relieves a movement when it is forced RED: the next one it is not part of
+        self.relief_phase = []
+        for m in range(len(self.movements)):
+            q = self.next_phase[self.green_phase[m]] if self.green_phase[m] >= 0 else 0
+            for _ in range(n):
+                if GREEN in self.status[q] and self.status[q][m] != GREEN:
+                    break
+                q = self.next_phase[q]
+            self.relief_phase.append(q)
+
+    def _conflicting(self, mask: int) -> int:
+        bad = 0
+        remaining = mask
+        while remaining:
+            low = remaining & -remaining
+            if mask & self.conflict_mask[low.bit_length() - 1]:
+                bad |= low
+            remaining ^= low
+        return bad
+
+    def conflicting(self, mask: int) -> int:
+        """Mask of the active movements that conflict with another active movement."""
+        if self.safe is not None and self.safe[mask]:
+            return 0
+        return self._conflicting(mask)
+
+    def is_safe(self, mask: int) -> bool:
+        if self.safe is not None:
+            return bool(self.safe[mask])
+        return not self._conflicting(mask)
+
+    def phase_durations(self, lights) -> list:
+        """Length of each phase in seconds, taking variable greens from the lights' durations."""
+        by_movement = {}
+        for light in lights:
+            m = self.movement_index.get(light.direction)
+            if m is not None and m not in by_movement:
+                by_movement[m] = light.duration
+        return self.durations_for(by_movement)
+
+    def durations_for(self, by_movement: dict) -> list:
+        """Length of each phase given {movement index: light duration}."""
+        return [
+            self.fixed_duration[p] or by_movement.get(self.timed_by[p]) or DEFAULT_GREEN_SECONDS
+            for p in range(self.phase_count)
+        ]
+
+    def end_time(self, phase: int, movement: int, durations: list, phase_end: float) -> float:
+        """
+        When a movement's current status ends, for a phase that ends at `phase_end`.
+        RED lights count down to their next GREEN.
+        """
+        waiting = self.until_green[phase][movement]
+        if self.status[phase][movement] != RED or len(waiting) <= 1:
+            return phase_end
+        return phase_end + sum(durations[p] for p in waiting[1:])
+
+COMPILED_PLANS = {name: CompiledPlan(plan) for name, plan in PHASE_PLANS.items()}
+
+# Dense plan numbering for compact per-intersection storage
+PLANS = tuple(COMPILED_PLANS.values())
+for _index, _plan in enumerate(PLANS):
+    _plan.index = _index
+
+@lru_cache(maxsize=None)
+def _plan_for_movements(movements: frozenset) -> CompiledPlan:
+    if not movements:
+        return COMPILED_PLANS[DEFAULT_PLAN]
+    exact = [p for p in COMPILED_PLANS.values() if set(p.movements) == movements]
+    if exact:
+        return exact[0]
+    covering = [p for p in COMPILED_PLANS.values() if movements <= set(p.movements)]
+    if covering:
+        return min(covering, key=lambda p: len(p.movements))
+    return COMPILED_PLANS[DEFAULT_PLAN]
+
+def plan_for_directions(directions) -> CompiledPlan:
+    """Pick the plan matching an intersection's set of light directions."""
+    return _plan_for_movements(frozenset(directions))
+
+def plan_for_lights(lights) -> CompiledPlan:
+    return plan_for_directions(light.direction for light in lights)
@@ -0,0 +1,290 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from datetime import datetime, timedelta, timezone
+from app.core.config import settings
+from app.core.light_store import light_store
+from app.core.journal import PREEMPTION, journal
+from app.core.phase_plans import COMPILED_PLANS, STATUS_CODES, YELLOW_SECONDS, plan_for_lights
+from app.core.safety import validate
+from app.db.queries import lights_of
+from app.services.redis import get_redis
+
+logger = logging.getLogger(__name__)
+
+MOVEMENTS = {m for plan in COMPILED_PLANS.values() for m in plan.movements}
+
+def approach_for(plan, direction: str) -> set:
+    """The requested movement plus the movements the plan releases with it."""
+    movement = plan.movement_index[direction]
+    return {direction} | {plan.movements[p] for p in plan.partners[movement]}
+
+class PreemptionManager:
+    """
+    Emergency-vehicle preemption.
+
+    Requests are served on their own asyncio tasks instead of waiting for the
+    next run_cycle poll. While an intersection is preempted the regular cycle
+    skips it; afterwards the cycle resumes from the served approach. Route
+    stops wait in `scheduled` until their start time and can be cancelled.
+    """
+
+    def __init__(self):
+        self.active = {}  # intersection_id -> asyncio.Task
+        self.scheduled = {}  # intersection_id -> (asyncio.Task, monotonic time it starts at)
+        self.latencies = deque(maxlen=500)  # request -> first broadcast (ms)
+
+    def is_preempted(self, intersection_id: int) -> bool:
+        return intersection_id in self.active
+
+    async def preempt(self, intersection_id: int, direction: str, hold: int = None, requested_at: float = None):
+        """
+        Turn `direction` (and its partner) GREEN as fast as safely possible.
+        The first transition is applied before returning; the remaining
+        clearance/hold/resume steps continue on a background task.
+        """
+        requested_at = requested_at or time.perf_counter()
+        if direction not in MOVEMENTS:
+            raise ValueError(f"Unknown direction: {direction}")
+
+        previous = self.active.pop(intersection_id, None)
+        if previous:
+            previous.cancel()
+
+        # Registered before the first await, so the cycle leaves the
+        # intersection alone while the first step is being applied
+        hold = hold or settings.PREEMPTION_HOLD_SECONDS
+        clearance = asyncio.get_running_loop().create_future()
+        task = asyncio.create_task(self._finish(intersection_id, direction, hold, clearance))
+        self.active[intersection_id] = task
+        try:
+            clearance_seconds = await self._begin(intersection_id, direction, hold, requested_at)
+        except BaseException:
+            self._drop(intersection_id, task)
+            raise
+        if clearance_seconds is None:
+            self._drop(intersection_id, task)
+            return None
+        clearance.set_result(clearance_seconds)
+        return self.latencies[-1]
+
+    def _drop(self, intersection_id: int, task: asyncio.Task):
+        task.cancel()
+        if self.active.get(intersection_id) is task:
+            del self.active[intersection_id]
+
+    async def preempt_route(self, stops: list, hold: int = None):
+        """
+        Schedule preemption along a route. Each stop is a dict with
+        intersection_id, direction and eta (seconds from now); the approach
+        is started early enough for the clearance to finish before arrival.
+        """
+        lead_time = YELLOW_SECONDS + settings.PREEMPTION_ALL_RED_SECONDS
+        scheduled = []
+        for stop in stops:
+            if stop["direction"] not in MOVEMENTS:
+                raise ValueError(f"Unknown direction: {stop['direction']}")
+            delay = max(0.0, stop["eta"] - lead_time)
+            self._schedule(stop["intersection_id"], stop["direction"], hold, delay)
+            scheduled.append({"intersection_id": stop["intersection_id"], "starts_in": delay})
+        return scheduled
+
+    def _schedule(self, intersection_id: int, direction: str, hold: int, delay: float):
+        """Start preemption after `delay` seconds, replacing a stop already scheduled there."""
+        self.cancel_scheduled(intersection_id)
+        task = asyncio.create_task(self._delayed(intersection_id, direction, hold, delay))
+        self.scheduled[intersection_id] = (task, time.monotonic() + delay)
+
+        def forget(done):
+            if self.scheduled.get(intersection_id, (None,))[0] is done:
+                del self.scheduled[intersection_id]
+        task.add_done_callback(forget)
+
+    def cancel_scheduled(self, intersection_id: int = None) -> int:
+        """Cancel the route stops not started yet (at one intersection, or all). Returns how many."""
+        ids = list(self.scheduled) if intersection_id is None else [intersection_id]
+        cancelled = 0
+        for iid in ids:
+            entry = self.scheduled.pop(iid, None)
+            if entry:
+                entry[0].cancel()
+                cancelled += 1
+        return cancelled
+
+    async def _delayed(self, intersection_id: int, direction: str, hold: int, delay: float):
+        if delay:
+            await asyncio.sleep(delay)
+        # Started: from here on it is cancelled through `active` like any preemption
+        if self.scheduled.get(intersection_id, (None,))[0] is asyncio.current_task():
+            del self.scheduled[intersection_id]
+        try:
+            await self.preempt(intersection_id, direction, hold)
+        except Exception:
+            logger.exception(
+                "Preemption error at intersection %s", intersection_id, extra={"intersection_id": intersection_id}
+            )
+
+    async def _begin(self, intersection_id: int, direction: str, hold: int, requested_at: float):
+        """Apply the first step. Returns the clearance time still needed before GREEN."""
+        from app.db.session import SessionLocal
+
+        with SessionLocal() as db:
+            lights = self._lights(db, intersection_id)
+            if not lights:
+                return None
+
+            plan = plan_for_lights(lights)
+            if direction not in plan.movement_index:
+                raise ValueError(f"Intersection {intersection_id} has no {direction} approach")
+            approach = approach_for(plan, direction)
+            conflicting = [l for l in lights if l.direction not in approach]
+
+            if any(l.status == "GREEN" for l in conflicting):
+                # Conflicting traffic is moving: start the yellow clearance
+                changes = [(l, "YELLOW", YELLOW_SECONDS) for l in conflicting if l.status == "GREEN"]
+                clearance = YELLOW_SECONDS + settings.PREEMPTION_ALL_RED_SECONDS
+            elif any(l.status == "YELLOW" for l in conflicting):
+                # Already clearing, just let it finish
+                changes = []
+                clearance = YELLOW_SECONDS + settings.PREEMPTION_ALL_RED_SECONDS
+            else:
+                changes = [(l, "GREEN", hold) for l in lights if l.direction in approach]
+                clearance = 0
+
+            for light in lights:
+                # Emergency preemption supersedes manual overrides
+                light.is_manual = False
+            await self._apply(db, lights, changes)
+
+        self.latencies.append((time.perf_counter() - requested_at) * 1000)
+        return clearance
+
+    async def _finish(self, intersection_id: int, direction: str, hold: int, clearance: asyncio.Future):
+        from app.db.session import SessionLocal
+
+        try:
+            # Set once the first step is applied
+            clearance = await clearance
+            with SessionLocal() as db:
+                plan = plan_for_lights(self._lights(db, intersection_id))
+            approach = approach_for(plan, direction)
+
+            if clearance:
+                await asyncio.sleep(YELLOW_SECONDS)
+                with SessionLocal() as db:
+                    lights = self._lights(db, intersection_id)
+                    await self._apply(db, lights, [
+                        (l, "RED", hold + settings.PREEMPTION_ALL_RED_SECONDS)
+                        for l in lights if l.direction not in approach and l.status != "RED"
+                    ])
+                await asyncio.sleep(settings.PREEMPTION_ALL_RED_SECONDS)
+
+                with SessionLocal() as db:
+                    lights = self._lights(db, intersection_id)
+                    await self._apply(db, lights, [(l, "GREEN", hold) for l in lights if l.direction in approach])
+
+            await asyncio.sleep(hold)
+
+            # Resume the normal cycle: the served approach is at the end of its
+            # green phase, so the next tick moves on to its yellow.
+            phase = plan.green_phase[plan.movement_index[direction]]
+            now = datetime.now(timezone.utc).timestamp()
+            light_store.set_phase(intersection_id, phase, now)
+            redis = await get_redis()
+            await redis.set(f"intersection:{intersection_id}:phase", phase)
+            await redis.set(f"intersection:{intersection_id}:phase_end", now)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception(
+                "Preemption error at intersection %s", intersection_id, extra={"intersection_id": intersection_id}
+            )
+        finally:
+            if self.active.get(intersection_id) is asyncio.current_task():
+                del self.active[intersection_id]
+
+    @staticmethod
+    def _lights(db, intersection_id: int) -> list:
+        """The intersection's lights, with the statuses the controller runs on (the DB may lag)."""
+        lights = lights_of(db, intersection_id)
+        light_store.refresh(lights)
+        return lights
+
+    async def _apply(self, db, lights, changes):
+        """
+        Validate, persist, cache and broadcast a set of (light, status, seconds)
+        changes. Every light whose state differs from what clients last saw
+        goes out too, not only the changed ones.
+        """
+        from app.api.v1.endpoints.websocket import broadcast_batch_update
+
+        validate(lights, {light.id: status for light, status, seconds in changes})
+
+        now = datetime.now(timezone.utc)
+        for light, status, seconds in changes:
+            light.status = status
+            light.last_updated = now
+        db.commit()
+        for light in lights:
+            light_store.sync_light(light)
+
+        redis = await get_redis()
+        seen = await redis.mget([f"traffic_light:{light.id}:status" for light in lights])
+        ends = {light.id: (now + timedelta(seconds=seconds)).timestamp() for light, status, seconds in changes}
+        values = {}
+        updates = []
+        for light, status in zip(lights, seen):
+            if light.id in ends:
+                end_time = ends[light.id]
+                journal.record(
+                    light.intersection_id, light.id, STATUS_CODES[light.status], end_time, PREEMPTION, now.timestamp()
+                )
+            elif light.status != status:
+                end_time = self._scheduled_end(light) or now.timestamp()
+            else:
+                continue
+            values[f"traffic_light:{light.id}:status"] = light.status
+            values[f"traffic_light:{light.id}:end_time"] = end_time
+            updates.append({
+                "light_id": light.id,
+                "state": {
+                    "status": light.status,
+                    "end_time": end_time
+                }
+            })
+
+        if values:
+            await redis.mset(values)
+        if updates:
+            await broadcast_batch_update(updates)
+
+    @staticmethod
+    def _scheduled_end(light):
+        """When the cycle has a light's current status end, or None if the store doesn't know."""
+        store = light_store
+        li = store.index_of_light(light.id)
+        if li < 0 or store.movement[li] < 0:
+            return None
+        i = store.light_intersection[li]
+        if not store.phase_end[i]:
+            return None
+        return store.plan_of(i).end_time(store.phase[i], store.movement[li], store.durations(i), store.phase_end[i])
+
+    def stats(self):
+        samples = sorted(self.latencies)
+        now = time.monotonic()
+        scheduled = {iid: round(max(0.0, starts - now), 1) for iid, (_, starts) in self.scheduled.items()}
+        if not samples:
+            return {"count": 0, "active": list(self.active), "scheduled": scheduled}
+        return {
+            "count": len(samples),
+            "active": list(self.active),
+            "scheduled": scheduled,
+            "last_ms": self.latencies[-1],
+            "p50_ms": samples[len(samples) // 2],
+            "p95_ms": samples[min(len(samples) - 1, int(len(samples) * 0.95))],
+            "max_ms": samples[-1]
+        }
+
+preemption_manager = PreemptionManager()
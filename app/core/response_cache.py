@@ -0,0 +1,131 @@
+"""
+Versioned cache of serialized read responses.
+
+Entries are keyed by the request URL and the current version of every scope
+the response depends on:
+
+    topology  cities, areas, intersections and their attributes
+    lights    traffic light rows (duration, direction, ...)
+
+Writes bump a scope's version instead of searching for affected entries, so
+stale entries simply stop being reachable and age out of the LRU. Each entry
+carries an ETag, letting clients revalidate with If-None-Match for a 304.
+
+The status, manual flag and last update of lights change on every controller
+tick; bumping `lights` for them would empty the cache each tick. Responses
+with lights keep their content instead and fill those fields in from the
+light store each time they are served (see `respond(live=...)`).
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+from fastapi import Request, Response
+from app.core.config import settings
+from app.core.serialization import dumps
+
+TOPOLOGY = "topology"
+LIGHTS = "lights"
+
+# Headers of a built response worth replaying from the cache
+KEPT_HEADERS = ("x-next-cursor",)
+
+def _etag(body: bytes) -> str:
+    return '"%s"' % hashlib.blake2b(body, digest_size=12).hexdigest()
+
+class ResponseCache:
+    def __init__(self, max_entries: int = 1024, max_bytes: int = 32 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.versions = {TOPOLOGY: 0, LIGHTS: 0}
+        self.entries = OrderedDict()  # key -> (etag, body, media_type, headers, size), or (None, content, None, headers, size) for live entries
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+    def invalidate(self, *scopes):
+        with self._lock:
+            for scope in scopes:
+                self.versions[scope] += 1
+
+    def respond(self, request: Request, scopes: tuple, build, live=None) -> Response:
+        """
+        Serve a GET from the cache, or call `build()` for a Response and keep
+        its body. Exceptions from `build` (404s, ...) are never cached.
+
+        With `live`, `build()` returns (content, headers) instead: the content
+        is kept, and each response is encoded from `live(content)`.
+        """
+        url = request.url
+        key = (url.path, url.query, tuple(self.versions[scope] for scope in scopes))
+
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+            else:
+                self.misses += 1
+
+        if live is not None:
+            if entry is None:
+                content, headers = build()
+                body = dumps(live(content))
+                # Sized as its encoding
+                self._store(key, (None, content, None, headers, len(body)))
+            else:
+                _, content, _, headers, _ = entry
+                body = dumps(live(content))
+            etag, media_type = _etag(body), "application/json"
+        else:
+            if entry is None:
+                response = build()
+                headers = {name: response.headers[name] for name in KEPT_HEADERS if name in response.headers}
+                entry = (_etag(response.body), response.body, response.media_type, headers, len(response.body))
+                self._store(key, entry)
+            etag, body, media_type, headers, _ = entry
+        headers = {**headers, "ETag": etag, "Cache-Control": "no-cache"}
+        if etag in request.headers.get("if-none-match", ""):
+            with self._lock:
+                self.not_modified += 1
+            return Response(status_code=304, headers=headers)
+        return Response(content=body, media_type=media_type, headers=headers)
+
+    def _store(self, key, entry):
+        size = entry[4]
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            previous = self.entries.pop(key, None)
+            if previous is not None:
+                self.size -= previous[4]
+            self.entries[key] = entry
+            self.size += size
+            while len(self.entries) > self.max_entries or self.size > self.max_bytes:
+                _, evicted = self.entries.popitem(last=False)
+                self.size -= evicted[4]
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self.entries.clear()
+            self.size = 0
+
+    def stats(self) -> dict:
+        requests = self.hits + self.misses
+        return {
+            "entries": len(self.entries),
+            "bytes": self.size,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / requests if requests else 0.0,
+            "not_modified": self.not_modified,
+            "evictions": self.evictions,
+            "versions": dict(self.versions)
+        }
+
+response_cache = ResponseCache(settings.RESPONSE_CACHE_MAX_ENTRIES, settings.RESPONSE_CACHE_MAX_BYTES)
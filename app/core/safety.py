@@ -0,0 +1,33 @@
+"""
+Conflict validation for signal states.
+
+Every movement of a compiled plan has a bitmask of the movements it conflicts
+with. A state is safe when no two active (GREEN or YELLOW) movements conflict,
+which the plan answers with a single lookup in its safe-state table. Writes
+are validated before they reach the DB or Redis; LightStore.audit re-checks
+every intersection each controller tick.
+"""
+from app.core.phase_plans import STATUS_CODES, RED, plan_for_lights
+
+class SafetyViolation(Exception):
+    pass
+
+def active_mask(plan, lights, overrides: dict = None) -> int:
+    """Bitmask of a plan's active movements, optionally with proposed {light_id: status} writes applied."""
+    mask = 0
+    for light in lights:
+        status = overrides.get(light.id, light.status) if overrides else light.status
+        movement = plan.movement_index.get(light.direction)
+        if movement is not None and STATUS_CODES.get(status, RED) != RED:
+            mask |= 1 << movement
+    return mask
+
+def describe(plan, mask: int) -> str:
+    return ", ".join(m for i, m in enumerate(plan.movements) if mask >> i & 1)
+
+def validate(lights, overrides: dict = None, plan=None):
+    """Raise SafetyViolation if the intersection's lights, with `overrides` applied, would conflict."""
+    plan = plan or plan_for_lights(lights)
+    mask = active_mask(plan, lights, overrides)
+    if not plan.is_safe(mask):
+        raise SafetyViolation(f"Conflicting movements active together: {describe(plan, plan.conflicting(mask))}")
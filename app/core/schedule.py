@@ -0,0 +1,57 @@
+"""
+Schedule-ahead publishing.
+
+Instead of re-broadcasting every light at each phase change, the controller
+publishes each intersection's next transitions with absolute timestamps.
+Clients project the state locally and only hear from the server again when
+the plan changes (override, duration change, preemption, reset, retime) or
+the published horizon is about to run out.
+"""
+from app.core.config import settings
+from app.core.phase_plans import STATUS_NAMES
+
+# A phase that ends this many seconds before the tick notices it still starts
+# the next phase on time, keeping the cycle on the published schedule.
+LATE_TOLERANCE = 2.0
+
+def phase_start(phase_end: float, now: float) -> float:
+    """When the next phase starts: on schedule, unless the controller fell too far behind."""
+    return phase_end if now - phase_end <= LATE_TOLERANCE else now
+
+def build_schedule(store, i: int, count: int = None) -> dict:
+    """
+    The current phase and the next `count` transitions of intersection `i`.
+    Each transition lists the status of every light in `light_ids`, in order;
+    `until` is when the last listed state ends.
+    """
+    count = count or settings.SCHEDULE_TRANSITIONS
+    plan = store.plan_of(i)
+    durations = store.durations(i)
+    lights = [li for li in store.lights_of(i) if store.movement[li] >= 0]
+
+    def statuses(phase):
+        row = plan.status[phase]
+        return [STATUS_NAMES[row[store.movement[li]]] for li in lights]
+
+    phase = store.phase[i]
+    at = store.phase_end[i]
+    transitions = [{"at": at - durations[phase], "statuses": statuses(phase)}]
+    for _ in range(count):
+        phase = plan.next_phase[phase]
+        transitions.append({"at": at, "statuses": statuses(phase)})
+        at += durations[phase]
+
+    return {
+        "intersection_id": store.intersection_id[i],
+        "light_ids": [store.light_id[li] for li in lights],
+        "transitions": transitions,
+        "until": at
+    }
+
+def is_schedulable(store, i: int) -> bool:
+    """Only intersections running their plan undisturbed can be projected by clients."""
+    from app.core.preemption import preemption_manager
+
+    if not store.phase_end[i] or preemption_manager.is_preempted(store.intersection_id[i]):
+        return False
+    return not any(store.manual[li] for li in store.lights_of(i))
@@ -0,0 +1,246 @@
+"""
+In-memory type-ahead search over city, area and intersection names and codes.
+
+Names and codes are split into lowercase, accent-folded tokens kept in one
+sorted array, parallel to an array of the (type, id) each token belongs to.
+A query term matches every token it is a prefix of, which is one bisect for
+the range; multi-word queries use the narrowest term's range and check the
+other terms against each candidate's tokens.
+
+With fuzzy matching, terms of FUZZY_MIN_LENGTH or more characters also match
+tokens whose prefix is one edit away (two for long terms), found through a
+trigram index over the distinct tokens.
+
+The index is built from the database on first use. The CRUD endpoints
+update it in place; bulk imports and deletes mark it for a rebuild.
+"""
+import re
+import threading
+import unicodedata
+from bisect import bisect_left, bisect_right
+from collections import Counter
+from sqlalchemy import select
+from app.models.city import City, TrafficArea
+from app.models.intersection import Intersection
+
+TYPES = ("city", "area", "intersection")
+MAX_CANDIDATES = 1000  # Candidates ranked per query, so common prefixes stay fast
+FUZZY_MIN_LENGTH = 4
+_SPLIT = re.compile(r"[^0-9a-z]+")
+
+def normalize(text: str) -> str:
+    text = unicodedata.normalize("NFKD", text or "")
+    return "".join(c for c in text if not unicodedata.combining(c)).lower()
+
+def tokenize(*texts) -> list:
+    tokens = []
+    for text in texts:
+        tokens.extend(t for t in _SPLIT.split(normalize(text)) if t)
+    return list(dict.fromkeys(tokens))
+
+def _label(name: str, code: str) -> tuple:
+    """Normalized (name words joined by spaces, code) used to rank a document."""
+    return " ".join(t for t in _SPLIT.split(normalize(name)) if t), normalize(code).strip()
+
+def _grams(token: str) -> set:
+    padded = "  " + token
+    return {padded[i:i + 3] for i in range(len(token))}
+
+def _within(a: str, b: str, limit: int) -> bool:
+    """Optimal string alignment distance between a and b is at most `limit`."""
+    if abs(len(a) - len(b)) > limit:
+        return False
+    previous2, previous = None, list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = a[i - 1] != b[j - 1]
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], previous2[j - 2] + 1)
+        if min(current) > limit:
+            return False
+        previous2, previous = previous, current
+    return previous[-1] <= limit
+
+class SearchIndex:
+    def __init__(self):
+        self.keys = []  # Sorted tokens
+        self.refs = []  # (type, id) of each token
+        self.docs = {}  # (type, id) -> document
+        self.tokens = {}  # (type, id) -> its tokens
+        self.labels = {}  # (type, id) -> normalized (name, code)
+        self.vocabulary = Counter()  # token -> number of documents using it
+        self.grams = {}  # trigram -> tokens containing it
+        self.loaded = False
+        self._lock = threading.Lock()
+
+    # Building
+
+    def load(self, db):
+        areas = db.execute(select(TrafficArea.id, TrafficArea.name, TrafficArea.code, TrafficArea.city_id)).all()
+        city_of_area = {area_id: city_id for area_id, _, _, city_id in areas}
+        documents = [
+            {"type": "city", "id": city_id, "name": name, "code": code}
+            for city_id, name, code in db.execute(select(City.id, City.name, City.code))
+        ]
+        documents += [
+            {"type": "area", "id": area_id, "name": name, "code": code, "city_id": city_id}
+            for area_id, name, code, city_id in areas
+        ]
+        documents += [
+            {
+                "type": "intersection", "id": intersection_id, "name": name, "code": code,
+                "area_id": area_id, "city_id": city_of_area.get(area_id)
+            }
+            for intersection_id, name, code, area_id in db.execute(
+                select(Intersection.id, Intersection.name, Intersection.code, Intersection.area_id)
+            )
+        ]
+
+        pairs = []
+        docs, tokens, labels, vocabulary = {}, {}, {}, Counter()
+        for document in documents:
+            ref = (document["type"], document["id"])
+            docs[ref] = document
+            labels[ref] = _label(document["name"], document["code"])
+            tokens[ref] = tokenize(document["name"], document["code"])
+            vocabulary.update(tokens[ref])
+            pairs.extend((token, ref) for token in tokens[ref])
+        pairs.sort()
+        grams = {}
+        for token in vocabulary:
+            for gram in _grams(token):
+                grams.setdefault(gram, set()).add(token)
+
+        with self._lock:
+            self.keys = [token for token, _ in pairs]
+            self.refs = [ref for _, ref in pairs]
+            self.docs, self.tokens, self.labels = docs, tokens, labels
+            self.vocabulary, self.grams = vocabulary, grams
+            self.loaded = True
+
+    def ensure_loaded(self, db):
+        if not self.loaded:
+            self.load(db)
+
+    def invalidate(self):
+        """Rebuild from the database on next use (after bulk changes and deletes)."""
+        self.loaded = False
+
+    def _remove(self, ref: tuple):
+        for token in self.tokens.pop(ref, ()):
+            lo, hi = bisect_left(self.keys, token), bisect_right(self.keys, token)
+            for position in range(lo, hi):
+                if self.refs[position] == ref:
+                    del self.keys[position]
+                    del self.refs[position]
+                    break
+            self.vocabulary[token] -= 1
+            if not self.vocabulary[token]:
+                del self.vocabulary[token]
+                for gram in _grams(token):
+                    self.grams[gram].discard(token)
+        self.docs.pop(ref, None)
+        self.labels.pop(ref, None)
+
+    def upsert(self, type_: str, id_: int, name: str, code: str, **parents):
+        """Add or replace one city, area or intersection."""
+        if not self.loaded:
+            return
+        ref = (type_, id_)
+        with self._lock:
+            self._remove(ref)
+            self.docs[ref] = {"type": type_, "id": id_, "name": name, "code": code, **parents}
+            self.tokens[ref] = tokenize(name, code)
+            self.labels[ref] = _label(name, code)
+            for token in self.tokens[ref]:
+                position = bisect_right(self.keys, token)
+                self.keys.insert(position, token)
+                self.refs.insert(position, ref)
+                if not self.vocabulary[token]:
+                    for gram in _grams(token):
+                        self.grams.setdefault(gram, set()).add(token)
+                self.vocabulary[token] += 1
+
+    # Querying
+
+    def _prefix_range(self, term: str) -> tuple:
+        return bisect_left(self.keys, term), bisect_left(self.keys, term + "\uffff")
+
+    def _fuzzy_tokens(self, term: str) -> set:
+        """Tokens with a prefix within one edit of `term` (two for terms of 8+ characters)."""
+        limit = 2 if len(term) >= 8 else 1
+        grams = _grams(term)
+        shared = Counter()
+        for gram in grams:
+            shared.update(self.grams.get(gram, ()))
+        # An edit changes at most 3 of the term's trigrams
+        needed = max(1, len(grams) - 3 * limit)
+        matches = set()
+        for token, count in shared.items():
+            if count < needed:
+                continue
+            if any(_within(term, token[:n], limit) for n in range(len(term) - limit, len(term) + limit + 1) if n > 0):
+                matches.add(token)
+        return matches
+
+    def _matches(self, term: str, tokens: list, fuzzy_tokens: set) -> int:
+        """0 if a token starts with `term`, 1 if one fuzzy-matches it, -1 otherwise."""
+        if any(token.startswith(term) for token in tokens):
+            return 0
+        if fuzzy_tokens and any(token in fuzzy_tokens for token in tokens):
+            return 1
+        return -1
+
+    def search(self, query: str, limit: int = 10, types: tuple = TYPES, fuzzy: bool = False) -> list:
+        """Best matches first: exact code, then names starting with the query, then word prefixes, then fuzzy."""
+        terms = tokenize(query)
+        if not terms:
+            return []
+        phrase = " ".join(terms)
+        code = normalize(query).strip()
+        with self._lock:
+            fuzzy_by_term = {
+                term: self._fuzzy_tokens(term) if fuzzy and len(term) >= FUZZY_MIN_LENGTH else set()
+                for term in terms
+            }
+            # Candidates from the term with the fewest prefix matches
+            ranges = {term: self._prefix_range(term) for term in terms}
+            anchor = min(terms, key=lambda term: ranges[term][1] - ranges[term][0])
+            lo, hi = ranges[anchor]
+            candidates = dict.fromkeys(self.refs[lo:min(hi, lo + MAX_CANDIDATES)])
+            for token in fuzzy_by_term[anchor]:
+                lo, hi = bisect_left(self.keys, token), bisect_right(self.keys, token)
+                candidates.update(dict.fromkeys(self.refs[lo:min(hi, lo + MAX_CANDIDATES)]))
+
+            ranked = []
+            for ref in candidates:
+                if ref[0] not in types:
+                    continue
+                tokens = self.tokens[ref]
+                quality = [self._matches(term, tokens, fuzzy_by_term[term]) for term in terms]
+                if -1 in quality:
+                    continue
+                name, document_code = self.labels[ref]
+                if document_code == code:
+                    rank = 0
+                elif name.startswith(phrase):
+                    rank = 1
+                elif 1 not in quality:
+                    rank = 2
+                else:
+                    rank = 3
+                ranked.append((rank, TYPES.index(ref[0]), len(name), name, ref))
+            ranked.sort()
+            return [dict(self.docs[ref], match="fuzzy" if rank == 3 else "prefix") for rank, _, _, _, ref in ranked[:limit]]
+
+    def stats(self) -> dict:
+        return {
+            "loaded": self.loaded,
+            "documents": len(self.docs),
+            "tokens": len(self.keys),
+            "distinct_tokens": len(self.vocabulary)
+        }
+
+search_index = SearchIndex()
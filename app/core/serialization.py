@@ -0,0 +1,56 @@
+"""
+Fast JSON path for large responses and WebSocket frames.
+
+Hot reads select plain column tuples in response-schema field order and turn
+them straight into dicts, skipping ORM instances and per-object pydantic
+validation. The output matches what the pydantic response models produce.
+
+orjson is used when it is installed (the `speedups` extra); otherwise the
+stdlib encoder is used with the same output.
+"""
+import json
+from datetime import date, datetime, timezone
+from fastapi import Response
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+def _default(value):
+    # Mirror pydantic's JSON mode: ISO 8601, UTC written as "Z"
+    if isinstance(value, datetime):
+        if value.tzinfo is not None and value.utcoffset() == timezone.utc.utcoffset(None):
+            return value.replace(tzinfo=None).isoformat() + "Z"
+        return value.isoformat()
+    if isinstance(value, date):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+if orjson is not None:
+    _OPTIONS = orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS
+
+    def dumps(content) -> bytes:
+        return orjson.dumps(content, default=_default, option=_OPTIONS)
+
+    def dumps_text(content) -> str:
+        return orjson.dumps(content, default=_default, option=_OPTIONS).decode()
+else:
+    _encoder = json.JSONEncoder(default=_default, separators=(",", ":"), ensure_ascii=False)
+
+    def dumps(content) -> bytes:
+        return _encoder.encode(content).encode()
+
+    def dumps_text(content) -> str:
+        return _encoder.encode(content)
+
+def field_names(schema, exclude=()) -> list:
+    """A response schema's fields in serialization order."""
+    return [name for name in schema.model_fields if name not in exclude]
+
+def records(names: list, rows) -> list:
+    """Column tuples (selected in `names` order) as JSON-ready dicts."""
+    return [dict(zip(names, row)) for row in rows]
+
+def json_response(content, headers: dict = None, status_code: int = 200) -> Response:
+    return Response(content=dumps(content), status_code=status_code, media_type="application/json", headers=headers)
@@ -0,0 +1,200 @@
+"""
+Controller state snapshots.
+
+The light store's arrays are copied periodically, and at shutdown, into
+fixed-layout memory-mapped files. On a restart without Redis state, each
+cycle then resumes where it was instead of the whole city starting at phase 0.
+
+Writes are plain buffer copies of the typed arrays, with no per-record
+serialization. Reads cast the mapped file into typed memoryviews without
+copying it. Two files are written alternately, so a crash mid-write always
+leaves the previous snapshot intact.
+
+Layout (little-endian; every section starts on an 8-byte boundary):
+
+    header           magic, version, complete flag, intersections n, lights m, saved_at
+    intersection_id  int32[n]
+    phase            uint8[n]
+    phase_end        float64[n]
+    first_light      int32[n]   lights of intersection k: first_light[k] .. + light_count[k]
+    light_count      int32[n]
+    light_id         int32[m]   grouped by intersection
+    manual           uint8[m]
+    manual_until     float64[m]
+    duration         int32[m]
+"""
+import mmap
+import os
+import struct
+import sys
+from datetime import datetime, timezone
+from app.core.config import settings
+
+MAGIC = b"TLSNAP"
+SNAPSHOT_VERSION = 2
+HEADER = struct.Struct("<6sHIIId")  # magic, version, complete, n, m, saved_at
+SLOTS = 2
+
+# (store attribute, typecode) in file order; the section length is n or m
+INTERSECTION_SECTIONS = (
+    ("intersection_id", "i"), ("phase", "B"), ("phase_end", "d"), ("first_light", "i"), ("light_count", "i")
+)
+LIGHT_SECTIONS = (("light_id", "i"), ("manual", "B"), ("manual_until", "d"), ("duration", "i"))
+ITEM_SIZES = {"i": 4, "B": 1, "d": 8}
+
+def _align(offset: int) -> int:
+    return (offset + 7) & ~7
+
+def _layout(n: int, m: int) -> tuple:
+    """{section: (offset, count, typecode)} and the total file size."""
+    sections = {}
+    offset = _align(HEADER.size)
+    for sections_, count in ((INTERSECTION_SECTIONS, n), (LIGHT_SECTIONS, m)):
+        for name, code in sections_:
+            sections[name] = (offset, count, code)
+            offset = _align(offset + count * ITEM_SIZES[code])
+    return sections, offset
+
+def _slot_paths(path: str) -> list:
+    return [f"{path}.{slot}" for slot in range(SLOTS)]
+
+def _bytes(values) -> memoryview:
+    view = memoryview(values)
+    return view.cast("B") if view.format != "B" else view
+
+class SnapshotWriter:
+    """Keeps both snapshot files mapped and overwrites the older one on each save."""
+
+    def __init__(self, path: str = None):
+        self.path = path or settings.SNAPSHOT_FILE
+        self.maps = [None] * SLOTS
+        self.next_slot = 0
+
+    def _map(self, slot: int, size: int) -> mmap.mmap:
+        current = self.maps[slot]
+        if current is not None and len(current) == size:
+            return current
+        if current is not None:
+            current.close()
+        with open(_slot_paths(self.path)[slot], "a+b") as f:
+            f.truncate(size)
+            self.maps[slot] = mmap.mmap(f.fileno(), size)
+        return self.maps[slot]
+
+    def save(self, store) -> int:
+        """Copy the store's arrays into the older slot. Returns the number of intersections saved."""
+        n, m = len(store.intersection_id), len(store.light_id)
+        sections, size = _layout(n, m)
+        slot = self.next_slot
+        target = self._map(slot, size)
+
+        # Mark incomplete first so a torn write is never read back
+        target[:HEADER.size] = HEADER.pack(MAGIC, SNAPSHOT_VERSION, 0, n, m, 0.0)
+        for name, (offset, count, code) in sections.items():
+            values = _bytes(getattr(store, name))
+            target[offset:offset + len(values)] = values
+        saved_at = datetime.now(timezone.utc).timestamp()
+        target[:HEADER.size] = HEADER.pack(MAGIC, SNAPSHOT_VERSION, 1, n, m, saved_at)
+        target.flush()
+
+        self.next_slot = (slot + 1) % SLOTS
+        return n
+
+    def close(self):
+        for slot, current in enumerate(self.maps):
+            if current is not None:
+                current.close()
+                self.maps[slot] = None
+
+class Snapshot:
+    """A mapped snapshot file, read in place through typed memoryviews."""
+
+    def __init__(self, f, saved_at: float, n: int, m: int):
+        self.saved_at = saved_at
+        self._positions = None
+        self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._views = []
+        view = memoryview(self._map)
+        self._views.append(view)
+        sections, _ = _layout(n, m)
+        for name, (offset, count, code) in sections.items():
+            section = view[offset:offset + count * ITEM_SIZES[code]].cast(code)
+            self._views.append(section)
+            setattr(self, name, section)
+
+    def _find(self, intersection_id: int) -> int:
+        if self._positions is None:
+            # One pass over the mapped ids beats a bisect per lookup on a memoryview
+            self._positions = {iid: k for k, iid in enumerate(self.intersection_id)}
+        return self._positions.get(intersection_id, -1)
+
+    def phase_of(self, intersection_id: int):
+        """(phase, phase_end) of an intersection, or None if it isn't in the snapshot or never started."""
+        k = self._find(intersection_id)
+        if k < 0 or not self.phase_end[k]:
+            return None
+        return self.phase[k], self.phase_end[k]
+
+    def manual_until_of(self, intersection_id: int, light_id: int) -> float:
+        """When a light's manual override ends, or 0 if unknown or not manual."""
+        k = self._find(intersection_id)
+        if k < 0:
+            return 0.0
+        first = self.first_light[k]
+        for li in range(first, first + self.light_count[k]):
+            if self.light_id[li] == light_id:
+                return self.manual_until[li] if self.manual[li] else 0.0
+        return 0.0
+
+    def close(self):
+        for view in reversed(self._views):
+            view.release()
+        self._views = []
+        self._map.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def _read_header(path: str):
+    try:
+        with open(path, "rb") as f:
+            header = f.read(HEADER.size)
+    except OSError:
+        return None
+    if len(header) < HEADER.size:
+        return None
+    magic, version, complete, n, m, saved_at = HEADER.unpack(header)
+    if magic != MAGIC or version != SNAPSHOT_VERSION or not complete:
+        return None
+    return saved_at, n, m
+
+def load_snapshot(path: str = None):
+    """The most recent complete snapshot, or None. Close it (or use `with`) when done."""
+    if sys.byteorder != "little":
+        return None
+    path = path or settings.SNAPSHOT_FILE
+    candidates = []
+    for slot_path in _slot_paths(path):
+        header = _read_header(slot_path)
+        if header:
+            candidates.append((header, slot_path))
+    if not candidates:
+        return None
+    (saved_at, n, m), slot_path = max(candidates)
+    if n + m == 0:
+        return None
+    with open(slot_path, "rb") as f:
+        return Snapshot(f, saved_at, n, m)
+
+def remove_snapshot(path: str = None):
+    for slot_path in _slot_paths(path or settings.SNAPSHOT_FILE):
+        if os.path.exists(slot_path):
+            os.remove(slot_path)
+
+snapshot_writer = SnapshotWriter()
+
+def save_snapshot(store) -> int:
+    return snapshot_writer.save(store)
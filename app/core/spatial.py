@@ -0,0 +1,227 @@
+"""
+In-memory spatial index of intersection coordinates.
+
+A uniform grid of SPATIAL_CELL_DEGREES cells maps each occupied cell to the
+intersections in it (id -> (lat, lon)), so:
+
+- viewport (bounding box) queries take cells fully inside the box wholesale
+  and only check the coordinates of the border cells;
+- k-nearest queries search rings of cells outward from the query point until
+  no closer intersection can be left;
+- route corridors look up each route segment's expanded bounding box.
+
+The index is built from the database on first use. Intersection creates and
+location changes update it in place; bulk imports mark it for a rebuild.
+Distances are in meters (haversine; corridor offsets use a local flat
+projection, which is accurate at city scale).
+"""
+import heapq
+import math
+import re
+import threading
+from sqlalchemy import select
+from app.core.config import settings
+from app.models.intersection import Intersection
+
+EARTH_RADIUS = 6_371_000.0
+METERS_PER_DEGREE = math.pi * EARTH_RADIUS / 180
+
+LOCATION = re.compile(r"^\s*([-+]?\d+(?:\.\d+)?)\s*,\s*([-+]?\d+(?:\.\d+)?)\s*$")
+
+def parse_location(text):
+    """(lat, lon) from a "lat, lon" location string, or None for free text."""
+    match = LOCATION.match(text or "")
+    if not match:
+        return None
+    lat, lon = float(match.group(1)), float(match.group(2))
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        return None
+    return lat, lon
+
+def haversine(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    a = math.sin((phi2 - phi1) / 2) ** 2 + \
+        math.cos(phi1) * math.cos(phi2) * math.sin(math.radians(lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS * math.asin(min(1.0, math.sqrt(a)))
+
+def approach_direction(bearing: float) -> str:
+    """The side a vehicle travelling on `bearing` (degrees) arrives from."""
+    return ("South", "West", "North", "East")[int((bearing % 360 + 45) // 90) % 4]
+
+class SpatialIndex:
+    def __init__(self, cell: float = None):
+        self.cell = cell or settings.SPATIAL_CELL_DEGREES
+        self.cells = {}  # (cx, cy) -> {intersection_id: (lat, lon)}
+        self.points = {}  # intersection_id -> (lat, lon)
+        self.loaded = False
+        self._lock = threading.Lock()
+
+    def _key(self, lat: float, lon: float) -> tuple:
+        return int(math.floor(lon / self.cell)), int(math.floor(lat / self.cell))
+
+    def load(self, db):
+        rows = db.execute(
+            select(Intersection.id, Intersection.latitude, Intersection.longitude)
+            .where(Intersection.latitude.is_not(None), Intersection.longitude.is_not(None))
+        ).all()
+        cells, points = {}, {}
+        for intersection_id, lat, lon in rows:
+            points[intersection_id] = (lat, lon)
+            cells.setdefault(self._key(lat, lon), {})[intersection_id] = (lat, lon)
+        with self._lock:
+            self.cells, self.points = cells, points
+            self.loaded = True
+
+    def ensure_loaded(self, db):
+        if not self.loaded:
+            self.load(db)
+
+    def invalidate(self):
+        """Rebuild from the database on next use (after bulk changes)."""
+        self.loaded = False
+
+    def update(self, intersection_id: int, lat, lon):
+        """Add, move or (with lat/lon None) remove one intersection."""
+        if not self.loaded:
+            return
+        with self._lock:
+            previous = self.points.pop(intersection_id, None)
+            if previous is not None:
+                key = self._key(*previous)
+                cell = self.cells[key]
+                del cell[intersection_id]
+                if not cell:
+                    del self.cells[key]
+            if lat is not None and lon is not None:
+                self.points[intersection_id] = (lat, lon)
+                self.cells.setdefault(self._key(lat, lon), {})[intersection_id] = (lat, lon)
+
+    # Queries
+
+    def _in_box(self, south: float, west: float, north: float, east: float):
+        """Yield (intersection_id, lat, lon) inside the box (west <= east)."""
+        x0, y0 = self._key(south, west)
+        x1, y1 = self._key(north, east)
+        if (x1 - x0 + 1) * (y1 - y0 + 1) <= len(self.cells):
+            keys = ((x, y) for x in range(x0, x1 + 1) for y in range(y0, y1 + 1))
+        else:
+            # Huge box: walking the occupied cells is cheaper than every cell in it
+            keys = (key for key in self.cells if x0 <= key[0] <= x1 and y0 <= key[1] <= y1)
+        for key in keys:
+            cell = self.cells.get(key)
+            if not cell:
+                continue
+            x, y = key
+            if x0 < x < x1 and y0 < y < y1:
+                for intersection_id, (lat, lon) in cell.items():
+                    yield intersection_id, lat, lon
+            else:
+                for intersection_id, (lat, lon) in cell.items():
+                    if south <= lat <= north and west <= lon <= east:
+                        yield intersection_id, lat, lon
+
+    def within(self, south: float, west: float, north: float, east: float, limit: int = None) -> list:
+        """Ids of the intersections in a viewport; west > east crosses the antimeridian."""
+        if west > east:
+            boxes = [(south, west, north, 180.0), (south, -180.0, north, east)]
+        else:
+            boxes = [(south, west, north, east)]
+        ids = []
+        with self._lock:
+            for box in boxes:
+                for intersection_id, _, _ in self._in_box(*box):
+                    ids.append(intersection_id)
+                    if limit is not None and len(ids) >= limit:
+                        return ids
+        return ids
+
+    def nearest(self, lat: float, lon: float, k: int = 10, max_distance: float = None) -> list:
+        """The k nearest intersections as (distance_m, intersection_id), closest first."""
+        cx, cy = self._key(lat, lon)
+        best = []  # Max-heap of (-distance, id) holding the k closest so far
+        with self._lock:
+            if not self.cells:
+                return []
+            xs = [key[0] for key in self.cells]
+            ys = [key[1] for key in self.cells]
+            last_ring = max(cx - min(xs), max(xs) - cx, cy - min(ys), max(ys) - cy)
+            ring = 0
+            while ring <= last_ring:
+                if (2 * ring + 1) ** 2 > 4 * len(self.cells):
+                    # The rings have outgrown the occupied cells: check the rest directly
+                    keys = [key for key in self.cells if max(abs(key[0] - cx), abs(key[1] - cy)) >= ring]
+                    last_ring = ring
+                elif ring == 0:
+                    keys = [(cx, cy)]
+                else:
+                    keys = [(x, cy - ring) for x in range(cx - ring, cx + ring + 1)] + \
+                           [(x, cy + ring) for x in range(cx - ring, cx + ring + 1)] + \
+                           [(cx - ring, y) for y in range(cy - ring + 1, cy + ring)] + \
+                           [(cx + ring, y) for y in range(cy - ring + 1, cy + ring)]
+                for key in keys:
+                    for intersection_id, (plat, plon) in self.cells.get(key, {}).items():
+                        distance = haversine(lat, lon, plat, plon)
+                        if max_distance is not None and distance > max_distance:
+                            continue
+                        if len(best) < k:
+                            heapq.heappush(best, (-distance, intersection_id))
+                        elif distance < -best[0][0]:
+                            heapq.heapreplace(best, (-distance, intersection_id))
+
+                # Anything in the next ring is at least `ring` cells away in latitude or longitude
+                reach_lat = min(90.0, abs(lat) + (ring + 1) * self.cell)
+                bound = ring * self.cell * METERS_PER_DEGREE * math.cos(math.radians(reach_lat))
+                if max_distance is not None and bound > max_distance:
+                    break
+                if len(best) >= k and bound >= -best[0][0]:
+                    break
+                ring += 1
+        return sorted((-distance, intersection_id) for distance, intersection_id in best)
+
+    def corridor(self, route: list, width: float) -> list:
+        """
+        Intersections within `width` meters of a route given as [(lat, lon), ...],
+        in the order the route reaches them. Each is a dict with
+        intersection_id, distance_m along the route, offset_m from it and the
+        approach direction the route arrives from.
+        """
+        found = {}  # intersection_id -> (distance along, offset, bearing)
+        travelled = 0.0
+        with self._lock:
+            for (lat0, lon0), (lat1, lon1) in zip(route, route[1:]):
+                scale = METERS_PER_DEGREE * math.cos(math.radians((lat0 + lat1) / 2))
+                dx, dy = (lon1 - lon0) * scale, (lat1 - lat0) * METERS_PER_DEGREE
+                length_sq = dx * dx + dy * dy
+                length = math.sqrt(length_sq)
+                bearing = math.degrees(math.atan2(dx, dy)) % 360
+
+                pad_lat = width / METERS_PER_DEGREE
+                pad_lon = width / scale if scale > 0 else 360.0
+                box = (
+                    min(lat0, lat1) - pad_lat, min(lon0, lon1) - pad_lon,
+                    max(lat0, lat1) + pad_lat, max(lon0, lon1) + pad_lon
+                )
+                for intersection_id, lat, lon in self._in_box(*box):
+                    px, py = (lon - lon0) * scale, (lat - lat0) * METERS_PER_DEGREE
+                    t = max(0.0, min(1.0, (px * dx + py * dy) / length_sq)) if length_sq else 0.0
+                    offset = math.hypot(px - t * dx, py - t * dy)
+                    if offset > width:
+                        continue
+                    previous = found.get(intersection_id)
+                    if previous is None or offset < previous[1]:
+                        found[intersection_id] = (travelled + t * length, offset, bearing)
+                travelled += length
+
+        stops = [
+            {
+                "intersection_id": intersection_id,
+                "distance_m": round(along, 1),
+                "offset_m": round(offset, 1),
+                "direction": approach_direction(bearing)
+            }
+            for intersection_id, (along, offset, bearing) in found.items()
+        ]
+        stops.sort(key=lambda stop: stop["distance_m"])
+        return stops
+
+spatial_index = SpatialIndex()
@@ -0,0 +1,42 @@
+"""Startup timing: how long the process took to start serving, by stage."""
+import logging
+import os
+import time
+
+_imported = time.monotonic()
+logger = logging.getLogger(__name__)
+
+def process_age() -> float:
+    """Seconds since the process started (since this module was imported where /proc is unavailable)."""
+    try:
+        with open("/proc/self/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        started = int(fields[19]) / os.sysconf("SC_CLK_TCK")
+        with open("/proc/uptime") as f:
+            uptime = float(f.read().split()[0])
+        return uptime - started
+    except (OSError, ValueError, IndexError, AttributeError):
+        return time.monotonic() - _imported
+
+class StartupReport:
+    def __init__(self):
+        self.stages = {}  # stage -> seconds
+        self.details = {}
+        self.serving_after = None  # Seconds from process start
+        self._last = time.monotonic()
+
+    def mark(self, stage: str, seconds: float = None, **details):
+        """Record a stage, timed since the previous mark unless `seconds` is given."""
+        now = time.monotonic()
+        self.stages[stage] = round(seconds if seconds is not None else now - self._last, 4)
+        self._last = now
+        self.details.update(details)
+
+    def serving(self):
+        self.serving_after = round(process_age(), 3)
+        logger.info("🚀 Serving %ss after process start (%s)", self.serving_after, self.stages)
+
+    def as_dict(self) -> dict:
+        return {"serving_after": self.serving_after, "stages": self.stages, **self.details}
+
+startup_report = StartupReport()
@@ -0,0 +1,327 @@
+"""
+Bulk topology import.
+
+A topology is a stream of intersection records, each naming the city and area
+it belongs to:
+
+    city_code, city_name, area_code, area_name,
+    code, name, location, phase_plan (default four_way), duration (default 60),
+    latitude, longitude (optional, else taken from a "lat, lon" location)
+
+Accepted as CSV (header row), JSON (an array of records, or one record per
+line) or GeoJSON (a FeatureCollection of Point features whose properties are
+the record; the point becomes the "lat, lon" location).
+
+Files are read incrementally and inserted in batches with executemany inside a
+single transaction. Cities are matched by code and areas by (city, area code),
+and are created when missing. Intersection codes are checked against the
+database and the rest of the file before each row is inserted; bad rows are
+skipped and reported with their row number. A reader that cannot make sense
+of a row (a GeoJSON point without usable coordinates) flags it with an
+"_error" message, so it is rejected the same way.
+"""
+import csv
+import io
+import json
+import time
+from sqlalchemy import insert, select
+from app.core.phase_plans import COMPILED_PLANS, DEFAULT_PLAN, STATUS_NAMES
+from app.core.spatial import parse_location
+from app.models.city import City, TrafficArea
+from app.models.intersection import Intersection
+from app.models.traffic import TrafficLight
+
+FORMATS = ("csv", "json", "geojson")
+DEFAULT_DURATION = 60
+MAX_REPORTED_ERRORS = 1000
+CHUNK_SIZE = 64 * 1024
+
+class TopologyFormatError(Exception):
+    """The file itself cannot be read (unknown format, malformed JSON)."""
+
+def detect_format(filename: str) -> str:
+    name = (filename or "").lower()
+    if name.endswith(".geojson"):
+        return "geojson"
+    if name.endswith((".json", ".jsonl", ".ndjson")):
+        return "json"
+    return "csv"
+
+def _iter_csv(stream):
+    yield from csv.DictReader(stream)
+
+def _iter_json_values(stream, buffer: str = ""):
+    """Decode consecutive JSON values from `stream`, separated by whitespace or commas, until ']'."""
+    decoder = json.JSONDecoder()
+    eof = False
+    while True:
+        position = 0
+        while position < len(buffer) and buffer[position] in " \t\r\n,":
+            position += 1
+        buffer = buffer[position:]
+        if buffer.startswith("]"):
+            return
+        if not buffer:
+            if eof:
+                return
+            chunk = stream.read(CHUNK_SIZE)
+            eof = not chunk
+            buffer += chunk
+            continue
+        try:
+            value, end = decoder.raw_decode(buffer)
+        except json.JSONDecodeError:
+            if eof:
+                raise TopologyFormatError("Malformed JSON near: " + buffer[:80])
+            chunk = stream.read(CHUNK_SIZE)
+            eof = not chunk
+            buffer += chunk
+            continue
+        yield value
+        buffer = buffer[end:]
+
+def _read_until(stream, marker: str) -> str:
+    """Consume the stream up to and including `marker`; return what follows it in the buffer."""
+    buffer = ""
+    while True:
+        index = buffer.find(marker)
+        if index >= 0:
+            return buffer[index + len(marker):]
+        chunk = stream.read(CHUNK_SIZE)
+        if not chunk:
+            raise TopologyFormatError(f"Expected {marker!r} in the input")
+        # Keep a tail in case the marker spans two chunks
+        buffer = buffer[-len(marker):] + chunk
+
+def _iter_json(stream):
+    first = stream.read(CHUNK_SIZE)
+    stripped = first.lstrip()
+    if stripped.startswith("["):
+        # A JSON array of records
+        yield from _iter_json_values(stream, stripped[1:])
+    else:
+        # JSON Lines
+        yield from _iter_json_values(stream, first)
+
+def _is_number(value) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+def _iter_geojson(stream):
+    rest = _read_until(stream, '"features"')
+    rest = rest.lstrip()
+    while not rest.startswith(":"):
+        chunk = stream.read(CHUNK_SIZE)
+        if not chunk:
+            raise TopologyFormatError("Expected a features array")
+        rest = (rest + chunk).lstrip()
+    rest = rest[1:].lstrip()
+    while not rest.startswith("["):
+        chunk = stream.read(CHUNK_SIZE)
+        if not chunk:
+            raise TopologyFormatError("Expected a features array")
+        rest = (rest + chunk).lstrip()
+    for feature in _iter_json_values(stream, rest[1:]):
+        if not isinstance(feature, dict):
+            yield feature
+            continue
+        properties = feature.get("properties")
+        record = dict(properties) if isinstance(properties, dict) else {}
+        geometry = feature.get("geometry")
+        if isinstance(geometry, dict) and geometry.get("type") == "Point" and not record.get("location"):
+            point = geometry.get("coordinates")
+            if isinstance(point, list) and len(point) >= 2 and all(_is_number(v) for v in point[:2]):
+                lon, lat = point[:2]
+                record["location"] = f"{lat}, {lon}"
+            else:
+                record["_error"] = "Point geometry needs [longitude, latitude] coordinates"
+        yield record
+
+READERS = {"csv": _iter_csv, "json": _iter_json, "geojson": _iter_geojson}
+
+def coordinates(record: dict):
+    """(lat, lon) from explicit latitude/longitude fields or the location, or None."""
+    lat, lon = record.get("latitude"), record.get("longitude")
+    if lat in (None, "") or lon in (None, ""):
+        return parse_location(str(record.get("location") or ""))
+    lat, lon = float(lat), float(lon)
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        raise ValueError("latitude/longitude out of range")
+    return lat, lon
+
+def iter_records(stream, format: str):
+    if format not in READERS:
+        raise TopologyFormatError(f"Unknown format: {format}")
+    return READERS[format](stream)
+
+class TopologyImporter:
+    def __init__(self, db, batch_size: int = 5000, dry_run: bool = False, strict: bool = False):
+        self.db = db
+        self.batch_size = batch_size
+        self.dry_run = dry_run
+        self.strict = strict
+
+        self.cities = {}  # code -> id
+        self.city_names = set()
+        self.areas = {}  # (city_id, code) -> id
+        self.codes = set()  # Intersection codes taken
+        self.pending = []  # Intersection rows waiting for the next batch
+        self.pending_plans = []  # (plan, duration) per pending row
+
+        self.rows = 0
+        self.imported = 0
+        self.lights = 0
+        self.created_cities = 0
+        self.created_areas = 0
+        self.error_count = 0
+        self.errors = []
+
+    def _load_existing(self):
+        db = self.db
+        for city_id, code, name in db.execute(select(City.id, City.code, City.name)):
+            self.cities[code] = city_id
+            self.city_names.add(name)
+        self.areas = {
+            (city_id, code): area_id
+            for area_id, city_id, code in db.execute(select(TrafficArea.id, TrafficArea.city_id, TrafficArea.code))
+        }
+        self.codes = set(db.execute(select(Intersection.code)).scalars())
+
+    def _error(self, row: int, record: dict, message: str):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"row": row, "code": record.get("code"), "error": message})
+
+    def _city_id(self, record: dict):
+        code = str(record.get("city_code") or "").strip()
+        if not code:
+            raise ValueError("city_code is required")
+        city_id = self.cities.get(code)
+        if city_id is None:
+            name = str(record.get("city_name") or code).strip()
+            if name in self.city_names:
+                raise ValueError(f"City name {name} already belongs to another city code")
+            city_id = self.db.execute(insert(City).returning(City.id), {"code": code, "name": name}).scalar_one()
+            self.cities[code] = city_id
+            self.city_names.add(name)
+            self.created_cities += 1
+        return city_id
+
+    def _area_id(self, city_id: int, record: dict):
+        code = str(record.get("area_code") or "").strip()
+        if not code:
+            raise ValueError("area_code is required")
+        area_id = self.areas.get((city_id, code))
+        if area_id is None:
+            area_id = self.db.execute(
+                insert(TrafficArea).returning(TrafficArea.id),
+                {"city_id": city_id, "code": code, "name": str(record.get("area_name") or code).strip()}
+            ).scalar_one()
+            self.areas[(city_id, code)] = area_id
+            self.created_areas += 1
+        return area_id
+
+    def _add(self, row: int, record: dict):
+        if record.get("_error"):
+            raise ValueError(record["_error"])
+        code = str(record.get("code") or "").strip()
+        name = str(record.get("name") or "").strip()
+        if not code or not name:
+            raise ValueError("code and name are required")
+        if code in self.codes:
+            raise ValueError(f"Duplicate intersection code: {code}")
+
+        plan_name = str(record.get("phase_plan") or DEFAULT_PLAN).strip()
+        plan = COMPILED_PLANS.get(plan_name)
+        if plan is None:
+            raise ValueError(f"Unknown phase plan: {plan_name}")
+        duration = int(record.get("duration") or DEFAULT_DURATION)
+        if duration <= 0:
+            raise ValueError("duration must be positive")
+
+        point = coordinates(record) or (None, None)
+        area_id = self._area_id(self._city_id(record), record)
+        self.codes.add(code)
+        self.pending.append({
+            "area_id": area_id,
+            "code": code,
+            "name": name,
+            "location": str(record.get("location") or ""),
+            "latitude": point[0],
+            "longitude": point[1],
+            "is_favorite": False
+        })
+        self.pending_plans.append((plan, duration))
+        if len(self.pending) >= self.batch_size:
+            self._flush()
+
+    def _flush(self):
+        if not self.pending:
+            return
+        ids = self.db.execute(
+            insert(Intersection).returning(Intersection.id, sort_by_parameter_order=True),
+            self.pending
+        ).scalars().all()
+
+        lights = []
+        for intersection_id, (plan, duration) in zip(ids, self.pending_plans):
+            first_phase = plan.status[0]
+            for movement, direction in enumerate(plan.movements):
+                lights.append({
+                    "intersection_id": intersection_id,
+                    "direction": direction,
+                    "status": STATUS_NAMES[first_phase[movement]],
+                    "duration": duration,
+                    "current_density": 0,
+                    "is_manual": False,
+                    "is_active": True
+                })
+        self.db.execute(insert(TrafficLight), lights)
+
+        self.imported += len(ids)
+        self.lights += len(lights)
+        self.pending = []
+        self.pending_plans = []
+
+    def run(self, records) -> dict:
+        """Import every record in one transaction and return a summary."""
+        started = time.perf_counter()
+        self._load_existing()
+        try:
+            for row, record in enumerate(records, start=1):
+                self.rows = row
+                if not isinstance(record, dict):
+                    self._error(row, {}, "Record must be an object")
+                    continue
+                try:
+                    self._add(row, record)
+                except (ValueError, TypeError) as e:
+                    self._error(row, record, str(e))
+            self._flush()
+        except Exception:
+            self.db.rollback()
+            raise
+
+        committed = not self.dry_run and not (self.strict and self.error_count)
+        if committed:
+            self.db.commit()
+        else:
+            self.db.rollback()
+
+        return {
+            "committed": committed,
+            "rows": self.rows,
+            "intersections": self.imported,
+            "traffic_lights": self.lights,
+            "cities_created": self.created_cities,
+            "areas_created": self.created_areas,
+            "error_count": self.error_count,
+            "errors": self.errors,
+            "seconds": round(time.perf_counter() - started, 3)
+        }
+
+def import_topology(db, stream, format: str, **options) -> dict:
+    """Import a text stream of the given format (see module docstring)."""
+    return TopologyImporter(db, **options).run(iter_records(stream, format))
+
+def open_text(binary) -> io.TextIOWrapper:
+    return io.TextIOWrapper(binary, encoding="utf-8-sig", newline="")
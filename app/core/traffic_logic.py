@@ -1,9 +1,25 @@
 import asyncio
+import logging
+import time
 from datetime import datetime, timedelta, timezone
 from sqlalchemy.orm import Session
-from app.models.traffic import TrafficLight
-from app.models.intersection import Intersection
+from app.db.queries import light_by_id, lights_of
 from app.services.redis import get_redis
+from app.core.light_store import light_store
+from app.core.preemption import preemption_manager
+from app.core.response_cache import LIGHTS, response_cache
+from app.core.phase_plans import plan_for_lights, RED, STATUS_CODES, STATUS_NAMES
+from app.core.analytics import analytics
+from app.core.green_wave import green_wave
+from app.core.journal import CYCLE, EXPIRY, MANUAL, RESET, SAFETY, journal
+from app.core.safety import SafetyViolation, validate
+from app.core.schedule import build_schedule, is_schedulable, phase_start
+from app.core.snapshot import save_snapshot
+from app.core.startup import startup_report
+from app.core.watchdog import SHED_BROADCASTS, SHED_TRANSITIONS, tick_watchdog
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
 
 class TrafficController:
     def __init__(self, db: Session):
@@ -16,7 +32,7 @@ class TrafficController:
         
         # Fallback to DB if Redis is empty
         if not status:
-            light = self.db.query(TrafficLight).filter(TrafficLight.id == light_id).first()
+            light = light_by_id(self.db, light_id)
             if light:
                 status = light.status
                 # If no end time, assume it just started or is manual
@@ -31,91 +47,85 @@ class TrafficController:
     async def set_manual_state(self, light_id: int, status: str, duration: int = None):
         # Fetch all lights for this intersection to ensure atomic consistency
         # We need to know which intersection this light belongs to first
-        target_light = self.db.query(TrafficLight).filter(TrafficLight.id == light_id).first()
+        target_light = light_by_id(self.db, light_id)
         if not target_light:
             return
             
         intersection_id = target_light.intersection_id
-        all_lights = self.db.query(TrafficLight).filter(TrafficLight.intersection_id == intersection_id).all()
-        
-        # Map lights by direction for easy access
-        lights_by_dir = {l.direction: l for l in all_lights}
-        target_light = lights_by_dir.get(target_light.direction) # Refresh reference
+        all_lights = lights_of(self.db, intersection_id)
+        # Overrides are decided and validated on the statuses the controller runs on
+        light_store.refresh(all_lights)
+        plan = plan_for_lights(all_lights)
         
-        # Define conflicts
-        conflicts = {
-            "North": ["East", "West"],
-            "South": ["East", "West"],
-            "East": ["North", "South"],
-            "West": ["North", "South"]
+        # Map lights by movement index for easy access
+        lights_by_movement = {
+            plan.movement_index[l.direction]: l for l in all_lights if l.direction in plan.movement_index
         }
+        movement = plan.movement_index.get(target_light.direction)
+        # A direction the plan doesn't know releases and conflicts with nothing
+        partners = plan.partners[movement] if movement is not None else ()
+        conflicts = plan.conflicts[movement] if movement is not None else ()
         
-        print(f"DEBUG: Setting manual state for {target_light.direction} to {status}")
-        
-        # 1. Update Target Light
-        target_light.is_manual = True
-        target_light.status = status
-        target_light.last_updated = datetime.now(timezone.utc)
-        if duration:
-            target_light.duration = duration
-            
-        # 2. Update Partner Light
-        partner_dir = None
-        if target_light.direction == "North": partner_dir = "South"
-        elif target_light.direction == "South": partner_dir = "North"
-        elif target_light.direction == "East": partner_dir = "West"
-        elif target_light.direction == "West": partner_dir = "East"
+        logger.debug("Setting manual state for %s to %s", target_light.direction, status)
         
-        partner_light = lights_by_dir.get(partner_dir)
-        if partner_light:
-            print(f"DEBUG: Updating partner {partner_dir}")
-            partner_light.is_manual = True
-            partner_light.status = status
-            partner_light.last_updated = datetime.now(timezone.utc)
+        def set_light(light, new_status):
+            light.is_manual = True
+            light.status = new_status
+            light.last_updated = datetime.now(timezone.utc)
             if duration:
-                partner_light.duration = duration
+                light.duration = duration
 
-        # 3. Handle Conflicts (Force RED if Green/Yellow)
+        # 1. Update Target Light and the movements released with it
+        set_light(target_light, status)
+        for partner in partners:
+            partner_light = lights_by_movement.get(partner)
+            if partner_light:
+                logger.debug("Updating partner %s", partner_light.direction)
+                set_light(partner_light, status)
+
+        # 2. Handle Conflicts (Force RED if Green/Yellow)
         if status in ["GREEN", "YELLOW"]:
-            print(f"DEBUG: Checking conflicts for {target_light.direction}")
-            for conflict_dir in conflicts.get(target_light.direction, []):
-                conflict_light = lights_by_dir.get(conflict_dir)
+            logger.debug("Checking conflicts for %s", target_light.direction)
+            for conflict in conflicts:
+                conflict_light = lights_by_movement.get(conflict)
                 if conflict_light:
-                    print(f"DEBUG: Forcing conflict {conflict_dir} to RED")
-                    # Force conflict to RED
-                    conflict_light.status = "RED"
-                    conflict_light.is_manual = True
-                    conflict_light.last_updated = datetime.now(timezone.utc)
+                    logger.debug("Forcing conflict %s to RED", conflict_light.direction)
+                    set_light(conflict_light, "RED")
                     conflict_light.duration = target_light.duration # Sync duration
         
-        # If setting to RED, we might want to set conflicts to GREEN (Smart Switching)
-        # But only if they aren't already manually set to RED? 
-        # For safety, let's just ensure we don't leave everyone RED forever if possible,
-        # but the user asked for "Smart Switching" (Red -> Green).
-        elif status == "RED":
-            # Check if we should turn the cross-traffic GREEN
-            # This is complex because we don't want to override if the user specifically wanted ALL RED.
-            # But based on previous requirements: "Green -> Red: Automatically turns conflicting lights GREEN."
-            
-            for conflict_dir in conflicts.get(target_light.direction, []):
-                conflict_light = lights_by_dir.get(conflict_dir)
+        # Smart Switching: "Green -> Red: Automatically turns conflicting lights GREEN."
+        # Only the movements of the plan's next GREEN phase are released, so
+        # conflicting movements are never turned GREEN together.
+        elif status == "RED" and conflicts:
+            relief = plan.status[plan.relief_phase[movement]]
+            for conflict in conflicts:
+                conflict_light = lights_by_movement.get(conflict)
                 if conflict_light:
-                    conflict_light.status = "GREEN"
-                    conflict_light.is_manual = True
-                    conflict_light.last_updated = datetime.now(timezone.utc)
+                    set_light(conflict_light, STATUS_NAMES[relief[conflict]])
                     conflict_light.duration = target_light.duration
 
+        # Never let a conflicting state reach the DB or Redis
+        try:
+            validate(all_lights, plan=plan)
+        except SafetyViolation:
+            self.db.rollback()
+            raise
+
         self.db.commit()
+        for light in all_lights:
+            light_store.sync_light(light)
         
-        # 4. Broadcast Updates
+        # 3. Broadcast Updates
         redis = await get_redis()
         from app.api.v1.endpoints.websocket import broadcast_batch_update
         
-        end_time = (datetime.now(timezone.utc) + timedelta(seconds=target_light.duration)).timestamp()
+        now = datetime.now(timezone.utc)
+        end_time = (now + timedelta(seconds=target_light.duration)).timestamp()
         updates = []
         
         # We iterate over all lights to ensure we capture every state change
         for light in all_lights:
+            journal.record(intersection_id, light.id, STATUS_CODES.get(light.status, RED), end_time, MANUAL, now.timestamp())
             # Update Redis
             await redis.set(f"traffic_light:{light.id}:status", light.status)
             await redis.set(f"traffic_light:{light.id}:end_time", end_time)
@@ -132,256 +142,305 @@ class TrafficController:
             await broadcast_batch_update(updates)
 
     async def reset_manual_state(self, light_id: int):
-        light = self.db.query(TrafficLight).filter(TrafficLight.id == light_id).first()
+        light = light_by_id(self.db, light_id)
         if not light:
             return
+        light_store.refresh([light])
             
         light.is_manual = False
         light.last_updated = datetime.now(timezone.utc)
         self.db.commit()
+        light_store.sync_light(light)
+        journal.record(light.intersection_id, light.id, STATUS_CODES.get(light.status, RED), 0.0, RESET)
         
         # Remove from Redis manual override
         # We don't delete the status key, just let the cycle overwrite it eventually
         pass
 
     async def update_density(self, traffic_light_id: int, new_density: int):
-        light = self.db.query(TrafficLight).filter(TrafficLight.id == traffic_light_id).first()
+        light = light_by_id(self.db, traffic_light_id)
         if light:
             light.current_density = new_density
             self.db.commit()
+            # Density isn't filled in live like the status, so cached light responses go
+            response_cache.invalidate(LIGHTS)
+            analytics.observe_density(light.intersection_id, light.id, new_density)
 
     async def run_cycle(self):
         """
-        Background task to cycle traffic lights using Optimized 4-Phase Logic:
+        Background task to cycle traffic lights through each intersection's phase plan.
+        Phase order, timing and light statuses come from the compiled plan tables
+        (see app.core.phase_plans); the default four-way plan is:
         0: N/S GREEN  (Duration: light.duration)
         1: N/S YELLOW (Duration: 4s)
-        3: E/W GREEN  (Duration: light.duration)
-        4: E/W YELLOW (Duration: 4s)
-        (Phases 2 and 5 skipped for immediate transition)
+        2: E/W GREEN  (Duration: light.duration)
+        3: E/W YELLOW (Duration: 4s)
+
+        The loop works on the compact light_store; the DB is only read when the
+        store is (re)loaded and written once per tick for the lights that changed.
         """
-        from app.api.v1.endpoints.websocket import broadcast_state_update
+        from app.api.v1.endpoints.websocket import frame_coalescer
         from app.db.session import SessionLocal
         
-        print("🚦 Real-World Traffic Controller Started")
+        logger.info("🚦 Real-World Traffic Controller Started")
+        last_snapshot = time.monotonic()
+        watchdog = tick_watchdog
+        backoff = 0
         
         while True:
-            await asyncio.sleep(1)
+            slept_since = time.monotonic()
+            await asyncio.sleep(1 + backoff)
+            watchdog.begin(slept_since, 1 + backoff)
             
             try:
                 with SessionLocal() as db:
                     redis = await get_redis()
+                    if not light_store.loaded:
+                        started = time.monotonic()
+                        await light_store.load(db, redis)
+                        analytics.set_areas(db)
+                        if "controller_restore" not in startup_report.stages:
+                            startup_report.mark(
+                                "controller_restore", time.monotonic() - started,
+                                restored=light_store.restored
+                            )
                     
-                    # Check for expired manual lights
-                    manual_lights = db.query(TrafficLight).filter(TrafficLight.is_manual == True).all()
-                    for light in manual_lights:
-                        # Calculate expiration
-                        last_updated = light.last_updated
-                        if last_updated.tzinfo is None:
-                            last_updated = last_updated.replace(tzinfo=timezone.utc)
-                            
-                        expiration = last_updated + timedelta(seconds=light.duration)
+                    now = datetime.now(timezone.utc).timestamp()
+                    await self._expire_manual(redis, now)
+                    
+                    due = light_store.due(now)
+                    if watchdog.level >= SHED_TRANSITIONS:
+                        # Most overdue first, as the rest may wait for the next tick
+                        due.sort(key=light_store.phase_end.__getitem__)
+                    for k, i in enumerate(due):
+                        if watchdog.over_budget():
+                            watchdog.shed["transitions"] += len(due) - k
+                            break
+                        intersection_id = light_store.intersection_id[i]
+                        # Preempted intersections are driven by the preemption task
+                        if preemption_manager.is_preempted(intersection_id) or watchdog.skipped(intersection_id):
+                            continue
                         
-                        if datetime.now(timezone.utc) > expiration:
-                            # Revert to Auto
-                            light.is_manual = False
-                            
-                            # Sync to current intersection phase immediately
-                            phase_key = f"intersection:{light.intersection_id}:phase"
-                            phase_end_key = f"intersection:{light.intersection_id}:phase_end"
-                            
-                            phase_str = await redis.get(phase_key)
-                            phase_end_str = await redis.get(phase_end_key)
-                            
-                            if phase_str and phase_end_str:
-                                current_phase = int(phase_str)
-                                phase_end = float(phase_end_str)
-                                
-                                # Determine correct status based on phase
-                                new_status = "RED"
-                                if light.direction in ["North", "South"]:
-                                    if current_phase == 0: new_status = "GREEN"
-                                    elif current_phase == 1: new_status = "YELLOW"
-                                elif light.direction in ["East", "West"]:
-                                    if current_phase == 3: new_status = "GREEN"
-                                    elif current_phase == 4: new_status = "YELLOW"
-                                
-                                light.status = new_status
-                                light.last_updated = datetime.now(timezone.utc)
-                                
-                                # Update Redis & Broadcast
-                                await redis.set(f"traffic_light:{light.id}:status", new_status)
-                                await redis.set(f"traffic_light:{light.id}:end_time", phase_end)
-                                await broadcast_state_update(light.id, {
-                                    "status": new_status,
-                                    "end_time": phase_end
+                        # One failing intersection must not hold up the others
+                        try:
+                            # Initialize if missing
+                            if not light_store.phase_end[i]:
+                                # Default to Phase 0
+                                new_end = now + light_store.durations(i)[0]
+                                light_store.phase[i] = 0
+                                light_store.phase_end[i] = new_end
+                                await redis.mset({
+                                    f"intersection:{intersection_id}:phase": 0,
+                                    f"intersection:{intersection_id}:phase_end": new_end
                                 })
+                                continue
                             
-                            db.commit()
+                            # Phase Expired -> Transition to Next Phase
+                            await self._transition(redis, i, now)
+                        except Exception as e:
+                            watchdog.failed(intersection_id, e)
+                        else:
+                            watchdog.succeeded(intersection_id)
+
+                    # Safety audit of every intersection's state
+                    for i in light_store.audit():
+                        try:
+                            await self._fail_safe(redis, i)
+                        except Exception as e:
+                            watchdog.failed(light_store.intersection_id[i], e)
                     
-                    intersections = db.query(Intersection).all()
+                    # Clients whose schedule no longer holds get a new one
+                    if watchdog.level < SHED_BROADCASTS:
+                        self._publish_schedules()
+                    elif light_store.unscheduled:
+                        watchdog.shed["schedules"] += 1
                     
-                    for intersection in intersections:
-                        # Get current phase from Redis (default to 0)
-                        phase_key = f"intersection:{intersection.id}:phase"
-                        phase_str = await redis.get(phase_key)
-                        current_phase = int(phase_str) if phase_str else 0
-                        
-                        # Get end time of current phase
-                        phase_end_key = f"intersection:{intersection.id}:phase_end"
-                        phase_end_str = await redis.get(phase_end_key)
-                        
-                        # Initialize if missing
-                        if not phase_end_str:
-                            # Default to Phase 0 (N/S Green)
-                            current_phase = 0
-                            # Find N/S duration
-                            ns_light = db.query(TrafficLight).filter(
-                                TrafficLight.intersection_id == intersection.id,
-                                TrafficLight.direction == "North"
-                            ).first()
-                            duration = ns_light.duration if ns_light else 60
-                            
-                            new_end = (datetime.now(timezone.utc) + timedelta(seconds=duration)).timestamp()
-                            await redis.set(phase_key, 0)
-                            await redis.set(phase_end_key, new_end)
-                            continue
-                            
-                        # Check if phase expired
-                        if datetime.now(timezone.utc).timestamp() < float(phase_end_str):
-                            continue
-                            
-                        # Phase Expired -> Transition to Next Phase
-                        # Phase Expired -> Transition to Next Phase
-                        if current_phase == 1:
-                            next_phase = 3
-                        elif current_phase == 4:
-                            next_phase = 0
-                        else:
-                            next_phase = (current_phase + 1) % 6
-                        # print(f"Intersection {intersection.id}: Phase {current_phase} -> {next_phase}")
-                        
-                        lights = db.query(TrafficLight).filter(
-                            TrafficLight.intersection_id == intersection.id,
-                            TrafficLight.is_manual == False
-                        ).all()
-                        lights_dict = {l.direction: l for l in lights}
-                        ns_lights = [lights_dict.get("North"), lights_dict.get("South")]
-                        ew_lights = [lights_dict.get("East"), lights_dict.get("West")]
-                        
-                        updates = []
-                        next_duration = 2 # Default safety
-                        
-                        def set_lights(light_list, status):
-                            for l in light_list:
-                                if l:
-                                    l.status = status
-                                    l.last_updated = datetime.now(timezone.utc)
-                                    updates.append((l.id, status))
+                    # Persist the lights changed this tick in one round trip
+                    if watchdog.should_persist():
+                        try:
+                            light_store.flush(db)
+                        except Exception:
+                            # The changed lights stay dirty and are written on a later tick
+                            db.rollback()
+                            logger.exception("Persisting light states failed")
+                        if time.monotonic() - last_snapshot >= settings.SNAPSHOT_INTERVAL:
+                            last_snapshot = time.monotonic()
+                            save_snapshot(light_store)
+                    
+                    # Every change of this tick goes out in a single frame
+                    try:
+                        sent = await frame_coalescer.flush(min_interval=watchdog.broadcast_interval())
+                        if not sent and frame_coalescer.pending and watchdog.level >= SHED_BROADCASTS:
+                            watchdog.shed["broadcasts"] += 1
+                    except Exception:
+                        logger.exception("Broadcast error")
 
-                        # Logic for Next Phase
-                        if next_phase == 0: # N/S GREEN
-                            set_lights(ns_lights, "GREEN")
-                            set_lights(ew_lights, "RED")
-                            # Get duration from DB
-                            l = ns_lights[0]
-                            next_duration = l.duration if l else 60
-                            
-                        elif next_phase == 1: # N/S YELLOW
-                            set_lights(ns_lights, "YELLOW")
-                            set_lights(ew_lights, "RED")
-                            next_duration = 4
-                            
-                        elif next_phase == 3: # E/W GREEN
-                            set_lights(ns_lights, "RED")
-                            set_lights(ew_lights, "GREEN")
-                            l = ew_lights[0]
-                            next_duration = l.duration if l else 60
-                            
-                        elif next_phase == 4: # E/W YELLOW
-                            set_lights(ns_lights, "RED")
-                            set_lights(ew_lights, "YELLOW")
-                            next_duration = 4
-                        
-                        # Commit DB
-                        db.commit()
-                        
-                        # Update Redis Phase
-                        new_end_time = (datetime.now(timezone.utc) + timedelta(seconds=next_duration)).timestamp()
-                        await redis.set(phase_key, next_phase)
-                        await redis.set(phase_end_key, new_end_time)
-                        
-                        # Broadcast Updates
-                        batch_updates = []
-                        
-                        # Helper to get duration
-                        def get_duration(dir_code):
-                            # dir_code: 'ns' or 'ew'
-                            if dir_code == 'ns':
-                                l = ns_lights[0]
-                                return l.duration if l else 60
-                            else:
-                                l = ew_lights[0]
-                                return l.duration if l else 60
+                backoff = 0
+                watchdog.end()
+            except Exception:
+                backoff = watchdog.tick_failed()
+                logger.exception("Error in traffic cycle, retrying in %ss", backoff)
 
-                        ns_dur = get_duration('ns')
-                        ew_dur = get_duration('ew')
-                        
-                        for light_id, status in updates:
-                            # Determine direction of this light
-                            light_dir = None
-                            for l in lights:
-                                if l.id == light_id:
-                                    light_dir = l.direction
-                                    break
-                            
-                            # Calculate specific end_time
-                            # Default to current phase end
-                            calculated_end_time = new_end_time
-                            
-                            if status == "RED":
-                                # Calculate time until GREEN
-                                remaining_seconds = 0
-                                
-                                if light_dir in ["North", "South"]:
-                                    # Waiting for N/S Green (Phase 0)
-                                    if next_phase == 3: # E/W Green
-                                        remaining_seconds = ew_dur + 4
-                                    elif next_phase == 4: # E/W Yellow
-                                        remaining_seconds = 4
-                                        
-                                elif light_dir in ["East", "West"]:
-                                    # Waiting for E/W Green (Phase 3)
-                                    if next_phase == 0: # N/S Green
-                                        remaining_seconds = ns_dur + 4
-                                    elif next_phase == 1: # N/S Yellow
-                                        remaining_seconds = 4
-                                
-                                if remaining_seconds > 0:
-                                    calculated_end_time = (datetime.now(timezone.utc) + timedelta(seconds=remaining_seconds)).timestamp()
+    async def _expire_manual(self, redis, now: float):
+        """Return lights whose manual override has run out to their plan's current phase."""
+        store = light_store
+        for li in [li for li in store.manual_lights if store.manual_until[li] < now]:
+            i = store.light_intersection[li]
+            try:
+                await self._expire_light(redis, li, i, now)
+            except Exception as e:
+                tick_watchdog.failed(store.intersection_id[i], e)
 
-                            # Update individual light keys for UI compatibility
-                            # Note: We store the calculated end time in Redis so new clients get the correct countdown
-                            await redis.set(f"traffic_light:{light_id}:status", status)
-                            await redis.set(f"traffic_light:{light_id}:end_time", calculated_end_time)
-                            
-                            batch_updates.append({
-                                "light_id": light_id,
-                                "state": {
-                                    "status": status,
-                                    "end_time": calculated_end_time
-                                }
-                            })
-                            
-                        if batch_updates:
-                            try:
-                                from app.api.v1.endpoints.websocket import broadcast_batch_update
-                                await broadcast_batch_update(batch_updates)
-                            except Exception as e:
-                                print(f"Broadcast error: {e}")
+    async def _expire_light(self, redis, li: int, i: int, now: float):
+        """Return one light (`li` of intersection `i`) from its expired override to the current phase."""
+        from app.api.v1.endpoints.websocket import frame_coalescer
 
-            except Exception as e:
-                print(f"Error in traffic cycle: {e}")
-                await asyncio.sleep(5)
+        store = light_store
+        # Revert to Auto
+        store.set_manual(li, False)
+        
+        # Sync to current intersection phase immediately
+        if not store.phase_end[i]:
+            return
+        plan = store.plan_of(i)
+        phase = store.phase[i]
+        phase_end = store.phase_end[i]
+        movement = store.movement[li]
+        
+        # Determine correct status based on phase
+        if movement >= 0:
+            code = plan.status[phase][movement]
+            end_time = plan.end_time(phase, movement, store.durations(i), phase_end)
+            # Stay RED while a conflicting override is still active
+            others = store.active[i] & ~(1 << movement)
+            if not plan.is_safe(others | (1 << movement if code != RED else 0)):
+                code = RED
+        else:
+            code = RED
+            end_time = phase_end
+        store.set_status(li, code)
+        
+        # Update Redis & stage for this tick's frame
+        light_id = store.light_id[li]
+        journal.record(store.intersection_id[i], light_id, code, end_time, EXPIRY, now)
+        await redis.mset({
+            f"traffic_light:{light_id}:status": STATUS_NAMES[code],
+            f"traffic_light:{light_id}:end_time": end_time
+        })
+        frame_coalescer.stage(light_id, {
+            "status": STATUS_NAMES[code],
+            "end_time": end_time
+        })
+
+    async def _transition(self, redis, i: int, now: float):
+        """Move intersection `i` to the next phase of its plan."""
+        from app.api.v1.endpoints.websocket import frame_coalescer
+
+        store = light_store
+        intersection_id = store.intersection_id[i]
+        plan = store.plan_of(i)
+        durations = store.durations(i)
+        next_phase = plan.next_phase[store.phase[i]]
+        statuses = plan.status[next_phase]
+        start = phase_start(store.phase_end[i], now)
+        # A new cycle is stretched or shortened toward the intersection's green wave offset
+        adjustment = green_wave.adjustment(intersection_id, start, durations) if next_phase == 0 else 0.0
+        new_end_time = start + durations[next_phase] + adjustment
+        
+        # Clients already project this transition from the published schedule
+        projected = start == store.phase_end[i] and new_end_time <= store.schedule_horizon[i] and not adjustment
+        
+        # Manual overrides still running hold their conflicting movements RED
+        auto = []
+        held = 0
+        for li in store.lights_of(i):
+            movement = store.movement[li]
+            if movement < 0:
+                continue
+            if store.manual[li]:
+                if store.status[li] != RED:
+                    held |= plan.conflict_mask[movement]
+                continue
+            auto.append(li)
+        
+        redis_state = {
+            f"intersection:{intersection_id}:phase": next_phase,
+            f"intersection:{intersection_id}:phase_end": new_end_time
+        }
+        for li in auto:
+            movement = store.movement[li]
+            if held >> movement & 1:
+                code = RED
+                calculated_end_time = new_end_time
+            else:
+                code = statuses[movement]
+                # RED lights count down to their next GREEN
+                calculated_end_time = plan.end_time(next_phase, movement, durations, new_end_time)
+            store.set_status(li, code)
+            
+            # Update individual light keys for UI compatibility
+            # Note: We store the calculated end time in Redis so new clients get the correct countdown
+            light_id = store.light_id[li]
+            redis_state[f"traffic_light:{light_id}:status"] = STATUS_NAMES[code]
+            redis_state[f"traffic_light:{light_id}:end_time"] = calculated_end_time
+            journal.record(intersection_id, light_id, code, calculated_end_time, CYCLE, now)
+            if not projected:
+                frame_coalescer.stage(light_id, {
+                    "status": STATUS_NAMES[code],
+                    "end_time": calculated_end_time
+                })
+        
+        store.phase[i] = next_phase
+        store.phase_end[i] = new_end_time
+        if not projected:
+            store.invalidate_schedule(i)
+        await redis.mset(redis_state)
+
+    def _publish_schedules(self):
+        """Stage a fresh phase schedule for every intersection whose clients need one."""
+        from app.api.v1.endpoints.websocket import frame_coalescer
+
+        store = light_store
+        for i in list(store.unscheduled):
+            if not is_schedulable(store, i):
+                continue
+            schedule = build_schedule(store, i)
+            store.schedule_horizon[i] = schedule["until"]
+            store.unscheduled.discard(i)
+            frame_coalescer.stage_schedule(schedule)
+
+    async def _fail_safe(self, redis, i: int):
+        """Force an intersection found in a conflicting state to all RED and restart its plan."""
+        from app.api.v1.endpoints.websocket import frame_coalescer
+
+        store = light_store
+        intersection_id = store.intersection_id[i]
+        logger.warning(
+            "SAFETY: Conflicting state at intersection %s, forcing all RED", intersection_id,
+            extra={"intersection_id": intersection_id}
+        )
+        now = datetime.now(timezone.utc).timestamp()
+
+        # Restart from the first phase on the next tick
+        store.phase[i] = store.plan_of(i).phase_count - 1
+        store.phase_end[i] = now
+        redis_state = {
+            f"intersection:{intersection_id}:phase": store.phase[i],
+            f"intersection:{intersection_id}:phase_end": now
+        }
+
+        for li in store.lights_of(i):
+            store.set_manual(li, False)
+            store.set_status(li, RED)
+            light_id = store.light_id[li]
+            journal.record(intersection_id, light_id, RED, now, SAFETY, now)
+            redis_state[f"traffic_light:{light_id}:status"] = "RED"
+            redis_state[f"traffic_light:{light_id}:end_time"] = now
+            frame_coalescer.stage(light_id, {
+                "status": "RED",
+                "end_time": now
+            })
+        await redis.mset(redis_state)
 
     async def _set_light_state(self, light, status, duration, redis):
         # Deprecated, logic moved to run_cycle
@@ -0,0 +1,145 @@
+"""
+Controller tick watchdog.
+
+Measures each tick of the controller loop and how late the event loop woke
+it (lag: the tick sleeps one second, any extra is time the loop was busy
+elsewhere). When either goes over its budget (TICK_BUDGET, LOOP_LAG_BUDGET)
+the shedding level rises by one per tick, and it falls back by one per tick
+spent under half the budgets:
+
+    1  DB persistence and snapshots are deferred (at most PERSIST_MAX_DEFER
+       seconds); changed lights accumulate and are written once
+    2  also, broadcasts go out at most every SHED_BROADCAST_INTERVAL seconds
+       (latest state per light wins) and schedules are not published
+    3  also, phase transitions stop once the tick budget is spent, most
+       overdue first; the rest run on the next tick, holding their current
+       (safe) phase a little longer
+
+The safety audit and manual override expiry are never shed.
+
+Errors are also isolated per intersection: one that fails is skipped for
+1, 2, 4... up to ISOLATION_MAX_BACKOFF seconds while the others keep cycling.
+"""
+import logging
+import time
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+NORMAL, DEFER_PERSISTENCE, SHED_BROADCASTS, SHED_TRANSITIONS = range(4)
+LEVEL_NAMES = ("normal", "defer_persistence", "shed_broadcasts", "shed_transitions")
+MAX_TICK_BACKOFF = 5  # Seconds, when a whole tick fails (e.g. Redis is down)
+
+class TickWatchdog:
+    def __init__(self, tick_budget: float = None, lag_budget: float = None):
+        self.tick_budget = tick_budget or settings.TICK_BUDGET
+        self.lag_budget = lag_budget or settings.LOOP_LAG_BUDGET
+        self.level = NORMAL
+        self.tick_started = 0.0
+        self.last_tick = 0.0
+        self.max_tick = 0.0
+        self.last_lag = 0.0
+        self.max_lag = 0.0
+        self.ticks = 0
+        self.overloaded_ticks = 0
+        self.last_persist = time.monotonic()
+        self.shed = {"persistence": 0, "broadcasts": 0, "schedules": 0, "transitions": 0}
+
+        self.tick_failures = 0  # Consecutive ticks that failed as a whole
+        self.failures = {}  # intersection_id -> consecutive failures
+        self.skip_until = {}  # intersection_id -> monotonic time it is retried at
+        self.errors = 0
+
+    # Tick measurement
+
+    def begin(self, slept_since: float, interval: float):
+        """Start a tick that began sleeping `interval` seconds at `slept_since`."""
+        self.tick_started = time.monotonic()
+        self.last_lag = max(0.0, self.tick_started - slept_since - interval)
+        self.max_lag = max(self.max_lag, self.last_lag)
+
+    def end(self):
+        """Finish a tick and pick the shedding level for the next one."""
+        self.last_tick = time.monotonic() - self.tick_started
+        self.max_tick = max(self.max_tick, self.last_tick)
+        self.ticks += 1
+        self.tick_failures = 0
+        load = max(self.last_tick / self.tick_budget, self.last_lag / self.lag_budget)
+        previous = self.level
+        if load > 1:
+            self.overloaded_ticks += 1
+            self.level = min(SHED_TRANSITIONS, self.level + 1)
+        elif load < 0.5:
+            self.level = max(NORMAL, self.level - 1)
+        if self.level > previous:
+            logger.warning(
+                "Controller overloaded (tick %.0f ms, loop lag %.0f ms): shedding level %s",
+                self.last_tick * 1000, self.last_lag * 1000, LEVEL_NAMES[self.level]
+            )
+        elif self.level < previous:
+            logger.info("Controller load easing: shedding level %s", LEVEL_NAMES[self.level])
+
+    def over_budget(self) -> bool:
+        """The current tick has used up its budget (transitions are shed from here on)."""
+        return self.level >= SHED_TRANSITIONS and time.monotonic() - self.tick_started > self.tick_budget
+
+    def should_persist(self) -> bool:
+        if self.level >= DEFER_PERSISTENCE and time.monotonic() - self.last_persist < settings.PERSIST_MAX_DEFER:
+            self.shed["persistence"] += 1
+            return False
+        self.last_persist = time.monotonic()
+        return True
+
+    def broadcast_interval(self) -> float:
+        """Minimum seconds between broadcast frames at the current level."""
+        return settings.SHED_BROADCAST_INTERVAL if self.level >= SHED_BROADCASTS else settings.BROADCAST_MIN_INTERVAL
+
+    def tick_failed(self) -> float:
+        """Record a tick that failed as a whole; returns seconds to back off before the next one."""
+        self.tick_failures += 1
+        self.errors += 1
+        return min(MAX_TICK_BACKOFF, 2 ** (self.tick_failures - 1))
+
+    # Per-intersection isolation
+
+    def skipped(self, intersection_id: int) -> bool:
+        until = self.skip_until.get(intersection_id)
+        return until is not None and time.monotonic() < until
+
+    def failed(self, intersection_id: int, error: Exception):
+        failures = self.failures.get(intersection_id, 0) + 1
+        self.failures[intersection_id] = failures
+        self.errors += 1
+        backoff = min(settings.ISOLATION_MAX_BACKOFF, 2 ** (failures - 1))
+        self.skip_until[intersection_id] = time.monotonic() + backoff
+        logger.error(
+            "Intersection %s failed (%s in a row), skipped for %ss: %r", intersection_id, failures, backoff, error,
+            exc_info=error, extra={"intersection_id": intersection_id}
+        )
+
+    def succeeded(self, intersection_id: int):
+        if intersection_id in self.failures:
+            del self.failures[intersection_id]
+            self.skip_until.pop(intersection_id, None)
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        return {
+            "level": LEVEL_NAMES[self.level],
+            "tick_budget_ms": self.tick_budget * 1000,
+            "lag_budget_ms": self.lag_budget * 1000,
+            "last_tick_ms": round(self.last_tick * 1000, 2),
+            "max_tick_ms": round(self.max_tick * 1000, 2),
+            "last_lag_ms": round(self.last_lag * 1000, 2),
+            "max_lag_ms": round(self.max_lag * 1000, 2),
+            "ticks": self.ticks,
+            "overloaded_ticks": self.overloaded_ticks,
+            "shed": dict(self.shed),
+            "errors": self.errors,
+            "isolated": {
+                intersection_id: round(until - now, 1)
+                for intersection_id, until in self.skip_until.items() if until > now
+            }
+        }
+
+tick_watchdog = TickWatchdog()
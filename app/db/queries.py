@@ -0,0 +1,83 @@
+"""
+Hot statements, built once at import.
+
+For one-light and one-intersection lookups, building a Query costs more than
+running it. A prebuilt statement with bound parameters skips that step and
+goes straight to SQLAlchemy's compiled cache and the driver's prepared
+statements.
+
+HOT_QUERIES lists these statements and the shapes of the other frequent
+queries, with sample parameters. scripts/check_query_plans.py verifies that
+each of them is served by an index rather than a full table scan.
+"""
+from sqlalchemy import bindparam, delete, func, select, update
+from app.models.analytics import TrafficRollup
+from app.models.city import TrafficArea
+from app.models.intersection import Intersection
+from app.models.traffic import TrafficLight
+
+LIGHTS_OF_INTERSECTION = select(TrafficLight).where(TrafficLight.intersection_id == bindparam("intersection_id"))
+
+def lights_of(db, intersection_id: int) -> list:
+    """Every light of an intersection, as ORM objects."""
+    return db.scalars(LIGHTS_OF_INTERSECTION, {"intersection_id": intersection_id}).all()
+
+def light_by_id(db, light_id: int):
+    """One light by primary key (from the session's identity map when already loaded)."""
+    return db.get(TrafficLight, light_id)
+
+# name -> (statement, sample parameters)
+HOT_QUERIES = {
+    "light_by_id": (select(TrafficLight).where(TrafficLight.id == bindparam("id")), {"id": 1}),
+    "lights_of_intersection": (LIGHTS_OF_INTERSECTION, {"intersection_id": 1}),
+    "lights_of_intersection_page": (
+        select(TrafficLight.id).where(TrafficLight.intersection_id == bindparam("intersection_id"), TrafficLight.id > bindparam("after"))
+        .order_by(TrafficLight.id).limit(101),
+        {"intersection_id": 1, "after": 0}
+    ),
+    "light_flush": (
+        update(TrafficLight).where(TrafficLight.id == bindparam("light_id"))
+        .values(status=bindparam("status"), is_manual=bindparam("is_manual")),
+        {"light_id": 1, "status": "RED", "is_manual": False}
+    ),
+    "intersections_of_area_page": (
+        select(Intersection.id).where(Intersection.area_id == bindparam("area_id"), Intersection.id > bindparam("after"))
+        .order_by(Intersection.id).limit(101),
+        {"area_id": 1, "after": 0}
+    ),
+    "favorite_intersections_page": (
+        select(Intersection.id).where(Intersection.is_favorite == True).order_by(Intersection.id).limit(101),
+        {}
+    ),
+    "lights_of_area": (
+        select(TrafficLight.id).join(Intersection, TrafficLight.intersection_id == Intersection.id)
+        .where(Intersection.area_id == bindparam("area_id")).order_by(TrafficLight.id),
+        {"area_id": 1}
+    ),
+    "areas_of_city_page": (
+        select(TrafficArea.id).where(TrafficArea.city_id == bindparam("city_id"), TrafficArea.id > bindparam("after"))
+        .order_by(TrafficArea.id).limit(101),
+        {"city_id": 1, "after": 0}
+    ),
+    "rollup_series": (
+        select(TrafficRollup.bucket_start).where(
+            TrafficRollup.scope == bindparam("scope"), TrafficRollup.entity_id == bindparam("entity_id"),
+            TrafficRollup.granularity == bindparam("granularity"),
+            TrafficRollup.bucket_start >= bindparam("start"), TrafficRollup.bucket_start < bindparam("end")
+        ),
+        {"scope": "light", "entity_id": 1, "granularity": 60, "start": 0, "end": 2 ** 31}
+    ),
+    "rollup_summary": (
+        select(TrafficRollup.entity_id, func.sum(TrafficRollup.transitions)).where(
+            TrafficRollup.scope == bindparam("scope"), TrafficRollup.granularity == bindparam("granularity"),
+            TrafficRollup.bucket_start >= bindparam("start"), TrafficRollup.bucket_start < bindparam("end")
+        ).group_by(TrafficRollup.entity_id),
+        {"scope": "area", "granularity": 3600, "start": 0, "end": 2 ** 31}
+    ),
+    "rollup_retention": (
+        delete(TrafficRollup).where(
+            TrafficRollup.granularity == bindparam("granularity"), TrafficRollup.bucket_start < bindparam("before")
+        ),
+        {"granularity": 60, "before": 0}
+    )
+}
@@ -0,0 +1,87 @@
+"""
+Schema versioning.
+
+The schema version is stored in SQLite's PRAGMA user_version. When it matches
+SCHEMA_VERSION, startup skips reflecting and creating tables altogether.
+"""
+from sqlalchemy import text
+from app.db.base import Base
+
+# Bump whenever the models change; changes to existing tables also need a migration
+SCHEMA_VERSION = 4
+
+def _is_sqlite(engine) -> bool:
+    return engine.dialect.name == "sqlite"
+
+def schema_version(engine) -> int:
+    if not _is_sqlite(engine):
+        return 0
+    with engine.connect() as connection:
+        return connection.execute(text("PRAGMA user_version")).scalar()
+
+def _stamp(engine):
+    if _is_sqlite(engine):
+        with engine.begin() as connection:
+            connection.execute(text(f"PRAGMA user_version = {SCHEMA_VERSION}"))
+
+def _columns(connection, table: str) -> set:
+    return {row[1] for row in connection.execute(text(f"PRAGMA table_info({table})"))}
+
+def _add_coordinates(connection):
+    """v3: intersection latitude/longitude, filled in from "lat, lon" locations."""
+    from app.core.spatial import parse_location
+
+    columns = _columns(connection, "intersections")
+    for name in ("latitude", "longitude"):
+        if name not in columns:
+            connection.execute(text(f"ALTER TABLE intersections ADD COLUMN {name} FLOAT"))
+    rows = connection.execute(text("SELECT id, location FROM intersections WHERE latitude IS NULL")).all()
+    coordinates = []
+    for intersection_id, location in rows:
+        point = parse_location(location)
+        if point:
+            coordinates.append({"id": intersection_id, "latitude": point[0], "longitude": point[1]})
+    if coordinates:
+        connection.execute(
+            text("UPDATE intersections SET latitude = :latitude, longitude = :longitude WHERE id = :id"),
+            coordinates
+        )
+
+def _add_indexes(connection):
+    """v4: the models' indexes for the hot query shapes (see app/db/queries.py), then planner statistics."""
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(connection, checkfirst=True)
+    connection.execute(text("ANALYZE"))
+
+# Version -> migration bringing existing tables up to it. Each one must be
+# safe to run on tables create_all just made.
+MIGRATIONS = {3: _add_coordinates, 4: _add_indexes}
+
+def _register_models():
+    """Make sure every model is registered on the metadata."""
+    import app.models.analytics, app.models.city, app.models.intersection, app.models.traffic  # noqa: F401
+
+def create_schema(engine):
+    """Create any missing tables, migrate existing ones and record the current schema version."""
+    _register_models()
+    previous = schema_version(engine)
+    Base.metadata.create_all(bind=engine)
+    if _is_sqlite(engine):
+        with engine.begin() as connection:
+            for version in sorted(MIGRATIONS):
+                if previous < version:
+                    MIGRATIONS[version](connection)
+    _stamp(engine)
+
+def drop_schema(engine):
+    """Drop every table, including those of models nothing else imported yet."""
+    _register_models()
+    Base.metadata.drop_all(bind=engine)
+
+def ensure_schema(engine) -> bool:
+    """Create the schema unless it is already at SCHEMA_VERSION. Returns True if work was done."""
+    if schema_version(engine) == SCHEMA_VERSION:
+        return False
+    create_schema(engine)
+    return True
@@ -0,0 +1,79 @@
+"""
+SQLite storage profile.
+
+SQLITE_PROFILE picks the pragmas every new connection runs:
+
+- "default" keeps SQLite's defaults: a rollback journal, where the
+  controller's writes block the API's reads and the other way round;
+- "wal" switches to write-ahead logging, so readers and the writer no longer
+  block each other. It also sets synchronous=NORMAL (a power cut may lose the
+  last transactions but cannot corrupt the file), a busy timeout instead of
+  immediate "database is locked" errors, a larger page cache, in-memory temp
+  tables and memory-mapped reads.
+
+SQL_STATEMENT_CACHE sizes both statement caches: SQLAlchemy's cache of
+compiled SQL and the sqlite3 driver's prepared statements per connection.
+The hot statements themselves are built once, in app.db.queries.
+"""
+from sqlalchemy import event, text
+from app.core.config import settings
+
+PROFILES = {
+    "default": {},
+    "wal": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "busy_timeout": 5000,
+        "cache_size": -64 * 1024,  # KiB
+        "temp_store": "MEMORY",
+        "mmap_size": 256 * 1024 * 1024
+    }
+}
+
+def engine_options(url: str) -> dict:
+    """Keyword arguments for create_engine."""
+    options = {"query_cache_size": settings.SQL_STATEMENT_CACHE}
+    if url.startswith("sqlite"):
+        options["connect_args"] = {"check_same_thread": False, "cached_statements": settings.SQL_STATEMENT_CACHE}
+    return options
+
+def configure(engine, profile: str = None):
+    """Run the profile's pragmas on each new connection of `engine`."""
+    if engine.dialect.name != "sqlite":
+        return
+    pragmas = PROFILES[profile or settings.SQLITE_PROFILE]
+    if not pragmas:
+        return
+
+    @event.listens_for(engine, "connect")
+    def _apply(dbapi_connection, _):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name} = {value}")
+        cursor.close()
+
+def optimize(engine):
+    """Refresh the planner statistics that need it (cheap; run at shutdown)."""
+    if engine.dialect.name == "sqlite":
+        with engine.connect() as connection:
+            connection.execute(text("PRAGMA optimize"))
+
+def storage_stats(engine) -> dict:
+    if engine.dialect.name != "sqlite":
+        return {"dialect": engine.dialect.name}
+    with engine.connect() as connection:
+        pragma = lambda name: connection.execute(text(f"PRAGMA {name}")).scalar()
+        return {
+            "profile": settings.SQLITE_PROFILE,
+            "journal_mode": pragma("journal_mode"),
+            "synchronous": pragma("synchronous"),
+            "busy_timeout": pragma("busy_timeout"),
+            "cache_size": pragma("cache_size"),
+            "page_count": pragma("page_count"),
+            "page_size": pragma("page_size"),
+            "schema_version": pragma("user_version"),
+            "statement_cache": settings.SQL_STATEMENT_CACHE,
+            "indexes": sorted(connection.execute(
+                text("SELECT name FROM sqlite_master WHERE type = 'index' AND name NOT LIKE 'sqlite_%'")
+            ).scalars())
+        }
@@ -1,17 +1,22 @@
+from app.core.startup import startup_report
 from fastapi import FastAPI
 from app.core.config import settings
+from app.core.log import log_setup
+# Before the other app imports, some of which log
+log_setup.start()
 from app.api.v1.api import api_router
-from app.db.base import Base
 from app.db.session import engine, SessionLocal
+from app.db.schema import ensure_schema
+import logging
 import os
 from fastapi.staticfiles import StaticFiles
+from app.core.assets import AssetFiles, assets
 from app.models.city import City, TrafficArea
 from app.models.intersection import Intersection
 from app.models.traffic import TrafficLight
 from fastapi.responses import RedirectResponse
 
-# Create tables
-Base.metadata.create_all(bind=engine)
+logger = logging.getLogger(__name__)
 
 app = FastAPI(
     title=settings.PROJECT_NAME,
@@ -20,56 +25,41 @@ app = FastAPI(
 
 static_dir = os.path.join(os.path.dirname(__file__), "static")
 app.mount("/static", StaticFiles(directory=static_dir), name="static")
+# Hashed, precompressed copies of the static files (built at startup)
+app.mount("/assets", AssetFiles(directory=settings.ASSETS_DIRECTORY, check_dir=False), name="assets")
 
 app.include_router(api_router, prefix=settings.API_V1_STR)
 
 def seed_data():
-    db = SessionLocal()
-    if not db.query(City).first():
-        # Create City
-        city = City(name="Metropolis", code="MET")
-        db.add(city)
-        db.commit()
-        db.refresh(city)
-
-        # Create Areas
-        downtown = TrafficArea(name="Downtown", code="DT", city_id=city.id)
-        uptown = TrafficArea(name="Uptown", code="UP", city_id=city.id)
-        db.add_all([downtown, uptown])
-        db.commit()
-        db.refresh(downtown)
-        db.refresh(uptown)
-
-        # Create Intersections
-        intersections_data = [
-            {"name": "Main St & 1st Ave", "code": "INT-001", "area_id": downtown.id, "location": "Downtown Core"},
-            {"name": "Broadway & 5th", "code": "INT-002", "area_id": downtown.id, "location": "Financial District"},
-            {"name": "Park Ave & 59th", "code": "INT-003", "area_id": uptown.id, "location": "Residential Zone"},
-        ]
+    # Small deterministic demo city on first start; see reset_system.py for larger ones
+    from app.core.city_generator import generate_city
 
-        for i_data in intersections_data:
-            intersection = Intersection(**i_data)
-            db.add(intersection)
-            db.commit()
-            db.refresh(intersection)
-            
-            # Create lights
-            directions = ["North", "South", "East", "West"]
-            for direction in directions:
-                light = TrafficLight(
-                    intersection_id=intersection.id,
-                    direction=direction,
-                    status="RED" if direction in ["East", "West"] else "GREEN",
-                    duration=60
-                )
-                db.add(light)
-            db.commit()
-    db.close()
+    db = SessionLocal()
+    try:
+        if not db.query(City).first():
+            generate_city(db)
+    finally:
+        db.close()
 
 @app.on_event("startup")
 async def startup_event():
+    startup_report.mark("imports")
+    
+    # Tables are only (re)created when the schema version changed
+    created = ensure_schema(engine)
+    startup_report.mark("schema", schema_created=created)
+    
     # Seed data
     seed_data()
+    startup_report.mark("seed")
+
+    # Only rebuilt when app/static changed
+    try:
+        built = assets.build()
+    except OSError as e:
+        logger.warning("⚠️ Assets not built, serving /static as is: %s", e)
+        built = {"built": False, "assets": 0}
+    startup_report.mark("assets", assets_built=built["built"])
     
     # Start background task
     import asyncio
@@ -81,7 +71,33 @@ async def startup_event():
     # Create a persistent session for the background task
     db = SessionLocal()
     controller = TrafficController(db)
+    # State changes are journaled from the first tick on, and rolled up for analytics
+    from app.core.analytics import analytics
+    from app.core.journal import journal
+    journal.subscribe(analytics.consume)
+    journal.start()
+    analytics.start()
     loop.create_task(controller.run_cycle())
+    startup_report.serving()
+
+@app.on_event("shutdown")
+def shutdown_event():
+    # Let the next start resume every cycle where it stopped
+    from app.core.light_store import light_store
+    from app.core.analytics import analytics
+    from app.core.journal import journal
+    from app.core.green_wave import green_wave
+    from app.core.snapshot import save_snapshot, snapshot_writer
+    from app.db.storage import optimize
+
+    if light_store.loaded:
+        save_snapshot(light_store)
+    snapshot_writer.close()
+    journal.close()
+    analytics.close()
+    green_wave.close()
+    optimize(engine)
+    log_setup.stop()
 
 @app.get("/")
 def root():
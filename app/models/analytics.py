@@ -0,0 +1,18 @@
+from sqlalchemy import Column, Float, Index, Integer, String
+from app.db.base import Base
+
+class TrafficRollup(Base):
+    """Traffic totals of one light, intersection or area over one time bucket."""
+    __tablename__ = "traffic_rollups"
+    # Summaries across entities and retention deletes filter on these, not the entity
+    __table_args__ = (Index("ix_traffic_rollups_granularity_bucket", "granularity", "bucket_start"),)
+
+    scope = Column(String, primary_key=True)  # light, intersection, area
+    entity_id = Column(Integer, primary_key=True)
+    granularity = Column(Integer, primary_key=True)  # Bucket length in seconds
+    bucket_start = Column(Integer, primary_key=True)  # Unix seconds
+    density_sum = Column(Float, default=0.0)
+    density_samples = Column(Integer, default=0)
+    green_seconds = Column(Float, default=0.0)
+    overrides = Column(Integer, default=0)
+    transitions = Column(Integer, default=0)
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, ForeignKey
+from sqlalchemy import Column, Integer, String, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from app.db.base import Base
 
@@ -13,6 +13,7 @@ class City(Base):
 
 class TrafficArea(Base):
     __tablename__ = "traffic_areas"
+    __table_args__ = (Index("ix_traffic_areas_city", "city_id", "id"),)
 
     id = Column(Integer, primary_key=True, index=True)
     city_id = Column(Integer, ForeignKey("cities.id"))
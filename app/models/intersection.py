@@ -1,15 +1,21 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, Boolean
+from sqlalchemy import Column, Integer, String, ForeignKey, Boolean, Float, Index
 from sqlalchemy.orm import relationship
 from app.db.base import Base
 
 class Intersection(Base):
     __tablename__ = "intersections"
+    __table_args__ = (
+        Index("ix_intersections_area", "area_id", "id"),
+        Index("ix_intersections_favorite", "is_favorite", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     area_id = Column(Integer, ForeignKey("traffic_areas.id"))
     name = Column(String, index=True)
     code = Column(String, unique=True, index=True)
     location = Column(String)
+    latitude = Column(Float, nullable=True)
+    longitude = Column(Float, nullable=True)
     is_favorite = Column(Boolean, default=False)
     
     area = relationship("TrafficArea", back_populates="intersections")
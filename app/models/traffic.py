@@ -1,10 +1,14 @@
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, Index
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 from app.db.base import Base
 
 class TrafficLight(Base):
     __tablename__ = "traffic_lights"
+    __table_args__ = (
+        # Lights of one intersection, in id order (controller, preemption, keyset pages)
+        Index("ix_traffic_lights_intersection", "intersection_id", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     intersection_id = Column(Integer, ForeignKey("intersections.id"))
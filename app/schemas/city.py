@@ -15,6 +15,12 @@ class CityUpdate(BaseModel):
     name: Optional[str] = None
     code: Optional[str] = None
 
+class CitySummary(CityBase):
+    id: int
+
+    class Config:
+        from_attributes = True
+
 class CityResponse(CityBase):
     id: int
     areas: List['AreaResponse'] = []
@@ -1,14 +1,34 @@
-from pydantic import BaseModel
-from typing import List
-from app.schemas.traffic import TrafficLightResponse
+from pydantic import BaseModel, Field, AliasPath
+from typing import List, Optional
+from app.schemas.traffic import TrafficLightNode, TrafficLightResponse
+
+class IntersectionResponse(BaseModel):
+    id: int
+    area_id: int
+    name: str
+    code: str
+    location: str
+    latitude: Optional[float] = None
+    longitude: Optional[float] = None
+    is_favorite: bool = False
+
+    class Config:
+        from_attributes = True
 
 class IntersectionResponseNested(BaseModel):
     id: int
     name: str
     code: str
     location: str
+    latitude: Optional[float] = None
+    longitude: Optional[float] = None
     is_favorite: bool = False
     traffic_lights: List[TrafficLightResponse] = []
 
     class Config:
         from_attributes = True
+
+class IntersectionTreeNode(IntersectionResponseNested):
+    area_id: int
+    traffic_lights: List[TrafficLightNode] = []
+    area_name: str = Field(validation_alias=AliasPath("area", "name"))
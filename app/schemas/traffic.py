@@ -21,6 +21,18 @@ class TrafficLightUpdate(BaseModel):
     is_manual: Optional[bool] = None
     is_active: Optional[bool] = None
 
+class TrafficLightNode(BaseModel):
+    """What a dashboard card needs of a light."""
+    id: int
+    intersection_id: int
+    direction: str
+    status: str = "RED"
+    duration: int = 60
+    is_manual: bool = False
+
+    class Config:
+        from_attributes = True
+
 class TrafficLightResponse(TrafficLightBase):
     id: int
     intersection_id: int
@@ -1,13 +1,16 @@
+import logging
 import os
 import redis.asyncio as redis
 from app.core.config import settings
 
+logger = logging.getLogger(__name__)
+
 class MockRedis:
     """A simple in-memory mock for Redis asyncio client."""
     _storage = {}
 
     def __init__(self):
-        print("⚠️ Using Mock (In-Memory) Redis")
+        logger.warning("⚠️ Using Mock (In-Memory) Redis")
 
     async def get(self, name):
         return self._storage.get(name)
@@ -16,6 +19,14 @@ class MockRedis:
         self._storage[name] = str(value)
         return True
 
+    async def mget(self, keys, *args):
+        return [self._storage.get(name) for name in list(keys) + list(args)]
+
+    async def mset(self, mapping):
+        for name, value in mapping.items():
+            self._storage[name] = str(value)
+        return True
+
     async def delete(self, *names):
         count = 0
         for name in names:
@@ -33,9 +44,13 @@ try:
     if os.environ.get("VERCEL") and "localhost" in settings.REDIS_URL:
         raise ConnectionError("Local Redis not available on Vercel")
     
-    redis_client = redis.from_url(settings.REDIS_URL, decode_responses=True)
+    if settings.REDIS_URL.startswith("memory://"):
+        # Explicitly in-memory (load tests, local runs without Redis)
+        redis_client = MockRedis()
+    else:
+        redis_client = redis.from_url(settings.REDIS_URL, decode_responses=True)
 except Exception as e:
-    print(f"❌ Redis connection failed: {e}")
+    logger.error("❌ Redis connection failed: %s", e)
     redis_client = MockRedis()
 
 async def get_redis():
@@ -2,23 +2,42 @@ import { state } from './config.js';
 import * as api from './api.js';
 import * as ui from './ui.js';
 
+// Intersections whose cards are on screen: only their lights are synced
+function visibleIntersectionIds() {
+    return Array.from(document.querySelectorAll('.intersection-card'), card => parseInt(card.id.split('-')[1]));
+}
+
 export async function syncState() {
+    const intersectionIds = visibleIntersectionIds();
+    if (!intersectionIds.length) return;
     try {
-        const data = await api.fetchSync();
+        const data = await api.fetchSync(intersectionIds);
         for (const [id, lightState] of Object.entries(data)) {
             ui.updateLightState(parseInt(id), lightState);
         }
+        
+        // Lights of intersections running their plan are projected locally
+        const { schedules } = await api.fetchSchedules(intersectionIds);
+        ui.applySchedules(schedules);
     } catch (e) {
         console.error("Sync failed", e);
     }
 }
 
 export async function loadCities() {
-    state.cities = await api.fetchCities();
+    // Only the city level is loaded up front; areas and intersections follow on demand
+    state.cities = await api.fetchAll(after => api.fetchTreeCities(after));
     ui.renderCityTree();
     ui.populateDropdowns();
 }
 
+async function loadAreas(city) {
+    if (!city.areas) {
+        city.areas = await api.fetchAll(after => api.fetchTreeAreas(city.id, after));
+    }
+    return city.areas;
+}
+
 export async function toggleCity(cityId) {
     const list = document.getElementById(`areas-${cityId}`);
     const toggle = document.getElementById(`toggle-${cityId}`);
@@ -28,8 +47,7 @@ export async function toggleCity(cityId) {
 
     if (!city.areas) {
         try {
-            const cityData = await api.fetchCityDetails(cityId);
-            city.areas = cityData.areas;
+            await loadAreas(city);
             ui.renderAreas(cityId);
         } catch (e) {
             console.error("Failed to load areas", e);
@@ -56,8 +74,9 @@ export async function selectArea(areaId, cityId) {
 
     if (!area.intersections) {
         try {
-            const areaData = await api.fetchAreaDetails(areaId);
-            area.intersections = areaData.intersections;
+            const page = await api.fetchTreeIntersections(areaId);
+            area.intersections = page.items;
+            area.nextCursor = page.next;
         } catch (e) {
             console.error("Failed to load intersections", e);
             return;
@@ -67,3 +86,46 @@ export async function selectArea(areaId, cityId) {
     ui.renderIntersections(area);
     syncState();
 }
+
+export async function openSearchResult(type, id, cityId, areaId) {
+    ui.renderSearchResults([]);
+    const list = document.getElementById(`areas-${cityId}`);
+    if (list && list.classList.contains('collapsed')) await toggleCity(cityId);
+    if (type === 'city') return;
+
+    await selectArea(type === 'area' ? id : areaId, cityId);
+    if (type === 'intersection') {
+        // Only on screen if it is on the area's first page
+        const card = document.getElementById(`intersection-${id}`);
+        if (card) card.scrollIntoView({ behavior: 'smooth', block: 'center' });
+    }
+}
+
+export async function loadMoreIntersections(areaId, cityId) {
+    const city = state.cities.find(c => c.id === cityId);
+    const area = city && city.areas && city.areas.find(a => a.id === areaId);
+    if (!area || area.nextCursor == null) return;
+    
+    try {
+        const page = await api.fetchTreeIntersections(areaId, area.nextCursor);
+        area.intersections = area.intersections.concat(page.items);
+        area.nextCursor = page.next;
+    } catch (e) {
+        console.error("Failed to load intersections", e);
+        return;
+    }
+    
+    if (state.selectedAreaId === areaId) ui.renderIntersections(area);
+    syncState();
+}
+
+export async function openIntersectionModal() {
+    // The area dropdown lists every area, so load the ones not expanded yet
+    try {
+        await Promise.all(state.cities.map(loadAreas));
+    } catch (e) {
+        console.error("Failed to load areas", e);
+    }
+    ui.populateDropdowns();
+    ui.openModal('intersectionModal');
+}
@@ -1,5 +1,14 @@
-export async function fetchSync() {
-    const response = await fetch('/api/v1/frontend/sync');
+function idsQuery(name, ids) {
+    return ids.map(id => `${name}=${encodeURIComponent(id)}`).join('&');
+}
+
+export async function fetchSync(intersectionIds) {
+    const response = await fetch(`/api/v1/frontend/sync?${idsQuery('intersection_ids', intersectionIds)}`);
+    return await response.json();
+}
+
+export async function fetchSchedules(intersectionIds) {
+    const response = await fetch(`/api/v1/frontend/schedules?${idsQuery('intersection_ids', intersectionIds)}`);
     return await response.json();
 }
 
@@ -8,6 +17,49 @@ export async function fetchCities() {
     return await response.json();
 }
 
+// Keyset-paginated tree: returns {items, next}, where `next` is the cursor
+// for the following page (null on the last one)
+async function fetchPage(url, after) {
+    const separator = url.includes('?') ? '&' : '?';
+    const response = await fetch(after == null ? url : `${url}${separator}after=${after}`);
+    return {
+        items: await response.json(),
+        next: response.headers.get('X-Next-Cursor')
+    };
+}
+
+export async function fetchAll(fetcher) {
+    let items = [];
+    let after = null;
+    do {
+        const page = await fetcher(after);
+        items = items.concat(page.items);
+        after = page.next;
+    } while (after != null);
+    return items;
+}
+
+export function fetchTreeCities(after = null) {
+    return fetchPage('/api/v1/tree/cities', after);
+}
+
+export function fetchTreeAreas(cityId, after = null) {
+    return fetchPage(`/api/v1/tree/cities/${cityId}/areas`, after);
+}
+
+export function fetchTreeIntersections(areaId, after = null) {
+    return fetchPage(`/api/v1/tree/areas/${areaId}/intersections`, after);
+}
+
+export function fetchFavorites(after = null) {
+    return fetchPage('/api/v1/tree/favorites', after);
+}
+
+export async function searchTopology(q, signal) {
+    const response = await fetch(`/api/v1/search/?q=${encodeURIComponent(q)}&fuzzy=true`, { signal });
+    return await response.json();
+}
+
 export async function fetchCityDetails(id) {
     const response = await fetch(`/api/v1/cities/${id}`);
     return await response.json();
@@ -18,6 +70,12 @@ export async function fetchAreaDetails(id) {
     return await response.json();
 }
 
+// Per-minute rollups of one light, intersection or area over the last hour
+export async function fetchAnalyticsSeries(scope, id) {
+    const response = await fetch(`/api/v1/analytics/${scope}/${id}?granularity=1m`);
+    return await response.json();
+}
+
 export async function createCity(data) {
     return await fetch('/api/v1/cities/', {
         method: 'POST',
@@ -2,6 +2,8 @@ export const state = {
     ws: null,
     cities: [],
     lightsState: {},
-    countdownIntervals: {},
+    schedules: {},
+    scheduleOfLight: {},
+    ticker: null,
     selectedAreaId: null
 };
@@ -1,8 +1,25 @@
 import * as api from './api.js';
 import { loadCities, syncState } from './actions.js';
-import { closeModal } from './ui.js';
+import { closeModal, renderSearchResults } from './ui.js';
 
 export function setupEventListeners() {
+    let pendingSearch = null;
+    document.getElementById('searchInput').addEventListener('input', async (e) => {
+        // Only the latest keystroke's results are shown
+        if (pendingSearch) pendingSearch.abort();
+        const q = e.target.value.trim();
+        if (!q) {
+            renderSearchResults([]);
+            return;
+        }
+        pendingSearch = new AbortController();
+        try {
+            renderSearchResults(await api.searchTopology(q, pendingSearch.signal));
+        } catch (err) {
+            if (err.name !== 'AbortError') console.error("Search failed", err);
+        }
+    });
+
     document.getElementById('cityForm').addEventListener('submit', async (e) => {
         e.preventDefault();
         const name = document.getElementById('cityName').value;
@@ -1,16 +1,19 @@
 import { initWebSocket } from './websocket.js';
-import { loadCities, toggleCity, selectArea, syncState } from './actions.js';
+import { loadCities, toggleCity, selectArea, loadMoreIntersections, openIntersectionModal, syncState, openSearchResult } from './actions.js';
 import { setupEventListeners } from './events.js';
 import { openModal, closeModal, openLightModal, renderFavoritesPage } from './ui.js';
 
 // Expose global functions for HTML onclick handlers
 window.toggleCity = toggleCity;
 window.selectArea = selectArea;
+window.loadMoreIntersections = loadMoreIntersections;
+window.openIntersectionModal = openIntersectionModal;
 window.openModal = openModal;
 window.closeModal = closeModal;
 window.openLightModal = openLightModal;
 window.syncState = syncState;
 window.renderFavoritesPage = renderFavoritesPage;
+window.openSearchResult = openSearchResult;
 
 document.addEventListener('DOMContentLoaded', async () => {
     console.log("DOM Content Loaded");
@@ -1,6 +1,6 @@
 import { state } from './config.js';
 import { generateBuildings, generateCarHtml } from './visuals.js';
-import { toggleFavorite, fetchCityDetails, fetchAreaDetails } from './api.js';
+import { toggleFavorite, fetchFavorites, fetchAnalyticsSeries } from './api.js';
 
 export function renderCityTree() {
     const tree = document.getElementById('cityTree');
@@ -48,6 +48,25 @@ export function renderAreas(cityId) {
     });
 }
 
+const SEARCH_ICONS = { city: '🏙️', area: '📍', intersection: '🚦' };
+
+export function renderSearchResults(results) {
+    const list = document.getElementById('searchResults');
+    list.innerHTML = '';
+    results.forEach(result => {
+        const cityId = result.type === 'city' ? result.id : result.city_id;
+        const item = document.createElement('div');
+        item.className = 'search-result';
+        item.onclick = () => window.openSearchResult(result.type, result.id, cityId, result.area_id);
+        const name = document.createElement('span');
+        name.textContent = `${SEARCH_ICONS[result.type]} ${result.name}`;
+        const code = document.createElement('small');
+        code.textContent = result.code;
+        item.append(name, code);
+        list.appendChild(item);
+    });
+}
+
 export function renderIntersections(area) {
     const grid = document.getElementById('intersectionsGrid');
     grid.innerHTML = '';
@@ -57,6 +76,24 @@ export function renderIntersections(area) {
     area.intersections.forEach(intersection => {
         grid.appendChild(createIntersectionCard(intersection, area));
     });
+    
+    if (area.nextCursor != null) {
+        grid.appendChild(createLoadMoreButton(() => window.loadMoreIntersections(area.id, area.city_id)));
+    }
+}
+
+function createLoadMoreButton(onClick) {
+    const wrapper = document.createElement('div');
+    wrapper.style.cssText = 'grid-column: 1/-1; text-align: center;';
+    const button = document.createElement('button');
+    button.className = 'btn btn-secondary';
+    button.textContent = 'Load more';
+    button.onclick = () => {
+        button.disabled = true;
+        onClick();
+    };
+    wrapper.appendChild(button);
+    return wrapper;
 }
 
 export function createIntersectionCard(intersection, area) {
@@ -127,7 +164,15 @@ export function createIntersectionCard(intersection, area) {
 }
 
 export function updateLightState(lightId, stateData) {
+    // An explicit update means the intersection left its published schedule
+    dropSchedule(lightId);
+    setLightState(lightId, stateData);
+}
+
+function setLightState(lightId, stateData) {
     state.lightsState[lightId] = stateData;
+    updateTimer(lightId, Date.now() / 1000);
+    ensureTicker();
     
     const container = document.getElementById(`light-${lightId}`);
     if (!container) return;
@@ -135,17 +180,6 @@ export function updateLightState(lightId, stateData) {
     container.querySelectorAll('.light').forEach(el => el.classList.remove('active'));
     const activeLight = container.querySelector(`.light.${stateData.status.toLowerCase()}`);
     if (activeLight) activeLight.classList.add('active');
-    
-    if (stateData.end_time) {
-        startCountdown(lightId, stateData.end_time);
-    } else {
-        if (state.countdownIntervals[lightId]) {
-            clearInterval(state.countdownIntervals[lightId]);
-            delete state.countdownIntervals[lightId];
-        }
-        const timerEl = document.getElementById(`timer-${lightId}`);
-        if (timerEl) timerEl.textContent = '--';
-    }
 
     const card = container.closest('.intersection-card');
     if (card) {
@@ -154,6 +188,78 @@ export function updateLightState(lightId, stateData) {
     }
 }
 
+export function applySchedules(schedules) {
+    schedules.forEach(schedule => {
+        const previous = state.schedules[schedule.intersection_id];
+        if (previous) previous.light_ids.forEach(id => delete state.scheduleOfLight[id]);
+        
+        state.schedules[schedule.intersection_id] = schedule;
+        schedule.light_ids.forEach(id => { state.scheduleOfLight[id] = schedule.intersection_id; });
+    });
+    projectSchedules(Date.now() / 1000);
+}
+
+function dropSchedule(lightId) {
+    const intersectionId = state.scheduleOfLight[lightId];
+    if (intersectionId === undefined) return;
+    
+    const schedule = state.schedules[intersectionId];
+    delete state.schedules[intersectionId];
+    if (schedule) schedule.light_ids.forEach(id => delete state.scheduleOfLight[id]);
+}
+
+function projectSchedules(now) {
+    Object.values(state.schedules).forEach(schedule => {
+        const transitions = schedule.transitions;
+        
+        // Latest transition that has already happened
+        let current = 0;
+        while (current + 1 < transitions.length && transitions[current + 1].at <= now) current++;
+        
+        schedule.light_ids.forEach((lightId, n) => {
+            const status = transitions[current].statuses[n];
+            
+            // Count down to the light's next status change (RED counts down to GREEN)
+            let endTime = schedule.until;
+            for (let next = current + 1; next < transitions.length; next++) {
+                if (transitions[next].statuses[n] !== status) {
+                    endTime = transitions[next].at;
+                    break;
+                }
+            }
+            
+            const known = state.lightsState[lightId];
+            if (!known || known.status !== status || known.end_time !== endTime) {
+                setLightState(lightId, { status, end_time: endTime });
+            }
+        });
+    });
+}
+
+function ensureTicker() {
+    if (state.ticker) return;
+    
+    // A single timer drives every countdown and schedule projection
+    state.ticker = setInterval(() => {
+        const now = Date.now() / 1000;
+        projectSchedules(now);
+        Object.keys(state.lightsState).forEach(lightId => updateTimer(lightId, now));
+    }, 250);
+}
+
+function updateTimer(lightId, now) {
+    const timerEl = document.getElementById(`timer-${lightId}`);
+    if (!timerEl) return;
+    
+    const endTime = state.lightsState[lightId] && state.lightsState[lightId].end_time;
+    if (!endTime) {
+        timerEl.textContent = '--';
+        return;
+    }
+    const remaining = Math.max(0, Math.ceil(endTime - now));
+    timerEl.textContent = `${remaining}s`;
+}
+
 export function updateTrafficFlow(intersectionId) {
     const card = document.getElementById(`intersection-${intersectionId}`);
     if (!card) return;
@@ -194,25 +300,6 @@ export function updateTrafficFlow(intersectionId) {
     });
 }
 
-export function startCountdown(lightId, endTime) {
-    if (state.countdownIntervals[lightId]) {
-        clearInterval(state.countdownIntervals[lightId]);
-    }
-    
-    const timerEl = document.getElementById(`timer-${lightId}`);
-    if (!timerEl) return;
-    
-    state.countdownIntervals[lightId] = setInterval(() => {
-        const now = Date.now() / 1000;
-        const remaining = Math.max(0, Math.ceil(endTime - now));
-        timerEl.textContent = remaining > 0 ? `${remaining}s` : '0s';
-        
-        if (remaining === 0) {
-            clearInterval(state.countdownIntervals[lightId]);
-        }
-    }, 100);
-}
-
 export function openModal(modalId) {
     document.getElementById(modalId).classList.add('active');
 }
@@ -228,6 +315,46 @@ export function openLightModal(lightId, currentDuration, currentStatus) {
         document.getElementById('lightStatus').value = currentStatus;
     }
     openModal('lightModal');
+    renderLightHistory(lightId);
+}
+
+// One bar per minute of the last hour, from the light's analytics rollups
+async function renderLightHistory(lightId) {
+    const chart = document.getElementById('lightHistory');
+    const summary = document.getElementById('lightHistorySummary');
+    chart.innerHTML = '';
+    summary.textContent = 'Loading...';
+    let series;
+    try {
+        series = await fetchAnalyticsSeries('light', lightId);
+    } catch (e) {
+        summary.textContent = 'History unavailable';
+        return;
+    }
+    // The modal may have moved on to another light meanwhile
+    if (document.getElementById('lightId').value != lightId) return;
+
+    const byMinute = new Map(series.map(bucket => [bucket.bucket_start, bucket]));
+    const lastMinute = Math.floor(Date.now() / 60000) * 60;
+    let bars = '';
+    let transitions = 0, overrides = 0, densitySum = 0, densitySamples = 0;
+    for (let minute = lastMinute - 59 * 60; minute <= lastMinute; minute += 60) {
+        const bucket = byMinute.get(minute);
+        const green = bucket ? Math.min(60, bucket.green_seconds) : 0;
+        if (bucket) {
+            transitions += bucket.transitions;
+            overrides += bucket.overrides;
+            if (bucket.density_avg != null) {
+                densitySum += bucket.density_avg * bucket.density_samples;
+                densitySamples += bucket.density_samples;
+            }
+        }
+        const time = new Date(minute * 1000).toLocaleTimeString([], { hour: '2-digit', minute: '2-digit' });
+        bars += `<div class="light-history-bar" style="height: ${(green / 60) * 100}%;" title="${time}: ${Math.round(green)}s green"></div>`;
+    }
+    chart.innerHTML = bars;
+    const density = densitySamples ? Math.round(densitySum / densitySamples) : '-';
+    summary.textContent = `${transitions} transitions · ${overrides} overrides · avg density ${density}`;
 }
 
 export function populateDropdowns() {
@@ -300,57 +427,18 @@ export async function renderFavoritesPage() {
     state.selectedAreaId = 'favorites';
     document.querySelectorAll('.area-item').forEach(el => el.classList.remove('active'));
     
-    // Ensure we have all data loaded
+    let page;
     try {
-        // We need to iterate all cities and areas to check for favorites
-        // This might be heavy if there are many, but for now it's necessary
-        // because favorites can be anywhere.
-        // A better backend endpoint /api/v1/favorites would be ideal, but let's fix it frontend-side first.
-        
-        for (const city of state.cities) {
-            if (!city.areas) {
-                try {
-                    const cityData = await fetchCityDetails(city.id);
-                    city.areas = cityData.areas;
-                } catch (e) {
-                    console.error(`Failed to load areas for city ${city.id}`, e);
-                }
-            }
-            
-            if (city.areas) {
-                for (const area of city.areas) {
-                    if (!area.intersections) {
-                        try {
-                            const areaData = await fetchAreaDetails(area.id);
-                            area.intersections = areaData.intersections;
-                        } catch (e) {
-                            console.error(`Failed to load intersections for area ${area.id}`, e);
-                        }
-                    }
-                }
-            }
-        }
+        page = await fetchFavorites();
     } catch (e) {
-        console.error("Error loading data for favorites:", e);
+        console.error("Error loading favorites:", e);
+        grid.innerHTML = '';
+        return;
     }
     
     grid.innerHTML = '';
-    let hasFavorites = false;
-    
-    state.cities.forEach(city => {
-        if (city.areas) {
-            city.areas.forEach(area => {
-                if (area.intersections) {
-                    area.intersections.forEach(intersection => {
-                        if (intersection.is_favorite) {
-                            hasFavorites = true;
-                            grid.appendChild(createIntersectionCard(intersection, area));
-                        }
-                    });
-                }
-            });
-        }
-    });
+    const hasFavorites = page.items.length > 0;
+    appendFavorites(grid, page);
     
     if (!hasFavorites) {
         grid.innerHTML = `
@@ -364,5 +452,23 @@ export async function renderFavoritesPage() {
     
 }
 
+function appendFavorites(grid, page) {
+    page.items.forEach(intersection => {
+        grid.appendChild(createIntersectionCard(intersection, { name: intersection.area_name }));
+    });
+    
+    if (page.next != null) {
+        const loadMore = createLoadMoreButton(async () => {
+            const next = await fetchFavorites(page.next);
+            loadMore.remove();
+            if (state.selectedAreaId === 'favorites') {
+                appendFavorites(grid, next);
+                window.syncState();
+            }
+        });
+        grid.appendChild(loadMore);
+    }
+}
+
 // Expose to window
 window.renderFavoritesPage = renderFavoritesPage;
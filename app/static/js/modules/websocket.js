@@ -1,5 +1,5 @@
 import { state } from './config.js';
-import { updateLightState } from './ui.js';
+import { updateLightState, applySchedules } from './ui.js';
 import { syncState } from './actions.js';
 
 export function initWebSocket() {
@@ -24,6 +24,9 @@ export function initWebSocket() {
             data.updates.forEach(update => {
                 updateLightState(update.light_id, update.state);
             });
+            if (data.schedules) {
+                applySchedules(data.schedules);
+            }
         }
     };
     
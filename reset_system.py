@@ -1,71 +1,57 @@
+import argparse
+import asyncio
 import sys
 import os
 
 # Add current directory to path so we can import app modules
 sys.path.append(os.getcwd())
 
-from app.db.base import Base
 from app.db.session import engine, SessionLocal
-from app.models.city import City, TrafficArea
-from app.models.intersection import Intersection
-from app.models.traffic import TrafficLight
+from app.db.schema import create_schema, drop_schema
+from app.core.journal import remove_journal
+from app.core.snapshot import remove_snapshot
+from app.core.city_generator import generate_city, initialize_phases
 
-def seed_data():
+async def initialize(db, args):
+    from app.services.redis import get_redis
+    redis = await get_redis()
+    return await initialize_phases(db, redis, seed=args.seed, stagger=args.stagger)
+
+def seed_data(args):
     db = SessionLocal()
     try:
-        if not db.query(City).first():
-            print("Seeding data...")
-            # Create City
-            city = City(name="Metropolis", code="MET")
-            db.add(city)
-            db.commit()
-            db.refresh(city)
-
-            # Create Areas
-            downtown = TrafficArea(name="Downtown", code="DT", city_id=city.id)
-            uptown = TrafficArea(name="Uptown", code="UP", city_id=city.id)
-            db.add_all([downtown, uptown])
-            db.commit()
-            db.refresh(downtown)
-            db.refresh(uptown)
-
-            # Create Intersections
-            intersections_data = [
-                {"name": "Main St & 1st Ave", "code": "INT-001", "area_id": downtown.id, "location": "Downtown Core"},
-                {"name": "Broadway & 5th", "code": "INT-002", "area_id": downtown.id, "location": "Financial District"},
-                {"name": "Park Ave & 59th", "code": "INT-003", "area_id": uptown.id, "location": "Residential Zone"},
-            ]
-
-            for i_data in intersections_data:
-                intersection = Intersection(**i_data)
-                db.add(intersection)
-                db.commit()
-                db.refresh(intersection)
-                
-                # Create lights
-                directions = ["North", "South", "East", "West"]
-                for direction in directions:
-                    light = TrafficLight(
-                        intersection_id=intersection.id,
-                        direction=direction,
-                        status="RED" if direction in ["East", "West"] else "GREEN",
-                        duration=60
-                    )
-                    db.add(light)
-                db.commit()
-            print("Seeding complete.")
+        print(
+            f"Generating {args.cities} city(ies) x {args.areas} area(s) x "
+            f"{args.intersections} intersection(s), seed {args.seed}..."
+        )
+        summary = generate_city(db, args.cities, args.areas, args.intersections, seed=args.seed)
+        print(f"Created {summary['intersections']} intersections and {summary['traffic_lights']} traffic lights "
+              f"in {summary['seconds']}s.")
+
+        count = asyncio.run(initialize(db, args))
+        print(f"Initialized phases of {count} intersections{' (staggered)' if args.stagger else ''}.")
+        print("Seeding complete.")
     except Exception as e:
         print(f"Error seeding data: {e}")
     finally:
         db.close()
 
-def reset_db():
+def reset_db(args):
     print("Dropping all tables...")
-    Base.metadata.drop_all(bind=engine)
+    drop_schema(engine)
     print("Creating all tables...")
-    Base.metadata.create_all(bind=engine)
-    seed_data()
+    create_schema(engine)
+    # The old controller state and history don't apply to the new city
+    remove_snapshot()
+    remove_journal()
+    seed_data(args)
     print("Database reset successfully.")
 
 if __name__ == "__main__":
-    reset_db()
+    parser = argparse.ArgumentParser(description="Wipe the database and generate a synthetic city.")
+    parser.add_argument("--cities", type=int, default=1)
+    parser.add_argument("--areas", type=int, default=2, help="Areas per city")
+    parser.add_argument("--intersections", type=int, default=2, help="Intersections per area")
+    parser.add_argument("--seed", type=int, default=0, help="Same seed, same data")
+    parser.add_argument("--stagger", action="store_true", help="Start intersections at random points of their cycle")
+    reset_db(parser.parse_args())
@@ -0,0 +1,85 @@
+"""
+Compare the pydantic response-model path with the fast column-tuple path
+for a list of traffic lights.
+
+    python scripts/benchmark_serialization.py [--lights 10000] [--repeat 5]
+
+Runs against a throwaway in-memory SQLite database.
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.append(os.getcwd())
+
+from pydantic import TypeAdapter
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from typing import List
+from app.db.base import Base
+from app.models.city import City, TrafficArea
+from app.models.intersection import Intersection
+from app.models.traffic import TrafficLight
+from app.schemas.traffic import TrafficLightResponse
+from app.core import serialization
+from app.core.serialization import dumps, field_names, records
+
+def seed(db, lights: int):
+    city = City(name="Bench", code="BENCH")
+    db.add(city)
+    db.flush()
+    area = TrafficArea(name="Bench", code="BENCH", city_id=city.id)
+    db.add(area)
+    db.flush()
+    directions = ("North", "South", "East", "West")
+    for n in range(lights // 4):
+        intersection = Intersection(area_id=area.id, name=f"Bench {n}", code=f"B-{n}", location="")
+        db.add(intersection)
+        db.flush()
+        db.add_all([TrafficLight(intersection_id=intersection.id, direction=d) for d in directions])
+    db.commit()
+
+def pydantic_path(db) -> bytes:
+    # What response_model=List[TrafficLightResponse] does with ORM instances
+    adapter = TypeAdapter(List[TrafficLightResponse])
+    lights = db.query(TrafficLight).order_by(TrafficLight.id).all()
+    return adapter.dump_json(adapter.validate_python(lights, from_attributes=True))
+
+def fast_path(db) -> bytes:
+    names = field_names(TrafficLightResponse)
+    rows = db.query(*[getattr(TrafficLight, name) for name in names]).order_by(TrafficLight.id).all()
+    return dumps(records(names, rows))
+
+def best_of(fn, db, repeat: int):
+    times = []
+    for _ in range(repeat):
+        db.expunge_all()
+        start = time.perf_counter()
+        body = fn(db)
+        times.append(time.perf_counter() - start)
+    return min(times), body
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--lights", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    seed(db, args.lights)
+
+    slow, expected = best_of(pydantic_path, db, args.repeat)
+    fast, body = best_of(fast_path, db, args.repeat)
+
+    encoder = "orjson" if serialization.orjson is not None else "json"
+    print(f"{args.lights} lights, best of {args.repeat}, encoder: {encoder}")
+    print(f"  ORM + pydantic:       {slow * 1000:8.1f} ms")
+    print(f"  column tuples + fast: {fast * 1000:8.1f} ms")
+    print(f"  speedup:              {slow / fast:8.1f}x")
+    print(f"  identical output:     {body == expected}")
+
+if __name__ == "__main__":
+    main()
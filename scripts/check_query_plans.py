@@ -0,0 +1,80 @@
+"""
+Check that every hot query (app/db/queries.py HOT_QUERIES) is served by an
+index: EXPLAIN QUERY PLAN must not show a full table scan.
+
+    python scripts/check_query_plans.py                  # throwaway seeded database
+    python scripts/check_query_plans.py --intersections 20000
+    python scripts/check_query_plans.py --url sqlite:///./traffic.db
+
+Without --url, a synthetic city is created in a temporary file at the
+current schema version, with planner statistics (ANALYZE). Exits with 1 if
+any query scans a table.
+"""
+import argparse
+import os
+import re
+import sys
+import tempfile
+
+sys.path.append(os.getcwd())
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+from app.db.queries import HOT_QUERIES
+from app.db.schema import create_schema, ensure_schema
+from app.db.storage import configure, engine_options
+
+# "SCAN t" (also "SCAN t USING INDEX i") reads the whole table, and so does a
+# rowid range alone ("id > ?" of a keyset page) when nothing narrows it first
+FULL_SCAN = re.compile(r"^SCAN (?!CONSTANT ROW)|USING INTEGER PRIMARY KEY \(rowid[<>]")
+
+def seeded_engine(intersections: int):
+    from app.core.city_generator import generate_city
+
+    path = os.path.join(tempfile.mkdtemp(prefix="query-plans-"), "traffic.db")
+    url = f"sqlite:///{path}"
+    engine = create_engine(url, **engine_options(url))
+    configure(engine)
+    create_schema(engine)
+    db = sessionmaker(bind=engine)()
+    try:
+        generate_city(db, cities=1, areas_per_city=10, intersections_per_area=max(1, intersections // 10))
+    finally:
+        db.close()
+    with engine.begin() as connection:
+        connection.execute(text("ANALYZE"))
+    return engine
+
+def plan(connection, statement, params: dict) -> list:
+    compiled = statement.compile(dialect=connection.dialect)
+    values = compiled.construct_params(params)
+    positional = tuple(values[name] for name in compiled.positiontup)
+    rows = connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {compiled}", positional).all()
+    return [row[-1] for row in rows]
+
+def main():
+    parser = argparse.ArgumentParser(description="Fail if a hot query does a full table scan.")
+    parser.add_argument("--url", help="Check this database instead of a throwaway one")
+    parser.add_argument("--intersections", type=int, default=5000)
+    args = parser.parse_args()
+
+    if args.url:
+        engine = create_engine(args.url, **engine_options(args.url))
+        ensure_schema(engine)
+    else:
+        engine = seeded_engine(args.intersections)
+
+    failures = 0
+    with engine.connect() as connection:
+        for name, (statement, params) in HOT_QUERIES.items():
+            steps = plan(connection, statement, params)
+            scans = [step for step in steps if FULL_SCAN.search(step)]
+            failures += bool(scans)
+            print(f"{'FAIL' if scans else 'ok':4}  {name}")
+            for step in steps:
+                print(f"      {step}")
+    print(f"{len(HOT_QUERIES) - failures}/{len(HOT_QUERIES)} hot queries use an index")
+    sys.exit(1 if failures else 0)
+
+if __name__ == "__main__":
+    main()
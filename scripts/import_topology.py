@@ -0,0 +1,52 @@
+"""
+Bulk-import a topology file into the database.
+
+    python scripts/import_topology.py district.csv
+    python scripts/import_topology.py district.geojson --dry-run
+
+See app/core/topology_import.py for the record format. A running server picks
+the new intersections up after a restart; use POST /api/v1/admin/import to
+import into a live system.
+"""
+import argparse
+import json
+import os
+import sys
+
+sys.path.append(os.getcwd())
+
+from app.db.session import engine, SessionLocal
+from app.db.schema import ensure_schema
+from app.core.topology_import import FORMATS, TopologyFormatError, detect_format, import_topology, open_text
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk-import cities, areas, intersections and lights.")
+    parser.add_argument("path")
+    parser.add_argument("--format", choices=FORMATS, help="Defaults to the file extension")
+    parser.add_argument("--batch-size", type=int, default=5000)
+    parser.add_argument("--dry-run", action="store_true", help="Validate only, insert nothing")
+    parser.add_argument("--strict", action="store_true", help="Roll back everything if any row fails")
+    args = parser.parse_args()
+
+    ensure_schema(engine)
+    db = SessionLocal()
+    try:
+        with open(args.path, "rb") as f:
+            summary = import_topology(
+                db, open_text(f), args.format or detect_format(args.path),
+                batch_size=args.batch_size, dry_run=args.dry_run, strict=args.strict
+            )
+    except TopologyFormatError as e:
+        print(f"Cannot read {args.path}: {e}")
+        sys.exit(2)
+    finally:
+        db.close()
+
+    errors = summary.pop("errors")
+    for error in errors:
+        print(f"Row {error['row']} ({error['code']}): {error['error']}")
+    print(json.dumps(summary, indent=2))
+    sys.exit(1 if summary["error_count"] else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,305 @@
+"""
+Load-test the /api/v1/ws broadcast with many concurrent dashboard clients.
+
+    python scripts/loadtest_websocket.py --clients 2000 --seconds 60 --out run.json
+    python scripts/loadtest_websocket.py --clients 2000 --compare run.json --env BROADCAST_MIN_INTERVAL=0.5
+
+Seeds a synthetic city (app/core/city_generator.py) into a throwaway
+directory and starts uvicorn on it, with in-memory Redis unless --redis-url
+is given. Then it connects the clients and, while the controller cycles,
+drives manual overrides through the admin API.
+
+Every broadcast frame carries `seq` and `ts`, the epoch time its first
+change was committed. So each client records latency as receipt time minus
+`ts`, and counts gaps in `seq` as dropped frames. Server memory per
+connection is the server's RSS growth while the clients connect (Linux
+/proc), divided by the number of clients. The clients only read the frame
+header, so one process can hold thousands of them. The client event loop's
+lag is reported too: when it is high, the latencies measure the clients
+rather than the server.
+
+The result is one JSON object. --compare prints the change in the main
+figures against an earlier result file.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from array import array
+from datetime import datetime, timezone
+
+sys.path.append(os.getcwd())
+
+HEADER = re.compile(r'\{\s*"seq"\s*:\s*(\d+)\s*,\s*"ts"\s*:\s*([-+.\deE]+)')
+COMPARED = [
+    ("latency_ms", "p50"), ("latency_ms", "p99"), ("latency_ms", "max"),
+    ("frames", "dropped"), ("server", "bytes_per_connection"), ("client", "max_loop_lag_ms")
+]
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def rss(pid: int):
+    """Resident memory of a process in bytes (Linux only, else None)."""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+def percentiles(values) -> dict:
+    if not values:
+        return {}
+    values = sorted(values)
+    def rank(p):
+        return round(values[min(len(values) - 1, int(p * len(values)))] * 1000, 2)
+    return {
+        "p50": rank(0.5), "p90": rank(0.9), "p99": rank(0.99), "p999": rank(0.999),
+        "max": round(values[-1] * 1000, 2), "mean": round(sum(values) / len(values) * 1000, 2)
+    }
+
+def seed(env: dict, args) -> list:
+    """Create the synthetic city; returns its light ids."""
+    os.environ.update(env)
+    from app.db.session import SessionLocal, engine
+    from app.db.schema import ensure_schema
+    from app.core.city_generator import generate_records
+    from app.core.topology_import import TopologyImporter
+    from app.models.traffic import TrafficLight
+
+    ensure_schema(engine)
+    db = SessionLocal()
+    try:
+        records = generate_records(1, args.areas, max(1, args.intersections // args.areas), args.seed)
+        if args.phase_duration:
+            # Shorter phases, more transitions per second
+            records = (dict(record, duration=args.phase_duration) for record in records)
+        TopologyImporter(db).run(records)
+        return [light_id for (light_id,) in db.query(TrafficLight.id)]
+    finally:
+        db.close()
+
+class Stats:
+    def __init__(self):
+        self.measuring = False
+        self.latencies = array("d")
+        self.received = 0
+        self.dropped = 0
+        self.disconnected = 0
+        self.max_loop_lag = 0.0
+
+async def client(url: str, stats: Stats, opened: asyncio.Future, timeout: float):
+    import websockets
+
+    try:
+        ws = await websockets.connect(url, max_size=None, ping_interval=None, open_timeout=timeout)
+    except Exception as e:
+        opened.set_exception(e)
+        return
+    opened.set_result(None)
+    async with ws:
+        last_seq = None
+        async for text in ws:
+            received = time.time()
+            match = HEADER.match(text)
+            if not match:
+                continue
+            seq = int(match.group(1))
+            if stats.measuring:
+                stats.received += 1
+                stats.latencies.append(received - float(match.group(2)))
+                if last_seq is not None and seq > last_seq + 1:
+                    stats.dropped += seq - last_seq - 1
+            last_seq = seq
+    # The server closed the connection
+    stats.disconnected += 1
+
+async def connect(url: str, stats: Stats, semaphore: asyncio.Semaphore, timeout: float):
+    """Open one client (at most `semaphore` handshakes at a time); its receiving task, or None."""
+    async with semaphore:
+        opened = asyncio.get_running_loop().create_future()
+        task = asyncio.create_task(client(url, stats, opened, timeout))
+        try:
+            await opened
+        except Exception:
+            return None
+        return task
+
+async def loop_lag(stats: Stats, interval: float = 0.1):
+    while True:
+        started = time.monotonic()
+        await asyncio.sleep(interval)
+        if stats.measuring:
+            stats.max_loop_lag = max(stats.max_loop_lag, time.monotonic() - started - interval)
+
+async def driver(http, light_ids: list, rate: float, counts: dict, rng: random.Random):
+    """Manual overrides at `rate` per second: a random light held RED for a few seconds."""
+    if rate <= 0:
+        return
+    while True:
+        await asyncio.sleep(1 / rate)
+        light_id = rng.choice(light_ids)
+        try:
+            response = await http.post(f"/api/v1/admin/traffic-lights/{light_id}/manual", json={"status": "RED", "duration": 5})
+            counts["rejected" if response.status_code == 409 else "applied" if response.is_success else "errors"] += 1
+        except Exception:
+            counts["errors"] += 1
+
+async def wait_ready(http, process, timeout: float = 120):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Server exited with code {process.returncode}")
+        try:
+            if (await http.get("/api/v1/admin/controller/watchdog")).json()["ticks"] > 0:
+                return
+        except Exception:
+            pass
+        await asyncio.sleep(0.5)
+    raise RuntimeError("Server did not start")
+
+async def run(args, light_ids: list, env: dict) -> dict:
+    import httpx
+
+    port = free_port()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--log-level", "warning"],
+        env={**os.environ, **env}
+    )
+    stats = Stats()
+    tasks = []
+    try:
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=30) as http:
+            await wait_ready(http, process)
+            await asyncio.sleep(2)
+            rss_before = rss(process.pid)
+
+            # Many handshakes at once, as a crowd of dashboards reconnecting would
+            started = time.monotonic()
+            semaphore = asyncio.Semaphore(args.connect_concurrency)
+            url = f"ws://127.0.0.1:{port}/api/v1/ws"
+            opened = await asyncio.gather(*(connect(url, stats, semaphore, args.connect_timeout) for _ in range(args.clients)))
+            tasks = [task for task in opened if task is not None]
+            clients = len(tasks)
+            connect_seconds = time.monotonic() - started
+            await asyncio.sleep(2)
+            rss_after = rss(process.pid)
+
+            counts = {"applied": 0, "rejected": 0, "errors": 0}
+            before = (await http.get("/api/v1/admin/websocket/stats")).json()
+            tasks.append(asyncio.create_task(loop_lag(stats)))
+            tasks.append(asyncio.create_task(driver(http, light_ids, args.overrides, counts, random.Random(args.seed))))
+            stats.measuring = True
+            await asyncio.sleep(args.seconds)
+            stats.measuring = False
+            after = (await http.get("/api/v1/admin/websocket/stats")).json()
+            watchdog = (await http.get("/api/v1/admin/controller/watchdog")).json()
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        process.terminate()
+        try:
+            process.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+    grown = rss_after - rss_before if rss_before and rss_after else None
+    return {
+        "started": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "commit": git_commit(),
+        "settings": {
+            "clients": args.clients, "seconds": args.seconds, "intersections": args.intersections,
+            "lights": len(light_ids), "overrides_per_second": args.overrides,
+            "phase_duration": args.phase_duration, "env": dict(arg.split("=", 1) for arg in args.env)
+        },
+        "connections": {
+            "connected": clients, "failed": args.clients - clients,
+            "connect_seconds": round(connect_seconds, 2), "disconnected": stats.disconnected
+        },
+        "frames": {
+            "sent": after["frames"] - before["frames"],
+            "received": stats.received,
+            "dropped": stats.dropped,
+            "failed_sends": after["failed_sends"] - before["failed_sends"]
+        },
+        "latency_ms": percentiles(stats.latencies),
+        "server": {
+            "rss_before_mb": round(rss_before / 2 ** 20, 1) if rss_before else None,
+            "rss_after_mb": round(rss_after / 2 ** 20, 1) if rss_after else None,
+            "bytes_per_connection": round(grown / clients) if grown is not None and clients else None,
+            "watchdog_level": watchdog["level"],
+            "max_tick_ms": watchdog["max_tick_ms"]
+        },
+        "client": {"max_loop_lag_ms": round(stats.max_loop_lag * 1000, 2)},
+        "overrides": counts
+    }
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+def compare(result: dict, baseline: dict):
+    print(f"{'':32}{'baseline':>14}{'this run':>14}{'change':>10}")
+    for section, key in COMPARED:
+        old, new = baseline.get(section, {}).get(key), result.get(section, {}).get(key)
+        change = f"{(new - old) / old * 100:+.1f}%" if old and new is not None else ""
+        print(f"{section + '.' + key:32}{str(old):>14}{str(new):>14}{change:>10}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the /ws broadcast with many dashboard clients.")
+    parser.add_argument("--clients", type=int, default=1000)
+    parser.add_argument("--seconds", type=float, default=30, help="Measurement window")
+    parser.add_argument("--intersections", type=int, default=1000)
+    parser.add_argument("--areas", type=int, default=10)
+    parser.add_argument("--phase-duration", type=int, help="Override the generated phase durations (seconds)")
+    parser.add_argument("--overrides", type=float, default=2.0, help="Manual overrides per second")
+    parser.add_argument("--connect-concurrency", type=int, default=200)
+    parser.add_argument("--connect-timeout", type=float, default=120)
+    parser.add_argument("--redis-url", default="memory://")
+    parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE", help="Extra server settings")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", help="Write the result JSON here (default: stdout)")
+    parser.add_argument("--compare", help="Earlier result JSON to compare against")
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp(prefix="ws-loadtest-")
+    env = {
+        "DATABASE_URL": f"sqlite:///{os.path.join(directory, 'traffic.db')}",
+        "REDIS_URL": args.redis_url,
+        "SNAPSHOT_PATH": os.path.join(directory, "state.snap"),
+        "JOURNAL_DIR": os.path.join(directory, "journal"),
+        "ASSETS_DIR": os.path.join(directory, "assets"),
+        "LOG_LEVEL": "WARNING",
+        **dict(arg.split("=", 1) for arg in args.env)
+    }
+    light_ids = seed(env, args)
+    result = asyncio.run(run(args, light_ids, env))
+
+    text = json.dumps(result, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(result, json.load(f))
+
+if __name__ == "__main__":
+    main()